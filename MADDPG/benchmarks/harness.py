@@ -0,0 +1,352 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+harness.py
+
+Registry, timing, machine metadata, JSON results and baseline comparison of the benchmark suite.
+
+Benchmarks are functions registered with @benchmark(name) that take the parsed commandline arguments
+of run_benchmarks.py and return a result dictionary:
+    value: Measured value
+    unit: Unit of the value, e.g. 'us/call' or 'steps/sec'
+    higher_is_better: True for rates, False for latencies
+and any extra keys describing the measurement. A benchmark whose optional dependencies are missing
+raises Skip, so the rest of the suite still runs.
+
+Updated and Enhanced version of OpenAI Multi-Agent Deep Deterministic Policy Gradient (MADDPG) Algorithm
+(https://github.com/openai/maddpg)
+"""
+
+from collections import OrderedDict
+import datetime
+import fnmatch
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import timeit
+import traceback
+
+import numpy as np
+
+###########################################
+#         Add modules to path             #
+###########################################
+script_path = os.path.abspath(__file__)
+split_script_path = script_path.split(os.sep)
+module_parent_dir = os.sep.join(split_script_path[:len(split_script_path)-3])
+
+sys.path.insert(0, os.path.join(module_parent_dir, 'MADDPG'))
+sys.path.insert(0, os.path.join(module_parent_dir, 'Multi-Agent-Particle-Environment'))
+
+__author__ = 'Rolando Fernandez'
+__copyright__ = 'Copyright 2020, Multi-Agent Deep Deterministic Policy Gradient'
+__credits__ = ['Rolando Fernandez', 'OpenAI']
+__license__ = ''
+__version__ = '0.0.1'
+__maintainer__ = 'Rolando Fernandez'
+__email__ = 'rolando.fernandez1.civ@mail.mil'
+__status__ = 'Dev'
+
+# Version of the results file layout
+RESULTS_VERSION = 1
+
+# Registered benchmarks by name, in registration order
+BENCHMARKS = OrderedDict()
+
+
+class Skip(Exception):
+    """
+    Raised by a benchmark that cannot run here, e.g. when an optional dependency is missing
+    """
+    pass
+
+
+def benchmark(name):
+    """
+    Decorator registering a benchmark
+
+    Usage:
+    @benchmark("micro/replay_buffer/add")
+    def replay_buffer_add(arglist): code
+
+    Args:
+        name (str): Unique name, '<suite>/<group>/<case>' where suite is micro or macro
+    """
+    def decorator(func):
+        assert name not in BENCHMARKS, "Benchmark {} is already registered".format(name)
+        BENCHMARKS[name] = func
+        return func
+
+    return decorator
+
+
+def select(patterns=None, suites=None):
+    """
+    Names of the registered benchmarks matching any of the patterns
+
+    Args:
+        patterns (list): Shell style patterns, e.g. 'micro/world_step/*', None for every benchmark
+        suites (list): Suites to keep, e.g. ['micro'], None for every suite
+
+    Returns:
+        (list) Benchmark names in registration order
+    """
+    names = list(BENCHMARKS)
+    if suites:
+        names = [name for name in names if name.split("/")[0] in suites]
+    if patterns:
+        names = [name for name in names if any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns)]
+
+    return names
+
+
+def measure(func, repeat=5, min_time=0.2, number=None):
+    """
+    Time a function with timeit, calling it number times per repeat
+
+    Args:
+        func (function): Function taking no arguments
+        repeat (int): Number of timed repeats
+        min_time (float): Minimum duration of a repeat in seconds when number is chosen automatically
+        number (int): Calls per repeat, None to pick the smallest power of ten reaching min_time
+
+    Returns:
+        (dict) Seconds per call over the repeats: mean, min, median and std, with number and repeat
+    """
+    timer = timeit.Timer(func)
+    if number is None:
+        number = 1
+        while True:
+            if timer.timeit(number) >= min_time or number >= 10 ** 7:
+                break
+            number *= 10
+
+    times = np.array(timer.repeat(repeat=repeat, number=number)) / number
+
+    return {'mean': float(np.mean(times)), 'min': float(np.min(times)), 'median': float(np.median(times)),
+            'std': float(np.std(times)), 'number': number, 'repeat': repeat}
+
+
+def latency_result(timing, scale=1e6, unit='us/call', **extra):
+    """
+    Result of a latency benchmark, reporting the median time per call
+
+    Args:
+        timing (dict): Output of measure()
+        scale (float): Factor converting seconds to the unit
+        unit (str): Unit of the value
+
+    Returns:
+        (dict) Benchmark result
+    """
+    result = {'value': timing['median'] * scale, 'unit': unit, 'higher_is_better': False,
+              'min': timing['min'] * scale, 'std': timing['std'] * scale,
+              'number': timing['number'], 'repeat': timing['repeat']}
+    result.update(extra)
+
+    return result
+
+
+def rate_result(counts, seconds, unit, **extra):
+    """
+    Result of a throughput benchmark, reporting the median rate over the repeats
+
+    Args:
+        counts (list): Number of events of each repeat, e.g. environment steps
+        seconds (list): Duration of each repeat in seconds
+        unit (str): Unit of the value, e.g. 'steps/sec'
+
+    Returns:
+        (dict) Benchmark result
+    """
+    rates = np.array(counts, dtype=np.float64) / np.maximum(np.array(seconds), 1e-12)
+    result = {'value': float(np.median(rates)), 'unit': unit, 'higher_is_better': True,
+              'max': float(np.max(rates)), 'std': float(np.std(rates)), 'repeat': len(rates)}
+    result.update(extra)
+
+    return result
+
+
+def _git(*args):
+    try:
+        output = subprocess.check_output(('git',) + args, cwd=os.path.dirname(script_path), stderr=subprocess.DEVNULL)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    return output.decode().strip()
+
+
+def _version(module_name):
+    try:
+        module = __import__(module_name)
+    except Exception:
+        return None
+
+    return getattr(module, '__version__', 'unknown')
+
+
+def machine_metadata():
+    """
+    Description of the machine and code that produced the results
+
+    Returns:
+        (dict) Host, platform, CPU, Python and library versions, and git commit
+    """
+    status = _git('status', '--porcelain', '--untracked-files=no')
+
+    return {
+        'timestamp': datetime.datetime.now().isoformat(),
+        'hostname': socket.gethostname(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'tensorflow': _version('tensorflow'),
+        'numba': _version('numba'),
+        'git_commit': _git('rev-parse', 'HEAD'),
+        'git_dirty': None if status is None else bool(status),
+    }
+
+
+def run(names, arglist, verbose=True):
+    """
+    Run benchmarks
+
+    Args:
+        names (list): Names of registered benchmarks
+        arglist (argparse.Namespace): Parsed commandline arguments object passed to every benchmark
+        verbose (bool): Print each result as it is measured
+
+    Returns:
+        (dict) Results with 'version', 'metadata', 'arguments' and 'benchmarks', the result of each
+               benchmark by name. Skipped and failed benchmarks hold 'skipped' or 'error' instead of a value.
+    """
+    results = OrderedDict()
+    for name in names:
+        try:
+            result = BENCHMARKS[name](arglist)
+        except Skip as e:
+            result = {'skipped': str(e)}
+        except Exception as e:
+            result = {'error': "{}: {}".format(type(e).__name__, e)}
+            if verbose:
+                traceback.print_exc()
+        results[name] = result
+
+        if verbose:
+            print(format_result(name, result))
+            sys.stdout.flush()
+
+    return {'version': RESULTS_VERSION, 'metadata': machine_metadata(), 'arguments': vars(arglist),
+            'benchmarks': results}
+
+
+def format_result(name, result):
+    """
+    Returns:
+        (str) One line summary of a benchmark result
+    """
+    if 'value' in result:
+        return "{:<60} {:>14.3f} {}".format(name, result['value'], result['unit'])
+    if 'skipped' in result:
+        return "{:<60} {:>14} ({})".format(name, "skipped", result['skipped'])
+
+    return "{:<60} {:>14} ({})".format(name, "error", result['error'])
+
+
+def save(results, path):
+    """
+    Write results as JSON, creating the parent directory
+
+    Args:
+        results (dict): Output of run()
+        path (str): File path
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    if not os.path.exists(directory):
+        os.makedirs(directory, exist_ok=True)
+
+    with open(path, 'w') as fp:
+        json.dump(results, fp, indent=2, default=str)
+
+
+def load(path):
+    """
+    Returns:
+        (dict) Results read from a JSON file written by save()
+    """
+    with open(path, 'r') as fp:
+        return json.load(fp, object_pairs_hook=OrderedDict)
+
+
+def compare(results, baseline, threshold=0.1):
+    """
+    Compare results with a baseline
+
+    A benchmark regresses when its value is worse than the baseline's by more than the threshold,
+    i.e. lower for rates or higher for latencies, and improves when it is better by more than the threshold.
+
+    Args:
+        results (dict): Current results, output of run() or load()
+        baseline (dict): Baseline results
+        threshold (float): Relative change tolerated as noise, e.g. 0.1 for 10%
+
+    Returns:
+        (list) Rows (name, baseline value, current value, relative change, status), status being one of
+               'regression', 'improvement', 'ok', 'new', 'missing' or 'skipped'
+    """
+    current = results['benchmarks']
+    previous = baseline['benchmarks']
+
+    rows = []
+    for name in list(previous) + [name for name in current if name not in previous]:
+        old = previous.get(name, {})
+        new = current.get(name)
+        if new is None:
+            rows.append((name, old.get('value'), None, None, 'missing'))
+            continue
+        if 'value' not in new or 'value' not in old:
+            status = 'new' if name not in previous else 'skipped'
+            rows.append((name, old.get('value'), new.get('value'), None, status))
+            continue
+
+        change = (new['value'] - old['value']) / old['value'] if old['value'] else 0.0
+        worse = -change if new['higher_is_better'] else change
+        if worse > threshold:
+            status = 'regression'
+        elif worse < -threshold:
+            status = 'improvement'
+        else:
+            status = 'ok'
+        rows.append((name, old['value'], new['value'], change, status))
+
+    return rows
+
+
+def format_comparison(rows, baseline_metadata=None):
+    """
+    Returns:
+        (str) Table of the output of compare(), followed by the number of regressions
+    """
+    def value(x):
+        return "{:.3f}".format(x) if x is not None else "-"
+
+    lines = []
+    if baseline_metadata:
+        lines.append("Baseline: commit {} on {} ({})".format(baseline_metadata.get('git_commit'),
+                                                           baseline_metadata.get('hostname'),
+                                                           baseline_metadata.get('timestamp')))
+    lines.append("{:<60} {:>14} {:>14} {:>9}  {}".format("benchmark", "baseline", "current", "change", "status"))
+    for name, old, new, change, status in rows:
+        lines.append("{:<60} {:>14} {:>14} {:>9}  {}".format(
+            name, value(old), value(new), "{:+.1%}".format(change) if change is not None else "-",
+            status.upper() if status == 'regression' else status))
+    lines.append("{} regression(s)".format(sum(1 for row in rows if row[4] == 'regression')))
+
+    return "\n".join(lines)
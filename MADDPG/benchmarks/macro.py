@@ -0,0 +1,265 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+macro.py
+
+Macro benchmarks of whole training components:
+    macro/env_steps/<scenario>: Environment steps per second of a scenario under random actions,
+                                resetting every --max-episode-len steps
+    macro/train_updates/<scenario>: Updates per second of the trainers built by experiments/train.py,
+                                    one update being the preupdate() and update() of every agent
+
+Updated and Enhanced version of OpenAI Multi-Agent Deep Deterministic Policy Gradient (MADDPG) Algorithm
+(https://github.com/openai/maddpg)
+"""
+
+import argparse
+import importlib.util
+import os
+import sys
+import time
+
+import numpy as np
+
+from harness import benchmark, module_parent_dir, rate_result, Skip
+
+__author__ = 'Rolando Fernandez'
+__copyright__ = 'Copyright 2020, Multi-Agent Deep Deterministic Policy Gradient'
+__credits__ = ['Rolando Fernandez', 'OpenAI']
+__license__ = ''
+__version__ = '0.0.1'
+__maintainer__ = 'Rolando Fernandez'
+__email__ = 'rolando.fernandez1.civ@mail.mil'
+__status__ = 'Dev'
+
+# Scenarios of the environment step benchmarks, with their number of adversaries
+ENV_SCENARIOS = (
+    ('openai/simple', 0),
+    ('openai/simple_spread', 0),
+    ('openai/simple_tag', 3),
+    ('openai/simple_world_comm', 4),
+    ('allies/simple_tag_2', 2),
+    ('converge/simple_hvt_1v1_random', 1),
+)
+
+# Scenarios of the training update benchmarks, with their number of adversaries
+TRAIN_SCENARIOS = (
+    ('openai/simple_tag', 3),
+    ('converge/simple_hvt_1v1_random', 1),
+)
+
+
+def env_arglist(arglist, num_adversaries):
+    """
+    Arguments read by make_env and the scenarios' make_world
+
+    Args:
+        arglist (argparse.Namespace): Parsed commandline arguments object of run_benchmarks.py
+        num_adversaries (int): Number of adversaries of the scenario
+
+    Returns:
+        (argparse.Namespace) Environment arguments
+    """
+    return argparse.Namespace(num_adversaries=num_adversaries, num_fixed=0, num_fixed_adv=0, fixed=False,
+                              perturbation=False, physics=arglist.physics, max_substeps=arglist.max_substeps,
+                              ccd_resolution=arglist.ccd_resolution, seed=None, reset_bank=0)
+
+
+def action_sizes(env):
+    """
+    Returns:
+        (list) Size of the action vector of each agent, as produced by the MADDPG policies
+    """
+    sizes = []
+    for space in env.action_space:
+        if hasattr(space, 'nvec'):
+            sizes.append(int(np.sum(space.nvec)))
+        elif hasattr(space, 'n'):
+            sizes.append(space.n)
+        else:
+            sizes.append(int(np.prod(space.shape)))
+
+    return sizes
+
+
+def _make_env(scenario, arglist, num_adversaries):
+    try:
+        from multiagent_particle_env.make_env import make_env
+    except ImportError as e:
+        raise Skip("multiagent_particle_env is unavailable ({})".format(e))
+
+    return make_env(scenario, arglist=env_arglist(arglist, num_adversaries))
+
+
+def _env_steps(scenario, num_adversaries):
+    def env_steps(arglist):
+        env = _make_env(scenario, arglist, num_adversaries)
+        sizes = action_sizes(env)
+        rng = np.random.RandomState(0)
+        np.random.seed(0)
+
+        # Random actions drawn up front, so that only the environment is timed
+        actions = [[rng.rand(size) for size in sizes] for _ in range(arglist.max_episode_len)]
+
+        def run_episodes(num_steps):
+            env.reset()
+            for step in range(num_steps):
+                env.step(actions[step % arglist.max_episode_len])
+                if (step + 1) % arglist.max_episode_len == 0:
+                    env.reset()
+
+        run_episodes(arglist.max_episode_len)
+        seconds = []
+        for _ in range(arglist.repeat):
+            t_start = time.perf_counter()
+            run_episodes(arglist.env_steps)
+            seconds.append(time.perf_counter() - t_start)
+
+        return rate_result([arglist.env_steps] * arglist.repeat, seconds, 'steps/sec', scenario=scenario,
+                           agents=env.n, entities=len(env.world.entities), physics=arglist.physics)
+
+    return env_steps
+
+
+for _scenario, _num_adversaries in ENV_SCENARIOS:
+    benchmark("macro/env_steps/{}".format(_scenario))(_env_steps(_scenario, _num_adversaries))
+
+
+def load_driver(name):
+    """
+    Import an experiment driver from MADDPG/experiments as a module
+
+    Args:
+        name (str): Driver file name without the .py extension, e.g. 'train'
+
+    Returns:
+        Driver module
+    """
+    module_path = os.path.join(module_parent_dir, 'MADDPG', 'experiments', name + '.py')
+    spec = importlib.util.spec_from_file_location('experiments_' + name, module_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    return module
+
+
+def driver_arglist(driver, argv):
+    """
+    Parse driver arguments, falling back to the driver's defaults for everything not in argv
+
+    Args:
+        driver: Driver module with a parse_args() function reading sys.argv
+        argv (list): Commandline arguments
+
+    Returns:
+        (argparse.Namespace) Parsed commandline arguments object of the driver
+    """
+    sys_argv = sys.argv
+    sys.argv = [driver.__file__] + list(argv)
+    try:
+        return driver.parse_args()
+    finally:
+        sys.argv = sys_argv
+
+
+def fill_replay_buffers(env, trainers, num_steps, max_episode_len, rng=None):
+    """
+    Fill the trainers' replay buffers with environment experience
+
+    Args:
+        env (multiagent_particle_env.environment.MultiAgentEnv): Multi-Agent Particle Environment object
+        trainers (list): Agent trainers, one per agent of the environment
+        num_steps (int): Number of environment steps
+        max_episode_len (int): Maximum episode length
+        rng (np.random.RandomState): Random actions are drawn from it when given, otherwise the actions of the
+                                     untrained policies are used
+    """
+    sizes = action_sizes(env)
+    obs_n = env.reset()
+    for step in range(num_steps):
+        if rng is None:
+            action_n = [agent.action(obs) for agent, obs in zip(trainers, obs_n)]
+        else:
+            action_n = [rng.dirichlet(np.ones(size)) for size in sizes]
+        new_obs_n, rew_n, done_n, _ = env.step(action_n)
+        terminal = (step + 1) % max_episode_len == 0
+        for i, agent in enumerate(trainers):
+            agent.experience(obs_n[i], action_n[i], rew_n[i], new_obs_n[i], done_n[i], terminal)
+        obs_n = env.reset() if all(done_n) or terminal else new_obs_n
+
+
+def time_updates(trainers, train_freq, num_updates, repeat):
+    """
+    Time updates of all trainers, one update being the preupdate() and update() of every trainer
+
+    Args:
+        trainers (list): Agent trainers with filled replay buffers
+        train_freq (int): Training steps between updates of the trainers, every timed update is at a multiple of it
+        num_updates (int): Number of updates per repeat
+        repeat (int): Number of timed repeats, after one untimed update
+
+    Returns:
+        (list) Duration of each repeat in seconds
+    """
+    def update(count):
+        for _ in range(count):
+            for agent in trainers:
+                agent.preupdate()
+            for agent in trainers:
+                agent.update(trainers, train_freq)
+
+    update(1)
+    seconds = []
+    for _ in range(repeat):
+        t_start = time.perf_counter()
+        update(num_updates)
+        seconds.append(time.perf_counter() - t_start)
+
+    return seconds
+
+
+def _train_updates(scenario, num_adversaries):
+    def train_updates(arglist):
+        try:
+            import tensorflow as tf
+            train = load_driver('train')
+        except ImportError as e:
+            raise Skip("tensorflow is unavailable ({})".format(e))
+
+        import maddpg.common.tf_util as tf_util
+        from multiagent_particle_env.make_env import make_env
+
+        train_args = driver_arglist(train, [
+            "--scenario", scenario,
+            "--num-adversaries", str(num_adversaries),
+            "--batch-size", str(arglist.batch_size),
+            "--max-episode-len", str(arglist.max_episode_len),
+            "--physics", arglist.physics,
+            "--max-substeps", str(arglist.max_substeps),
+            "--ccd-resolution", str(arglist.ccd_resolution),
+            "--session-profile", arglist.session_profile,
+            "--seed", "0",
+        ])
+
+        tf.reset_default_graph()
+        np.random.seed(0)
+        tf.set_random_seed(0)
+        with tf_util.profile_session(train_args.session_profile):
+            env = make_env(scenario, arglist=train_args)
+            obs_shape_n = [env.observation_space[i].shape for i in range(env.n)]
+            trainers = train.get_trainers(env, min(env.n, num_adversaries), obs_shape_n, train_args)
+            tf_util.initialize()
+
+            fill_replay_buffers(env, trainers, arglist.replay_fill, train_args.max_episode_len)
+            seconds = time_updates(trainers, train_args.train_freq, arglist.train_updates, arglist.repeat)
+
+        return rate_result([arglist.train_updates] * arglist.repeat, seconds, 'updates/sec', scenario=scenario,
+                           agents=env.n, batch_size=train_args.batch_size, session_profile=train_args.session_profile,
+                           ms_per_update=1e3 * float(np.median(seconds)) / arglist.train_updates)
+
+    return train_updates
+
+
+for _scenario, _num_adversaries in TRAIN_SCENARIOS:
+    benchmark("macro/train_updates/{}".format(_scenario))(_train_updates(_scenario, _num_adversaries))
@@ -0,0 +1,212 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+micro.py
+
+Micro benchmarks of the hot building blocks of training, each timed in isolation:
+    micro/replay_buffer/add/<size>: Adding a transition to a full ReplayBuffer of 1e4 to 1e6 transitions
+    micro/replay_buffer/sample/<size>: Sampling a batch from a full ReplayBuffer
+    micro/world_step/<entities>/<physics>: World.step of a world of 2 to 50 colliding entities per physics backend
+    micro/tf_function/call: tf_util._Function call of a trivial graph, i.e. the feed and session overhead
+    micro/ccm/get_score: pyMCCM.get_score on a coupled logistic map, as in the CCM trainer
+
+Updated and Enhanced version of OpenAI Multi-Agent Deep Deterministic Policy Gradient (MADDPG) Algorithm
+(https://github.com/openai/maddpg)
+"""
+
+import numpy as np
+
+from harness import benchmark, latency_result, measure, Skip
+
+__author__ = 'Rolando Fernandez'
+__copyright__ = 'Copyright 2020, Multi-Agent Deep Deterministic Policy Gradient'
+__credits__ = ['Rolando Fernandez', 'OpenAI']
+__license__ = ''
+__version__ = '0.0.1'
+__maintainer__ = 'Rolando Fernandez'
+__email__ = 'rolando.fernandez1.civ@mail.mil'
+__status__ = 'Dev'
+
+# Replay buffer sizes
+REPLAY_BUFFER_SIZES = (int(1e4), int(1e5), int(1e6))
+
+# Observation and action sizes of the stored transitions, those of an agent of converge/simple_hvt_1v1_random
+OBS_SIZE = 16
+ACT_SIZE = 5
+
+# Number of entities of the World.step benchmarks, half of them agents and the rest landmarks
+WORLD_SIZES = (2, 5, 10, 20, 50)
+
+
+########################################################################################################################
+# Replay buffer
+########################################################################################################################
+
+def _transitions(seed=0):
+    """
+    Endless chain of transitions of one episode, each starting at the previous one's next observation
+
+    Yields:
+        (tuple) obs_t, action, reward, obs_tp1, done
+    """
+    rng = np.random.RandomState(seed)
+    obs = rng.randn(OBS_SIZE)
+    while True:
+        obs_next = rng.randn(OBS_SIZE)
+        yield obs, rng.rand(ACT_SIZE), rng.randn(), obs_next, False
+        obs = obs_next
+
+
+def _full_replay_buffer(size):
+    from maddpg.trainer.replay_buffer import ReplayBuffer
+
+    replay_buffer = ReplayBuffer(size)
+    transitions = _transitions()
+    for _ in range(size):
+        replay_buffer.add(*next(transitions))
+
+    return replay_buffer, transitions
+
+
+def _replay_buffer_add(size):
+    def replay_buffer_add(arglist):
+        replay_buffer, transitions = _full_replay_buffer(size)
+
+        def add():
+            replay_buffer.add(*next(transitions))
+
+        return latency_result(measure(add, repeat=arglist.repeat, min_time=arglist.min_time), size=size)
+
+    return replay_buffer_add
+
+
+def _replay_buffer_sample(size):
+    def replay_buffer_sample(arglist):
+        replay_buffer, _ = _full_replay_buffer(size)
+
+        def sample():
+            replay_buffer.sample(arglist.batch_size)
+
+        return latency_result(measure(sample, repeat=arglist.repeat, min_time=arglist.min_time),
+                              size=size, batch_size=arglist.batch_size)
+
+    return replay_buffer_sample
+
+
+for _size in REPLAY_BUFFER_SIZES:
+    benchmark("micro/replay_buffer/add/1e{:.0f}".format(np.log10(_size)))(_replay_buffer_add(_size))
+    benchmark("micro/replay_buffer/sample/1e{:.0f}".format(np.log10(_size)))(_replay_buffer_sample(_size))
+
+
+########################################################################################################################
+# World step
+########################################################################################################################
+
+def colliding_world(num_entities, seed=0):
+    """
+    World of colliding agents and static landmarks spread over the unit square, every agent
+    pushing in a fixed random direction
+
+    Args:
+        num_entities (int): Number of entities, the first half (rounded up) being agents
+        seed (int): Seed of the positions and actions
+
+    Returns:
+        (multiagent_particle_env.core.World) World
+    """
+    from multiagent_particle_env.core import World, Agent, Landmark
+
+    rng = np.random.RandomState(seed)
+    world = World()
+    world.agents = [Agent() for _ in range((num_entities + 1) // 2)]
+    world.landmarks = [Landmark() for _ in range(num_entities // 2)]
+    for i, entity in enumerate(world.entities):
+        entity.name = 'entity {}'.format(i)
+        entity.collide = True
+        entity.state.p_pos = rng.uniform(-1, +1, world.dimension_position)
+        entity.state.p_vel = np.zeros(world.dimension_position)
+    for agent in world.agents:
+        agent.silent = True
+        agent.state.c = np.zeros(world.dimension_communication)
+        agent.action.u = rng.uniform(-1, +1, world.dimension_position)
+        agent.action.c = np.zeros(world.dimension_communication)
+
+    return world
+
+
+def _world_step(num_entities, physics):
+    def world_step(arglist):
+        if physics == 'numba':
+            from multiagent_particle_env.physics import NUMBA_KERNELS
+            if NUMBA_KERNELS is None:
+                raise Skip("numba is not installed")
+
+        world = colliding_world(num_entities)
+        world.physics = physics
+        world.step()
+
+        return latency_result(measure(world.step, repeat=arglist.repeat, min_time=arglist.min_time),
+                              entities=num_entities, physics=physics)
+
+    return world_step
+
+
+for _num_entities in WORLD_SIZES:
+    for _physics in ('reference', 'numpy', 'numba'):
+        benchmark("micro/world_step/{}/{}".format(_num_entities, _physics))(_world_step(_num_entities, _physics))
+
+
+########################################################################################################################
+# TensorFlow function call
+########################################################################################################################
+
+@benchmark("micro/tf_function/call")
+def tf_function_call(arglist):
+    """
+    Call of a tf_util._Function computing a single multiplication of a batch size 1 input, the path
+    of every action selection, compared with a bare Session.run of the same graph
+    """
+    try:
+        import tensorflow as tf
+        import maddpg.common.tf_util as tf_util
+    except ImportError:
+        raise Skip("tensorflow is not installed")
+
+    graph = tf.Graph()
+    with graph.as_default(), tf_util.profile_session("single", graph=graph) as session:
+        obs_ph = tf_util.BatchInput((OBS_SIZE,), name="observation")
+        output = 2.0 * obs_ph.get()
+        function = tf_util.function(inputs=[obs_ph], outputs=output)
+        obs = np.random.randn(1, OBS_SIZE)
+
+        call = measure(lambda: function(obs), repeat=arglist.repeat, min_time=arglist.min_time)
+        run = measure(lambda: session.run(output, feed_dict={obs_ph.get(): obs}),
+                      repeat=arglist.repeat, min_time=arglist.min_time)
+
+    return latency_result(call, session_run_us=run['median'] * 1e6,
+                          overhead_us=(call['median'] - run['median']) * 1e6)
+
+
+########################################################################################################################
+# CCM score
+########################################################################################################################
+
+@benchmark("micro/ccm/get_score")
+def ccm_get_score(arglist):
+    """
+    pyMCCM.get_score between the two series of a coupled logistic map, with the arguments
+    used by the CCM trainer (e_max=5, tau=1)
+    """
+    try:
+        import maddpg.common.pyMCCM as ccm
+    except Exception as e:
+        raise Skip("pyMCCM is unavailable ({})".format(e))
+
+    data = ccm.make_test_data(t=50, obs=20)
+    a_vec, b_vec = data[:, :, 0], data[:, :, 1]
+
+    timing = measure(lambda: ccm.get_score(a_vec, b_vec, e_max=5, tau=1, show_plot=False),
+                     repeat=arglist.repeat, number=1)
+
+    return latency_result(timing, scale=1e3, unit='ms/call', series=a_vec.shape)
@@ -0,0 +1,133 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+run_benchmarks.py
+
+Runs the micro and macro benchmarks, writes the results with machine metadata to JSON and
+optionally compares them with a stored baseline, exiting with status 1 when a benchmark regressed.
+
+Usage:
+    python run_benchmarks.py --output baseline.json
+    python run_benchmarks.py --compare baseline.json --threshold 0.1
+    python run_benchmarks.py --filter "micro/world_step/*" --filter "macro/env_steps/*"
+    python run_benchmarks.py --results current.json --compare baseline.json
+
+Updated and Enhanced version of OpenAI Multi-Agent Deep Deterministic Policy Gradient (MADDPG) Algorithm
+(https://github.com/openai/maddpg)
+"""
+
+import argparse
+import sys
+
+# Registers the micro benchmarks, then the macro benchmarks
+import harness
+import micro
+import macro
+
+__author__ = 'Rolando Fernandez'
+__copyright__ = 'Copyright 2020, Multi-Agent Deep Deterministic Policy Gradient'
+__credits__ = ['Rolando Fernandez', 'OpenAI']
+__license__ = ''
+__version__ = '0.0.1'
+__maintainer__ = 'Rolando Fernandez'
+__email__ = 'rolando.fernandez1.civ@mail.mil'
+__status__ = 'Dev'
+
+
+def parse_args():
+    """
+    Parse command line arguments
+
+    Returns:
+        parser.parse_args() (argparse.Namespace): Parsed commandline arguments object
+    """
+    # Setup argument parser
+    parser = argparse.ArgumentParser("Micro and macro benchmarks of MADDPG training on Multi-Agent Particle "
+                                     "Environments")
+
+    # Selection
+    parser.add_argument("--suite", type=str, default="all", choices=["micro", "macro", "all"],
+                        help="Benchmark suite to run")
+    parser.add_argument("--filter", type=str, action="append", default=None,
+                        help="Shell style pattern of the benchmark names to run, may be repeated")
+    parser.add_argument("--list", action="store_true", default=False, help="List the benchmarks and exit")
+
+    # Measurement
+    parser.add_argument("--repeat", type=int, default=5, help="Number of timed repeats of each benchmark")
+    parser.add_argument("--min-time", type=float, default=0.2,
+                        help="Minimum duration in seconds of a repeat of the micro benchmarks")
+    parser.add_argument("--batch-size", type=int, default=1024, help="Batch size of replay sampling and updates")
+    parser.add_argument("--max-episode-len", type=int, default=25, help="Maximum episode length")
+    parser.add_argument("--env-steps", type=int, default=2000,
+                        help="Environment steps per repeat of the environment step benchmarks")
+    parser.add_argument("--train-updates", type=int, default=20,
+                        help="Updates per repeat of the training update benchmarks")
+    parser.add_argument("--replay-fill", type=int, default=2500,
+                        help="Environment steps collected into the replay buffers before timing updates")
+    parser.add_argument("--physics", type=str, default="reference", choices=["reference", "numpy", "numba", "auto"],
+                        help="Physics backend of the macro benchmark environments")
+    parser.add_argument("--max-substeps", type=int, default=1,
+                        help="Maximum number of physics substeps of the macro benchmark environments")
+    parser.add_argument("--ccd-resolution", type=float, default=0.5,
+                        help="Largest relative move of a pair per substep, as a fraction of the pair's combined size")
+    parser.add_argument("--session-profile", type=str, default="single", choices=["single", "learner", "parallel"],
+                        help="TensorFlow thread pools of the training update benchmarks")
+
+    # Results
+    parser.add_argument("--output", type=str, default="/tmp/benchmarks/benchmarks.json",
+                        help="JSON file the results are written to")
+    parser.add_argument("--results", type=str, default=None,
+                        help="Compare an existing results file instead of running the benchmarks")
+    parser.add_argument("--compare", type=str, default=None, help="Baseline results file to compare with")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="Relative slowdown flagged as a regression, e.g. 0.1 for 10%%")
+
+    return parser.parse_args()
+
+
+def main(arglist):
+    """
+    Run the selected benchmarks and compare them with the baseline
+
+    Args:
+        arglist (argparse.Namespace): Parsed commandline arguments object
+
+    Returns:
+        (int) Exit status, 1 if a benchmark regressed
+    """
+    suites = None if arglist.suite == "all" else [arglist.suite]
+    names = harness.select(arglist.filter, suites)
+
+    if arglist.list:
+        print("\n".join(names))
+        return 0
+
+    if arglist.results is not None:
+        results = harness.load(arglist.results)
+    else:
+        results = harness.run(names, arglist)
+        harness.save(results, arglist.output)
+        print("Results saved to {}".format(arglist.output))
+
+    if arglist.compare is None:
+        return 0
+
+    baseline = harness.load(arglist.compare)
+    rows = harness.compare(results, baseline, arglist.threshold)
+    print(harness.format_comparison(rows, baseline.get('metadata')))
+
+    return 1 if any(row[4] == 'regression' for row in rows) else 0
+
+
+if __name__ == '__main__':
+    """
+    Main function
+
+    Parses commandline arguments and calls main()
+    """
+    # Parse commandline arguments
+    args = parse_args()
+
+    # Start program
+    sys.exit(main(args))
@@ -0,0 +1,386 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+scaling.py
+
+Measures how the environment and the MADDPG update scale with the number of agents on synthetic
+worlds (see synthetic.py), and plots the scaling curves.
+
+For every agent count N it records:
+    scaling/env_step/<N>: Environment step latency, observations and rewards included
+    scaling/obs_size/<N>: Observation size of an agent
+    scaling/critic_input/<N>: Critic input size, the concatenation of all agents' observations and actions
+    scaling/update/<N>: Time of one MADDPG update of all N agents
+and for each timed quantity the exponent k of its growth O(N^k), fitted on the larger half of the agent
+counts (scaling/env_step/exponent, scaling/update/exponent). Results use the layout of harness.py, so a
+stored baseline can be compared with --compare, flagging e.g. a quadratic step turning cubic.
+
+Usage:
+    python scaling.py --agents 2,4,8,16,32 --boundary 40 --output scaling.json --plots-dir plots/
+    python scaling.py --results scaling.json --plots-dir plots/
+    python scaling.py --agents 2,4,8,16,32 --compare scaling.json
+
+Updated and Enhanced version of OpenAI Multi-Agent Deep Deterministic Policy Gradient (MADDPG) Algorithm
+(https://github.com/openai/maddpg)
+"""
+
+import argparse
+from collections import OrderedDict
+import os
+import sys
+
+import numpy as np
+
+import harness
+from harness import latency_result, measure, Skip
+import macro
+import synthetic
+
+__author__ = 'Rolando Fernandez'
+__copyright__ = 'Copyright 2020, Multi-Agent Deep Deterministic Policy Gradient'
+__credits__ = ['Rolando Fernandez', 'OpenAI']
+__license__ = ''
+__version__ = '0.0.1'
+__maintainer__ = 'Rolando Fernandez'
+__email__ = 'rolando.fernandez1.civ@mail.mil'
+__status__ = 'Dev'
+
+
+def parse_args():
+    """
+    Parse command line arguments
+
+    Returns:
+        parser.parse_args() (argparse.Namespace): Parsed commandline arguments object
+    """
+    # Setup argument parser
+    parser = argparse.ArgumentParser("Scaling of the environment step and MADDPG update with the number of agents")
+
+    # Synthetic worlds
+    parser.add_argument("--agents", type=str, default="2,4,8,16,32", help="Comma separated agent counts")
+    parser.add_argument("--landmarks", type=int, default=2, help="Number of landmarks observed by the agents")
+    parser.add_argument("--landmarks-per-agent", type=float, default=0.0,
+                        help="Additional landmarks per agent, so that the landmarks grow with the agents")
+    parser.add_argument("--boundary", type=int, default=0,
+                        help="Number of boundary landmarks along the edge of the arena")
+    parser.add_argument("--physics", type=str, default="reference", choices=["reference", "numpy", "numba", "auto"],
+                        help="Physics backend of the environment step")
+    parser.add_argument("--max-substeps", type=int, default=1,
+                        help="Maximum number of physics substeps for entities that come into contact during a step "
+                             "(continuous collision detection), 1 to disable")
+    parser.add_argument("--ccd-resolution", type=float, default=0.5,
+                        help="Largest relative move of a pair per substep, as a fraction of the pair's combined size")
+
+    # Measurement
+    parser.add_argument("--repeat", type=int, default=5, help="Number of timed repeats")
+    parser.add_argument("--min-time", type=float, default=0.2,
+                        help="Minimum duration in seconds of a repeat of the environment step")
+    parser.add_argument("--no-updates", action="store_true", default=False,
+                        help="Only measure the environment, without building trainers")
+    parser.add_argument("--batch-size", type=int, default=1024, help="Batch size of the updates")
+    parser.add_argument("--max-episode-len", type=int, default=25, help="Maximum episode length")
+    parser.add_argument("--train-updates", type=int, default=5, help="Updates per timed repeat")
+    parser.add_argument("--replay-fill", type=int, default=1100,
+                        help="Environment steps of random actions collected into the replay buffers before timing "
+                             "updates")
+    parser.add_argument("--session-profile", type=str, default="single", choices=["single", "learner", "parallel"],
+                        help="TensorFlow thread pools of the updates")
+
+    # Results
+    parser.add_argument("--output", type=str, default="/tmp/benchmarks/scaling.json",
+                        help="JSON file the results are written to")
+    parser.add_argument("--results", type=str, default=None,
+                        help="Plot and compare an existing results file instead of measuring")
+    parser.add_argument("--plots-dir", type=str, default="/tmp/benchmarks/",
+                        help="Directory where the scaling plots are saved, empty to skip plotting")
+    parser.add_argument("--compare", type=str, default=None, help="Baseline results file to compare with")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="Relative slowdown flagged as a regression, e.g. 0.1 for 10%%")
+
+    return parser.parse_args()
+
+
+def num_landmarks(num_agents, arglist):
+    """
+    Returns:
+        (int) Number of landmarks of the world of num_agents agents
+    """
+    return arglist.landmarks + int(round(arglist.landmarks_per_agent * num_agents))
+
+
+def measure_env(num_agents, arglist):
+    """
+    Time the environment step of a synthetic world
+
+    Args:
+        num_agents (int): Number of agents
+        arglist (argparse.Namespace): Parsed commandline arguments object
+
+    Returns:
+        (dict) Step latency result, with the entity count and the observation and critic input sizes
+    """
+    env = synthetic.make_env(num_agents, num_landmarks(num_agents, arglist), arglist.boundary, arglist)
+    sizes = macro.action_sizes(env)
+    rng = np.random.RandomState(0)
+    np.random.seed(0)
+
+    # Random actions drawn up front, so that only the environment is timed
+    actions = [[rng.rand(size) for size in sizes] for _ in range(arglist.max_episode_len)]
+    state = {'step': 0}
+
+    def step():
+        env.step(actions[state['step']])
+        state['step'] += 1
+        if state['step'] == arglist.max_episode_len:
+            env.reset()
+            state['step'] = 0
+
+    env.reset()
+    obs_sizes = [space.shape[0] for space in env.observation_space]
+
+    return latency_result(measure(step, repeat=arglist.repeat, min_time=arglist.min_time), unit='us/step',
+                          agents=num_agents, entities=len(env.world.entities), obs_size=obs_sizes[0],
+                          critic_input_size=int(np.sum(obs_sizes) + np.sum(sizes)), physics=arglist.physics)
+
+
+def measure_updates(num_agents, arglist):
+    """
+    Time the MADDPG update of all agents of a synthetic world, with the trainers of experiments/train.py
+
+    Args:
+        num_agents (int): Number of agents
+        arglist (argparse.Namespace): Parsed commandline arguments object
+
+    Returns:
+        (dict) Update latency result in milliseconds
+
+    Raises:
+        Skip: When TensorFlow is unavailable
+    """
+    try:
+        import tensorflow as tf
+        train = macro.load_driver('train')
+    except ImportError as e:
+        raise Skip("tensorflow is unavailable ({})".format(e))
+
+    import maddpg.common.tf_util as tf_util
+
+    train_args = macro.driver_arglist(train, [
+        "--batch-size", str(arglist.batch_size),
+        "--max-episode-len", str(arglist.max_episode_len),
+        "--session-profile", arglist.session_profile,
+        "--seed", "0",
+    ])
+
+    tf.reset_default_graph()
+    np.random.seed(0)
+    tf.set_random_seed(0)
+    with tf_util.profile_session(train_args.session_profile):
+        env = synthetic.make_env(num_agents, num_landmarks(num_agents, arglist), arglist.boundary, arglist)
+        obs_shape_n = [env.observation_space[i].shape for i in range(env.n)]
+        trainers = train.get_trainers(env, 0, obs_shape_n, train_args)
+        tf_util.initialize()
+
+        macro.fill_replay_buffers(env, trainers, arglist.replay_fill, train_args.max_episode_len,
+                                  rng=np.random.RandomState(0))
+        seconds = macro.time_updates(trainers, train_args.train_freq, arglist.train_updates, arglist.repeat)
+
+    seconds_per_update = np.array(seconds) / arglist.train_updates
+    timing = {'median': float(np.median(seconds_per_update)), 'min': float(np.min(seconds_per_update)),
+              'std': float(np.std(seconds_per_update)), 'number': arglist.train_updates, 'repeat': arglist.repeat}
+
+    return latency_result(timing, scale=1e3, unit='ms/update', agents=num_agents, batch_size=train_args.batch_size,
+                          session_profile=train_args.session_profile)
+
+
+def scaling_exponent(agents, values):
+    """
+    Exponent k of values growing as O(agents^k), the slope of a least squares line in log-log space
+    fitted on the larger half of the agent counts, where the asymptotic term dominates
+
+    Args:
+        agents (list): Agent counts, ascending
+        values (list): Measured values, positive
+
+    Returns:
+        (float) Exponent, None with fewer than two points
+    """
+    if len(agents) < 2:
+        return None
+
+    start = len(agents) // 2 if len(agents) >= 4 else 0
+    return float(np.polyfit(np.log(agents[start:]), np.log(values[start:]), 1)[0])
+
+
+def curve(results, quantity):
+    """
+    Points of a scaling curve
+
+    Args:
+        results (dict): Scaling results
+        quantity (str): One of 'env_step', 'obs_size', 'critic_input' and 'update'
+
+    Returns:
+        agents (list): Agent counts with a measured value, ascending
+        values (list): Measured values
+    """
+    points = []
+    prefix = "scaling/{}/".format(quantity)
+    for name, result in results['benchmarks'].items():
+        if name.startswith(prefix) and name[len(prefix):].isdigit() and 'value' in result:
+            points.append((int(name[len(prefix):]), result['value']))
+    points.sort()
+
+    return [p[0] for p in points], [p[1] for p in points]
+
+
+def run(arglist):
+    """
+    Measure every agent count
+
+    Args:
+        arglist (argparse.Namespace): Parsed commandline arguments object
+
+    Returns:
+        (dict) Results in the layout of harness.run()
+    """
+    agent_counts = sorted(int(n) for n in arglist.agents.split(",") if n)
+    results = {'version': harness.RESULTS_VERSION, 'metadata': harness.machine_metadata(),
+               'arguments': vars(arglist), 'benchmarks': OrderedDict()}
+    benchmarks = results['benchmarks']
+
+    def record(name, func):
+        try:
+            benchmarks[name] = func()
+        except Skip as e:
+            benchmarks[name] = {'skipped': str(e)}
+        print(harness.format_result(name, benchmarks[name]))
+        sys.stdout.flush()
+
+    for num_agents in agent_counts:
+        env_step = measure_env(num_agents, arglist)
+        benchmarks["scaling/env_step/{}".format(num_agents)] = env_step
+        benchmarks["scaling/obs_size/{}".format(num_agents)] = {
+            'value': env_step['obs_size'], 'unit': 'floats', 'higher_is_better': False, 'agents': num_agents}
+        benchmarks["scaling/critic_input/{}".format(num_agents)] = {
+            'value': env_step['critic_input_size'], 'unit': 'floats', 'higher_is_better': False, 'agents': num_agents}
+        for quantity in ('env_step', 'obs_size', 'critic_input'):
+            name = "scaling/{}/{}".format(quantity, num_agents)
+            print(harness.format_result(name, benchmarks[name]))
+
+        if not arglist.no_updates:
+            record("scaling/update/{}".format(num_agents), lambda: measure_updates(num_agents, arglist))
+
+    for quantity in ('env_step', 'update'):
+        agents, values = curve(results, quantity)
+        exponent = scaling_exponent(agents, values)
+        if exponent is not None:
+            name = "scaling/{}/exponent".format(quantity)
+            benchmarks[name] = {'value': exponent, 'unit': 'exponent', 'higher_is_better': False,
+                                'agents': agents[len(agents) // 2 if len(agents) >= 4 else 0:]}
+            print(harness.format_result(name, benchmarks[name]))
+
+    return results
+
+
+def plot(results, plots_dir):
+    """
+    Plot the scaling curves on log-log axes and save the plot
+
+    Args:
+        results (dict): Scaling results
+        plots_dir (str): Directory where to save the plots
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from matplotlib.ticker import NullFormatter
+
+    panels = [
+        ("Environment step", [('env_step', "step")], "Latency (us/step)"),
+        ("Input sizes", [('obs_size', "observation"), ('critic_input', "critic input")], "Floats"),
+        ("MADDPG update", [('update', "update of all agents")], "Latency (ms/update)"),
+    ]
+
+    plt.figure(figsize=(15, 5))
+    for i, (title, quantities, y_axis_label) in enumerate(panels):
+        plt.subplot(1, len(panels), i + 1)
+        measured = []
+        for quantity, label in quantities:
+            agents, values = curve(results, quantity)
+            if not agents:
+                continue
+            exponent = scaling_exponent(agents, values)
+            if exponent is not None:
+                label = "{} O(N^{:.2f})".format(label, exponent)
+            plt.loglog(agents, values, marker='o', label=label)
+            measured += agents
+
+        if measured:
+            # Label the measured agent counts instead of powers of ten
+            plt.gca().xaxis.set_minor_formatter(NullFormatter())
+            plt.xticks(sorted(set(measured)), [str(n) for n in sorted(set(measured))])
+        else:
+            plt.text(0.5, 0.5, "Not measured", ha='center', va='center', transform=plt.gca().transAxes)
+        plt.xlabel('# of agents (N)')
+        plt.ylabel(y_axis_label)
+        plt.title(title)
+        plt.grid(True, which='both', alpha=0.3)
+        if plt.gca().get_legend_handles_labels()[0]:
+            plt.legend()
+    plt.tight_layout()
+
+    if not os.path.exists(plots_dir):
+        os.makedirs(plots_dir, exist_ok=True)
+    for extension in ('pdf', 'png'):
+        plt.savefig(os.path.join(plots_dir, "scaling." + extension), dpi=300, bbox_inches='tight')
+    plt.close()
+
+    print("Plots saved to {}".format(plots_dir))
+
+
+def main(arglist):
+    """
+    Measure, plot and compare the scaling curves
+
+    Args:
+        arglist (argparse.Namespace): Parsed commandline arguments object
+
+    Returns:
+        (int) Exit status, 1 if a quantity regressed
+    """
+    if arglist.results is not None:
+        results = harness.load(arglist.results)
+    else:
+        results = run(arglist)
+        harness.save(results, arglist.output)
+        print("Results saved to {}".format(arglist.output))
+
+    if arglist.plots_dir:
+        try:
+            plot(results, arglist.plots_dir)
+        except ImportError:
+            print("matplotlib is not installed, skipping the plots")
+
+    if arglist.compare is None:
+        return 0
+
+    baseline = harness.load(arglist.compare)
+    rows = harness.compare(results, baseline, arglist.threshold)
+    print(harness.format_comparison(rows, baseline.get('metadata')))
+
+    return 1 if any(row[4] == 'regression' for row in rows) else 0
+
+
+if __name__ == '__main__':
+    """
+    Main function
+
+    Parses commandline arguments and calls main()
+    """
+    # Parse commandline arguments
+    args = parse_args()
+
+    # Start program
+    sys.exit(main(args))
@@ -0,0 +1,227 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+synthetic.py
+
+Synthetic scenario with configurable numbers of agents, landmarks and boundary entities, used to
+measure how the environment and the trainers scale with the size of the world.
+
+The world follows the layout of the tag scenarios: colliding agents, static colliding landmarks
+and a ring of static boundary landmarks around the arena. Every agent observes its own velocity
+and position, the positions of the landmarks and the positions and velocities of the other agents,
+so the observation grows linearly with the number of agents and landmarks, and is rewarded for
+approaching the nearest landmark while avoiding collisions with other agents.
+
+Updated and Enhanced version of OpenAI Multi-Agent Deep Deterministic Policy Gradient (MADDPG) Algorithm
+(https://github.com/openai/maddpg)
+"""
+
+import numpy as np
+
+import harness  # Adds the modules to the path
+
+from multiagent_particle_env.core import World, Agent, Landmark
+from multiagent_particle_env.environment import MultiAgentEnv
+from multiagent_particle_env.logger import Logger
+from multiagent_particle_env.scenario import BaseScenario
+
+__author__ = 'Rolando Fernandez'
+__copyright__ = 'Copyright 2020, Multi-Agent Deep Deterministic Policy Gradient'
+__credits__ = ['Rolando Fernandez', 'OpenAI']
+__license__ = ''
+__version__ = '0.0.1'
+__maintainer__ = 'Rolando Fernandez'
+__email__ = 'rolando.fernandez1.civ@mail.mil'
+__status__ = 'Dev'
+
+
+class Scenario(BaseScenario):
+    """
+    Define the world, reward, and observations of a synthetic scenario.
+    """
+    def __init__(self, num_agents=2, num_landmarks=2, num_boundary=0):
+        """
+        Args:
+            num_agents (int): Number of agents
+            num_landmarks (int): Number of landmarks observed by the agents
+            num_boundary (int): Number of boundary landmarks spread along the edge of the arena
+        """
+        self.num_agents = num_agents
+        self.num_landmarks = num_landmarks
+        self.num_boundary = num_boundary
+
+    def make_world(self, args=None):
+        """
+        Construct the world
+
+        Returns:
+            world (multiagent_particle_env.core.World): World object with agents and landmarks
+        """
+        # Create world and set properties
+        world = World()
+        world.dimension_communication = 2
+
+        # Add agents
+        world.agents = [Agent() for i in range(self.num_agents)]
+        for i, agent in enumerate(world.agents):
+            agent.name = 'agent {}'.format(i)
+            agent.collide = True
+            agent.silent = True
+            agent.size = 0.05
+            agent.accel = 3.0
+            agent.max_speed = 1.0
+
+        # Add landmarks
+        world.landmarks = [Landmark() for i in range(self.num_landmarks)]
+        for i, landmark in enumerate(world.landmarks):
+            landmark.name = 'landmark {}'.format(i)
+            landmark.boundary = False
+            landmark.collide = True
+            landmark.movable = False
+            landmark.size = 0.1
+
+        # Add boundary landmarks
+        boundaries = [Landmark() for i in range(self.num_boundary)]
+        for i, bound in enumerate(boundaries):
+            bound.name = 'boundary {}'.format(i)
+            bound.boundary = True
+            bound.collide = True
+            bound.movable = False
+            bound.size = 0.12
+        world.landmarks = world.landmarks + boundaries
+
+        # Make initial conditions
+        self.reset_world(world)
+
+        return world
+
+    def reset_world(self, world):
+        """
+        Reset the world to the initial conditions.
+
+        Args:
+            world (multiagent_particle_env.core.World): World object with agents and landmarks
+        """
+        # Set properties for agents and landmarks
+        for agent in world.agents:
+            agent.color = np.array([0.35, 0.35, 0.85])
+        for landmark in world.landmarks:
+            landmark.color = np.array([0.25, 0.25, 0.25])
+
+        # Set random initial states for agents
+        for agent in world.agents:
+            agent.state.p_pos = np.random.uniform(-1, +1, world.dimension_position)
+            agent.state.p_vel = np.zeros(world.dimension_position)
+            agent.state.c = np.zeros(world.dimension_communication)
+
+        # Set random initial states for landmarks, boundary landmarks evenly spaced along the edge of the arena
+        boundary_pos = self.boundary_positions()
+        boundary_index = 0
+        for landmark in world.landmarks:
+            if not landmark.boundary:
+                landmark.state.p_pos = np.random.uniform(-0.9, +0.9, world.dimension_position)
+            else:
+                landmark.state.p_pos = boundary_pos[boundary_index]
+                boundary_index += 1
+            landmark.state.p_vel = np.zeros(world.dimension_position)
+
+    def boundary_positions(self):
+        """
+        Returns:
+            (np.array) Positions of the boundary landmarks along the square of side 2.2 around the arena,
+                       shape [num_boundary, 2]
+        """
+        # Distance along the perimeter, starting at the bottom left corner and going counterclockwise
+        distance = 8.8 * np.arange(self.num_boundary) / max(self.num_boundary, 1)
+        side = (distance // 2.2).astype(int)
+        offset = distance - 2.2 * side - 1.1
+
+        positions = np.zeros((self.num_boundary, 2))
+        positions[side == 0] = np.stack([offset[side == 0], np.full(np.sum(side == 0), -1.1)], axis=1)
+        positions[side == 1] = np.stack([np.full(np.sum(side == 1), 1.1), offset[side == 1]], axis=1)
+        positions[side == 2] = np.stack([-offset[side == 2], np.full(np.sum(side == 2), 1.1)], axis=1)
+        positions[side == 3] = np.stack([np.full(np.sum(side == 3), -1.1), -offset[side == 3]], axis=1)
+
+        return positions
+
+    def reward(self, agent, world):
+        """
+        Reward is the negative distance to the nearest landmark, minus one for every collision with another agent.
+
+        Args:
+            agent (multiagent_particle_env.core.Agent): Agent object
+            world (multiagent_particle_env.core.World): World object with agents and landmarks
+
+        Returns:
+            (float) Total agent reward
+        """
+        reward = 0.0
+        distances = [np.sqrt(np.sum(np.square(landmark.state.p_pos - agent.state.p_pos)))
+                     for landmark in world.landmarks if not landmark.boundary]
+        if distances:
+            reward -= min(distances)
+
+        for other in world.agents:
+            if other is not agent and world.is_collision(other, agent):
+                reward -= 1.0
+
+        return reward
+
+    def observation(self, agent, world):
+        """
+        Define the observations.
+
+        Args:
+            agent (multiagent_particle_env.core.Agent): Agent object
+            world (multiagent_particle_env.core.World): World object with agents and landmarks
+
+        Returns:
+            (np.array) Observations array with the velocity of the agent, the position of the agent,
+                       the positions of the landmarks in the agent's reference frame, and the
+                       positions in the agent's reference frame and velocities of the other agents,
+                       size 4 + 2 * num_landmarks + 4 * (num_agents - 1)
+        """
+        # Get positions all landmarks that are not boundary markers in this agent's reference frame
+        landmarks_pos = []
+        for landmark in world.landmarks:
+            if not landmark.boundary:
+                landmarks_pos.append(landmark.state.p_pos - agent.state.p_pos)
+
+        # Positions and velocities of all other agents in this agent's reference frame
+        other_pos = []
+        other_vel = []
+        for other in world.agents:
+            if other is agent:
+                continue
+            other_pos.append(other.state.p_pos - agent.state.p_pos)
+            other_vel.append(other.state.p_vel)
+
+        return np.concatenate([agent.state.p_vel] + [agent.state.p_pos] + landmarks_pos + other_pos + other_vel)
+
+
+def make_env(num_agents, num_landmarks=2, num_boundary=0, arglist=None):
+    """
+    Creates a MultiAgentEnv of the synthetic scenario, applying the world options of make_env
+
+    Args:
+        num_agents (int): Number of agents
+        num_landmarks (int): Number of landmarks observed by the agents
+        num_boundary (int): Number of boundary landmarks spread along the edge of the arena
+        arglist (argparse.Namespace): Parsed commandline arguments object, with the physics, max_substeps
+                                      and ccd_resolution options of make_env
+
+    Returns:
+        env (multiagent_particle_env.environment.MultiAgentEnv): Multi-Agent Particle Environment object
+    """
+    scenario = Scenario(num_agents, num_landmarks, num_boundary)
+    world = scenario.make_world(arglist)
+
+    if arglist is not None and getattr(arglist, "physics", None):
+        world.physics = arglist.physics
+    if arglist is not None and getattr(arglist, "max_substeps", None):
+        world.max_substeps = arglist.max_substeps
+        world.ccd_resolution = getattr(arglist, "ccd_resolution", world.ccd_resolution)
+
+    return MultiAgentEnv(world, arglist, Logger(False), reset_callback=scenario.reset_world,
+                         reward_callback=scenario.reward, observation_callback=scenario.observation)
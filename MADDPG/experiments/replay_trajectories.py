@@ -0,0 +1,116 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+replay_trajectories.py
+
+Replay trajectories recorded with --trajectory-dir without building the policy networks.
+
+Updated and Enhanced version of OpenAI Multi-Agent Deep Deterministic Policy Gradient (MADDPG) Algorithm
+(https://github.com/openai/maddpg)
+"""
+
+import argparse
+import numpy as np
+import os
+import sys
+import time
+
+###########################################
+#         Add modules to path             #
+###########################################
+script_path = os.path.abspath(sys.argv[0])
+split_script_path = script_path.split("/")
+module_parent_dir = "/".join(split_script_path[:len(split_script_path)-3])
+
+if 'win' in sys.platform:
+    split_script_path = script_path.split("\\")
+    module_parent_dir = "\\".join(split_script_path[:len(split_script_path)-3])
+
+sys.path.insert(0, module_parent_dir + '/Multi-Agent-Particle-Environment/')
+
+from multiagent_particle_env.make_env import make_env
+from multiagent_particle_env.trajectory import TrajectoryReader
+
+
+__author__ = 'Rolando Fernandez'
+__copyright__ = 'Copyright 2020, Multi-Agent Deep Deterministic Policy Gradient'
+__credits__ = ['Rolando Fernandez', 'OpenAI']
+__license__ = ''
+__version__ = '0.0.1'
+__maintainer__ = 'Rolando Fernandez'
+__email__ = 'rolando.fernandez1.civ@mail.mil'
+__status__ = 'Dev'
+
+
+def parse_args():
+    """
+    Parse command line arguments
+
+    Returns:
+        parser.parse_args() (argparse.Namespace): Parsed commandline arguments object
+    """
+    parser = argparse.ArgumentParser("Trajectory replay for multiagent environments")
+
+    # Environment
+    parser.add_argument("--scenario", type=str, default="converge/simple_hvt_1v1_random",
+                        help="Name of the scenario script the trajectories were recorded with")
+    parser.add_argument("--num-adversaries", type=int, default=0, help="Number of adversaries")
+    parser.add_argument("--num-fixed-adv", type=int, default=0, help="Number of adversaries following a fixed strategy")
+    parser.add_argument("--num-fixed", type=int, default=0, help="Number of agents following a fixed strategy")
+    parser.add_argument("--fixed", action="store_true", default=False, help="Flag for enabling fixed policy agents")
+    parser.add_argument("--perturbation", action="store_true", default=False,
+                        help="Flag for controlling perturbation analysis")
+
+    # Replay
+    parser.add_argument("--trajectory-dir", type=str, required=True, help="Directory of recorded trajectories")
+    parser.add_argument("--episodes", nargs='+', type=int, default=None,
+                        help="Episode indices to replay, defaults to all")
+    parser.add_argument("--delay", type=float, default=0.1, help="Seconds between rendered steps")
+    parser.add_argument("--summary", action="store_true", default=False,
+                        help="Print per-episode rewards instead of rendering")
+
+    return parser.parse_args()
+
+
+def replay(arglist):
+    """
+    Render or summarize recorded trajectories
+
+    Args:
+        arglist (argparse.Namespace): Parsed commandline arguments object
+    """
+    reader = TrajectoryReader(arglist.trajectory_dir)
+    print("Loaded {} episodes from {}".format(reader.num_episodes, arglist.trajectory_dir))
+
+    episodes = arglist.episodes if arglist.episodes is not None else range(reader.num_episodes)
+
+    # Summaries only need the file
+    if arglist.summary:
+        rewards = reader.episode_rewards()
+        for i in episodes:
+            print("Episode {}: length {}, agent rewards {}".format(i, reader.episodes[i][1] - 1, rewards[i]))
+        print("Mean agent rewards: {}".format(np.mean(rewards[list(episodes)], axis=0)))
+        return
+
+    env = make_env(arglist.scenario, arglist=arglist)
+    env.reset()
+
+    for i in episodes:
+        for _ in reader.replay(env, i, render=True):
+            time.sleep(arglist.delay)
+        print('Episode {} Reward: {}'.format(i, reader.episode(i)['reward'].sum(axis=0)))
+        time.sleep(0.5)
+
+
+if __name__ == '__main__':
+    """
+    Main function
+
+    Parses commandline arguments and calls replay()
+    """
+    # Parse commandline arguments
+    args = parse_args()
+
+    # Start program
+    replay(args)
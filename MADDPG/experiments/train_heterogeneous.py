@@ -37,9 +37,11 @@ if 'win' in sys.platform:
 sys.path.insert(0, module_parent_dir + '/MADDPG/')
 sys.path.insert(0, module_parent_dir + '/Multi-Agent-Particle-Environment/')
 
+from maddpg.common.checkpoint import AsyncCheckpointWriter
 from maddpg.trainer.maddpg import MADDPGAgentTrainer
 from multiagent_particle_env.make_env import make_env
 
+import maddpg.common.profiler as profiler
 import maddpg.common.tf_util as tf_util
 
 
@@ -78,6 +80,23 @@ def parse_args():
     parser.add_argument("--gamma", type=float, default=0.95, help="Discount factor")
     parser.add_argument("--batch-size", type=int, default=1024, help="Number of episodes to optimize at the same time")
     parser.add_argument("--num-units", type=int, default=64, help="Number of units in the mlp")
+    parser.add_argument("--n-step", type=int, default=1,
+                        help="Number of rewards accumulated in the critic target, 1 for one-step targets")
+    parser.add_argument("--train-freq", type=int, default=100, help="Number of training steps between updates")
+    parser.add_argument("--gradient-steps", type=int, default=1,
+                        help="Number of gradient steps taken on each sampled batch")
+    parser.add_argument("--warmup", type=int, default=None,
+                        help="Minimum number of transitions in the replay buffer before updating, "
+                             "defaults to 30 for MADDPG and 12500 for CCM trainers")
+    parser.add_argument("--tau", type=float, default=0.01, help="Polyak averaging rate of the target networks")
+    parser.add_argument("--target-update-interval", type=int, default=0,
+                        help="Copy the networks to their targets every this many gradient steps instead of "
+                             "Polyak averaging, 0 to average")
+    parser.add_argument("--session-profile", type=str, default="single", choices=["single", "learner", "parallel"],
+                        help="TensorFlow thread pools: single thread, one large op at a time on every core (learner), "
+                             "or concurrent ops on every core (parallel)")
+    parser.add_argument("--precision", type=str, default="float32", choices=["float32", "bfloat16", "float16"],
+                        help="Precision of the MLP forward passes, variables stay float32")
 
     # Checkpointing
     parser.add_argument("--exp-name", type=str, default="debug", help="Name of the experiment")
@@ -89,6 +108,10 @@ def parse_args():
     parser.add_argument("--load-dir", type=str, default=None,
                         help="Directory in which training state and model are loaded")
     parser.add_argument("--model-file", type=str, default="debug", help="Exact name of model file to restore")
+    parser.add_argument("--keep-checkpoints", type=int, default=5,
+                        help="Number of most recent checkpoints to keep")
+    parser.add_argument("--keep-checkpoint-every", type=int, default=None,
+                        help="Additionally keep every n-th checkpoint")
 
     # Evaluation
     parser.add_argument("--pred-0-network", type=int, default=None,
@@ -108,11 +131,29 @@ def parse_args():
                         help="Directory where plot data is saved")
     parser.add_argument("--logging", action="store_true", default=False, help="Flag to control logging of agent data")
     parser.add_argument("--log-append", type=str, default="", help="Additional string to append to log file")
+    parser.add_argument("--log-format", type=str, default="csv", choices=["csv", "npz"],
+                        help="Format of the state log, csv or chunked column npz")
+    parser.add_argument("--profile-rate", type=int, default=0,
+                        help="Environment steps between reports of the time spent per training phase, 0 to disable")
+    parser.add_argument("--profile-format", type=str, default="stdout,csv",
+                        help="Comma separated logger output formats of the profiling reports, files go to --save-dir")
 
     #CCM
     parser.add_argument("--perturbation", action="store_true", default=False,
                         help="Flag for controlling perturbation analysis")
     parser.add_argument("--seed", type=int, default=None, help="Random seed for evaluation")
+    parser.add_argument("--reset-bank", type=int, default=0,
+                        help="Number of pre-sampled initial states to reset episodes from, drawn reproducibly from "
+                             "--seed, 0 to sample a new state every episode. Only entity states are restored, so "
+                             "only scenarios with supports_reset_bank, e.g. the converge HVT scenarios, accept it")
+    parser.add_argument("--physics", type=str, default="reference", choices=["reference", "numpy", "numba", "auto"],
+                        help="Physics backend of the environment step, per-entity reference code or flat array "
+                             "kernels (auto uses numba when installed, otherwise numpy)")
+    parser.add_argument("--max-substeps", type=int, default=1,
+                        help="Maximum number of physics substeps for entities that come into contact during a step "
+                             "(continuous collision detection), 1 to disable")
+    parser.add_argument("--ccd-resolution", type=float, default=0.5,
+                        help="Largest relative move of a pair per substep, as a fraction of the pair's combined size")
     parser.add_argument("--history-length", type=int, default=1, help="History/Frames in input space")
     parser.add_argument("--training-history", type=int, default=1,
                         help="Number of frames of agent history to include in training")
@@ -163,7 +204,7 @@ def get_trainers(env, num_adversaries, obs_shape_n, arglist):
                          If using CCM, a list of maddpg.trainer.maddpg.MADDPGAgentTrainerCCM objects.
     """
     trainers = []
-    model = mlp_model
+    model = tf_util.mixed_precision_model(mlp_model, arglist.precision)
 
     trainer = MADDPGAgentTrainer
 
@@ -196,12 +237,16 @@ def train(arglist):
         tf.set_random_seed(arglist.seed)
 
     # with tf_util.make_session(6):
-    with tf_util.single_threaded_session():
+    with tf_util.profile_session(arglist.session_profile):
         ###########################################
         #         Create environment              #
         ###########################################
         env = make_env(arglist.scenario, arglist=arglist, logging=arglist.logging, benchmark=arglist.benchmark)
 
+        # Profile the hot paths of the training loop
+        profiler.configure(arglist.profile_rate, arglist.save_dir, arglist.profile_format.split(","))
+        profiler.instrument_env(env)
+
         ###########################################
         #        Create agent trainers            #
         ###########################################
@@ -270,7 +315,8 @@ def train(arglist):
         # Placeholder for benchmarking info
         agent_info = [[[]]]
 
-        saver = tf.train.Saver()
+        checkpointer = AsyncCheckpointWriter(keep_last=arglist.keep_checkpoints,
+                                             keep_every=arglist.keep_checkpoint_every)
         obs_n = env.reset()
         episode_step = 0
         train_step = 0
@@ -315,6 +361,7 @@ def train(arglist):
 
             # Environment step
             new_obs_n, rew_n, done_n, info_n = env.step(action_n)
+            profiler.step()
 
             # Logging step
             if arglist.logging:
@@ -396,8 +443,7 @@ def train(arglist):
                 # TODO: Implement some checks so that we don't overwrite old networks unintentionally?
 
                 # Save model state
-                tf_util.save_state(arglist.save_dir + arglist.exp_name + '_' + str(len(episode_rewards)+prev_ep_ct),
-                                   saver=saver)
+                checkpointer.save(arglist.save_dir + arglist.exp_name + '_' + str(len(episode_rewards)+prev_ep_ct))
 
                 # Print statement depends on whether or not there are adversaries
                 if num_adversaries == 0:
@@ -439,6 +485,9 @@ def train(arglist):
                 print('...Finished total of {} episodes.'.format(len(episode_rewards)))
                 break
 
+        checkpointer.close()
+        profiler.close()
+
 
 if __name__ == '__main__':
     """
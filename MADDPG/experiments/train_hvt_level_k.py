@@ -38,9 +38,13 @@ if 'win' in sys.platform:
 sys.path.insert(0, module_parent_dir + '/MADDPG/')
 sys.path.insert(0, module_parent_dir + '/Multi-Agent-Particle-Environment/')
 
+from maddpg.common.checkpoint import AsyncCheckpointWriter
+from maddpg.common.numpy_policy import NumpyActorGroup, freeze_actor
+from maddpg.common.policy_export import PolicyExport, export_policies, is_policy_export, load_policy
 from maddpg.trainer.maddpg import MADDPGAgentTrainer
 from multiagent_particle_env.make_env import make_env
 
+import maddpg.common.profiler as profiler
 import maddpg.common.tf_util as tf_util
 
 __author__ = 'Rolando Fernandez'
@@ -80,6 +84,23 @@ def parse_args():
     parser.add_argument("--gamma", type=float, default=0.95, help="Discount factor")
     parser.add_argument("--batch-size", type=int, default=1024, help="Number of episodes to optimize at the same time")
     parser.add_argument("--num-units", type=int, default=64, help="Number of units in the mlp")
+    parser.add_argument("--n-step", type=int, default=1,
+                        help="Number of rewards accumulated in the critic target, 1 for one-step targets")
+    parser.add_argument("--train-freq", type=int, default=100, help="Number of training steps between updates")
+    parser.add_argument("--gradient-steps", type=int, default=1,
+                        help="Number of gradient steps taken on each sampled batch")
+    parser.add_argument("--warmup", type=int, default=None,
+                        help="Minimum number of transitions in the replay buffer before updating, "
+                             "defaults to 30 for MADDPG and 12500 for CCM trainers")
+    parser.add_argument("--tau", type=float, default=0.01, help="Polyak averaging rate of the target networks")
+    parser.add_argument("--target-update-interval", type=int, default=0,
+                        help="Copy the networks to their targets every this many gradient steps instead of "
+                             "Polyak averaging, 0 to average")
+    parser.add_argument("--session-profile", type=str, default="single", choices=["single", "learner", "parallel"],
+                        help="TensorFlow thread pools: single thread, one large op at a time on every core (learner), "
+                             "or concurrent ops on every core (parallel)")
+    parser.add_argument("--precision", type=str, default="float32", choices=["float32", "bfloat16", "float16"],
+                        help="Precision of the MLP forward passes, variables stay float32")
 
     # Checkpointing
     parser.add_argument("--exp-name", type=str, default="debug", help="Name of the experiment")
@@ -91,6 +112,12 @@ def parse_args():
     parser.add_argument("--load-dir", type=str, default=None,
                         help="Directory in which training state and model are loaded")
     parser.add_argument("--model-file", type=str, default="debug", help="Exact name of model file to restore")
+    parser.add_argument("--keep-checkpoints", type=int, default=5,
+                        help="Number of most recent checkpoints to keep")
+    parser.add_argument("--keep-checkpoint-every", type=int, default=None,
+                        help="Additionally keep every n-th checkpoint")
+    parser.add_argument("--export-policy", action="store_true", default=False,
+                        help="Also export the actor weights to <checkpoint>.policy/ when saving")
 
     # Loss logging
     parser.add_argument("--log-loss", action="store_true", default=False)
@@ -106,15 +133,35 @@ def parse_args():
     parser.add_argument("--benchmark-iters", type=int, default=100000, help="Number of iterations run for benchmarking")
     parser.add_argument("--benchmark-dir", type=str, default="/tmp/debug/benchmark_files/",
                         help="Directory where benchmark data is saved")
+    parser.add_argument("--tf-inference", action="store_true", default=False,
+                        help="Run agents that are not being trained through TensorFlow instead of numpy")
     parser.add_argument("--plots-dir", type=str, default="/tmp/debug/learning_curves/",
                         help="Directory where plot data is saved")
     parser.add_argument("--logging", action="store_true", default=False, help="Flag to control logging of agent data")
     parser.add_argument("--log-append", type=str, default="", help="Additional string to append to log file")
+    parser.add_argument("--log-format", type=str, default="csv", choices=["csv", "npz"],
+                        help="Format of the state log, csv or chunked column npz")
+    parser.add_argument("--profile-rate", type=int, default=0,
+                        help="Environment steps between reports of the time spent per training phase, 0 to disable")
+    parser.add_argument("--profile-format", type=str, default="stdout,csv",
+                        help="Comma separated logger output formats of the profiling reports, files go to --save-dir")
 
     # CCM
     parser.add_argument("--perturbation", action="store_true", default=False,
                         help="Flag for controlling perturbation analysis")
     parser.add_argument("--seed", type=int, default=None, help="Random seed for evaluation")
+    parser.add_argument("--reset-bank", type=int, default=0,
+                        help="Number of pre-sampled initial states to reset episodes from, drawn reproducibly from "
+                             "--seed, 0 to sample a new state every episode. Only entity states are restored, so "
+                             "only scenarios with supports_reset_bank, e.g. the converge HVT scenarios, accept it")
+    parser.add_argument("--physics", type=str, default="reference", choices=["reference", "numpy", "numba", "auto"],
+                        help="Physics backend of the environment step, per-entity reference code or flat array "
+                             "kernels (auto uses numba when installed, otherwise numpy)")
+    parser.add_argument("--max-substeps", type=int, default=1,
+                        help="Maximum number of physics substeps for entities that come into contact during a step "
+                             "(continuous collision detection), 1 to disable")
+    parser.add_argument("--ccd-resolution", type=float, default=0.5,
+                        help="Largest relative move of a pair per substep, as a fraction of the pair's combined size")
     parser.add_argument("--history-length", type=int, default=1, help="History/Frames in input space")
     parser.add_argument("--training-history", type=int, default=1,
                         help="Number of frames of agent history to include in training")
@@ -123,6 +170,14 @@ def parse_args():
     parser.add_argument('--training-role', nargs='+', type=str, default="defender", help='role of the training agent')
     parser.add_argument('--level', type=int, help='Level of the training agent.')
 
+    # Pipelined level-k training, see train_level_k_pipeline.py
+    parser.add_argument("--snapshot-dir", type=str, default=None,
+                        help="Directory where the training agents' actor snapshots are published when saving")
+    parser.add_argument("--opponent-dir", type=str, default=None,
+                        help="Directory of the opponent level's published actor snapshots, replaces --load-dir")
+    parser.add_argument("--opponent-refresh", type=int, default=1000,
+                        help="Reload the opponent's latest snapshot once every time this many episodes are completed")
+
     return parser.parse_args()
 
 
@@ -222,11 +277,15 @@ def get_trainers(env, num_adversaries, obs_shape_n, arglist):
                          If using CCM, a list of maddpg.trainer.maddpg.MADDPGAgentTrainerCCM objects.
     """
     trainers = []
-    model = mlp_model
+    model = tf_util.mixed_precision_model(mlp_model, arglist.precision)
 
     trainer = MADDPGAgentTrainer
 
-    good_agent_level, adv_agent_level, _ = get_initial_level_k_info(arglist)
+    # Pipelined training names agents by their final levels, the opponent comes from published snapshots
+    if arglist.opponent_dir is not None:
+        good_agent_level, adv_agent_level, _ = get_level_k_info(arglist)
+    else:
+        good_agent_level, adv_agent_level, _ = get_initial_level_k_info(arglist)
 
     # Adversaries
     for i in range(num_adversaries):
@@ -244,6 +303,27 @@ def get_trainers(env, num_adversaries, obs_shape_n, arglist):
     return trainers
 
 
+def load_opponent_snapshot(arglist, trainers, opponent_indices):
+    """
+    Assign the latest actor snapshot published by the opponent level's process.
+
+    Only p_func is exported, so the opponent's target policy is bound to its snapshot actor, as for
+    PoolOpponent, instead of its never trained target_p_func. The learners' critic targets then
+    bootstrap against the snapshot.
+
+    Args:
+        arglist (argparse.Namespace): Parsed commandline arguments object
+        trainers (list): A list of maddpg.trainer.maddpg.MADDPGAgentTrainer objects
+        opponent_indices (list): Indices of the trainers that are not updated
+    """
+    export = PolicyExport(arglist.opponent_dir)
+    for i in opponent_indices:
+        load_policy(export, trainers[i].name)
+        if not arglist.tf_inference:
+            freeze_actor(trainers[i])
+        trainers[i].p_debug = dict(trainers[i].p_debug, target_act=trainers[i].act)
+
+
 def log_loss(arglist, ep_ct, agent_name, loss=None, initialize=False):
     """
 
@@ -286,7 +366,7 @@ def train(arglist):
         np.random.seed(arglist.seed)
         tf.set_random_seed(arglist.seed)
 
-    with tf_util.make_session(config=None, num_cpu=1, make_default=False, graph=None):
+    with tf_util.profile_session(arglist.session_profile):
         # with tf_util.single_threaded_session():
         ###########################################
         #         Create environment              #
@@ -294,6 +374,10 @@ def train(arglist):
         env = make_env(arglist.scenario, arglist=arglist, done=arglist.done_callback,
                        logging=arglist.logging, benchmark=arglist.benchmark)
 
+        # Profile the hot paths of the training loop
+        profiler.configure(arglist.profile_rate, arglist.save_dir, arglist.profile_format.split(","))
+        profiler.instrument_env(env)
+
         ###########################################
         #        Create agent trainers            #
         ###########################################
@@ -324,7 +408,8 @@ def train(arglist):
         good_agent_level, adv_agent_level, updating_indices = get_level_k_info(arglist)
 
         # if arglist.display or arglist.restore or arglist.benchmark or arglist.load_dir is not None:
-        if ((arglist.restore or arglist.load_dir is not None) and arglist.level != 0) or arglist.benchmark:
+        if arglist.opponent_dir is None and \
+                (((arglist.restore or arglist.load_dir is not None) and arglist.level != 0) or arglist.benchmark):
             print('Loading previous state...')
 
             # Set model file
@@ -335,21 +420,49 @@ def train(arglist):
             tf_util.load_state(arglist.load_dir + arglist.model_file)
 
             # Reset customized agents
+            model = tf_util.mixed_precision_model(mlp_model, arglist.precision)
             for updating_index in updating_indices:
                 if updating_index in range(num_adversaries):
                     trainers[updating_index] = MADDPGAgentTrainer(
-                        'level_{}_attacker_{}'.format(adv_agent_level, updating_index), mlp_model, obs_shape_n,
+                        'level_{}_attacker_{}'.format(adv_agent_level, updating_index), model, obs_shape_n,
                         env.action_space,
                         updating_index, arglist, role="adversary",
                         local_q_func=(arglist.adv_policy == 'ddpg'))
                 else:
                     trainers[updating_index] = MADDPGAgentTrainer(
-                        'level_{}_defender_{}'.format(good_agent_level, updating_index), mlp_model, obs_shape_n,
+                        'level_{}_defender_{}'.format(good_agent_level, updating_index), model, obs_shape_n,
                         env.action_space,
                         updating_index, arglist,
                         local_q_func=(arglist.good_policy == 'ddpg'))
             tf_util.initialize()
 
+        ###########################################
+        #    Load the opponent level's snapshot   #
+        ###########################################
+        opponent_indices = [i for i in range(len(trainers)) if i not in updating_indices]
+        opponent_snapshot_time = None
+        if arglist.opponent_dir is not None and opponent_indices:
+            if not is_policy_export(arglist.opponent_dir):
+                print("Waiting for the first opponent snapshot in {}".format(arglist.opponent_dir))
+            while not is_policy_export(arglist.opponent_dir):
+                time.sleep(5)
+            opponent_snapshot_time = os.path.getmtime(os.path.join(arglist.opponent_dir, "manifest.json"))
+            load_opponent_snapshot(arglist, trainers, opponent_indices)
+
+        ###########################################
+        #        Freeze non-training actors       #
+        ###########################################
+        # Agents that are never updated act through a numpy copy of their policy,
+        # when no agent is updated all of them are evaluated together
+        frozen_actors = None
+        if not arglist.tf_inference:
+            evaluating = arglist.testing or arglist.display or arglist.benchmark
+            for i, trainer in enumerate(trainers):
+                if evaluating or i not in updating_indices:
+                    freeze_actor(trainer)
+            if evaluating:
+                frozen_actors = NumpyActorGroup([trainer.act for trainer in trainers])
+
         ###########################################
         #       Create the save directory         #
         ###########################################
@@ -384,7 +497,8 @@ def train(arglist):
         # Placeholder for benchmarking info
         agent_info = [[[]]]
 
-        saver = tf.train.Saver()
+        checkpointer = AsyncCheckpointWriter(keep_last=arglist.keep_checkpoints,
+                                             keep_every=arglist.keep_checkpoint_every)
         obs_n = env.reset()
         episode_step = 0
         train_step = 0
@@ -409,10 +523,14 @@ def train(arglist):
             #     print("Error")
 
             # Get action
-            action_n = [agent.action(obs) for agent, obs in zip(trainers, obs_n)]
+            if frozen_actors is not None:
+                action_n = frozen_actors(obs_n)
+            else:
+                action_n = [agent.action(obs) for agent, obs in zip(trainers, obs_n)]
 
             # Environment step
             new_obs_n, rew_n, done_n, info_n = env.step(action_n)
+            profiler.step()
 
             # Logging step
             if arglist.logging:
@@ -498,6 +616,14 @@ def train(arglist):
                     break
                 continue
 
+            # Pick up the opponent level's latest snapshot
+            if (terminal or done) and opponent_snapshot_time is not None and \
+                    len(episode_rewards) % arglist.opponent_refresh == 0:
+                snapshot_time = os.path.getmtime(os.path.join(arglist.opponent_dir, "manifest.json"))
+                if snapshot_time != opponent_snapshot_time:
+                    opponent_snapshot_time = snapshot_time
+                    load_opponent_snapshot(arglist, trainers, opponent_indices)
+
             # If not in display or benchmark mode, update trainers with index in updating_indices.
             loss = None
             for i, agent in enumerate(trainers):
@@ -520,8 +646,14 @@ def train(arglist):
                 # TODO: Implement some checks so that we don't overwrite old networks unintentionally?
 
                 # Save model state
-                tf_util.save_state(arglist.save_dir + arglist.exp_name + '_' + str(len(episode_rewards) + prev_ep_ct),
-                                   saver=saver)
+                model_file = arglist.save_dir + arglist.exp_name + '_' + str(len(episode_rewards) + prev_ep_ct)
+                checkpointer.save(model_file)
+                if arglist.export_policy:
+                    export_policies(model_file + ".policy", [trainer.name for trainer in trainers])
+
+                # Publish the training agents' actors to the next level's process
+                if arglist.snapshot_dir is not None:
+                    export_policies(arglist.snapshot_dir, [trainers[i].name for i in updating_indices])
 
                 # Print statement depends on whether or not there are adversaries
                 if num_adversaries == 0:
@@ -559,6 +691,10 @@ def train(arglist):
                 with open(agrew_file_name, 'wb') as fp:
                     pickle.dump(final_ep_ag_rewards, fp)
 
+                # Publish the final actors
+                if arglist.snapshot_dir is not None:
+                    export_policies(arglist.snapshot_dir, [trainers[i].name for i in updating_indices])
+
                 # Log agent data for run
                 env.logger.save("State", arglist.save_dir,
                                 filename=arglist.exp_name + '_state' + '_' + str(len(episode_rewards) + prev_ep_ct))
@@ -566,6 +702,9 @@ def train(arglist):
                 print('...Finished total of {} episodes.'.format(len(episode_rewards)))
                 break
 
+        checkpointer.close()
+        profiler.close()
+
 
 if __name__ == '__main__':
     """
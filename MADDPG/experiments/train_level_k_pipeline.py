@@ -0,0 +1,166 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+train_level_k_pipeline.py
+
+Trains a level-k ladder as a pipeline of concurrent train_hvt_level_k.py processes.
+
+Every level runs in its own process. Level k publishes actor snapshots of its training agents to
+<save-dir>/snapshots/level_<k>/ each time it saves, and level k+1 starts as soon as the first
+snapshot is available, reloading the latest one every --opponent-refresh episodes while level k
+keeps improving. Roles alternate down the ladder, ending with --training-role at --max-level.
+
+Arguments not listed below are passed through to every train_hvt_level_k.py process.
+
+Updated and Enhanced version of OpenAI Multi-Agent Deep Deterministic Policy Gradient (MADDPG) Algorithm
+(https://github.com/openai/maddpg)
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+__author__ = 'Rolando Fernandez'
+__copyright__ = 'Copyright 2020, Multi-Agent Deep Deterministic Policy Gradient'
+__credits__ = ['Rolando Fernandez', 'OpenAI']
+__license__ = ''
+__version__ = '0.0.1'
+__maintainer__ = 'Rolando Fernandez'
+__email__ = 'rolando.fernandez1.civ@mail.mil'
+__status__ = 'Dev'
+
+
+def parse_args():
+    """
+    Parse command line arguments
+
+    Returns:
+        arglist (argparse.Namespace): Parsed commandline arguments object
+        passthrough (list): Remaining arguments, passed to every level's process
+    """
+    parser = argparse.ArgumentParser("Pipelined level-k training for multiagent environments")
+
+    parser.add_argument("--max-level", type=int, required=True, help="Highest level of the ladder")
+    parser.add_argument("--training-role", type=str, default="attacker", choices=["attacker", "defender"],
+                        help="Role trained at the highest level, roles alternate down the ladder")
+    parser.add_argument("--exp-name", type=str, default="maddpg_hvt_1v1",
+                        help="Experiment name prefix, level and role are appended")
+    parser.add_argument("--save-dir", type=str, default="/tmp/debug/level_k/",
+                        help="Directory holding one sub directory per level and the published snapshots")
+    parser.add_argument("--opponent-refresh", type=int, default=1000,
+                        help="Episodes between reloads of the opponent level's latest snapshot")
+
+    return parser.parse_known_args()
+
+
+def level_role(level, arglist):
+    """
+    Role trained at a level of the ladder
+
+    Args:
+        level (int): Level
+        arglist (argparse.Namespace): Parsed commandline arguments object
+
+    Returns:
+        (str) 'attacker' or 'defender'
+    """
+    if (arglist.max_level - level) % 2 == 0:
+        return arglist.training_role
+
+    return "defender" if arglist.training_role == "attacker" else "attacker"
+
+
+def level_command(level, arglist, passthrough):
+    """
+    Command line of a level's train_hvt_level_k.py process
+
+    Args:
+        level (int): Level
+        arglist (argparse.Namespace): Parsed commandline arguments object
+        passthrough (list): Arguments passed to every level
+
+    Returns:
+        command (list): Command line arguments
+        level_dir (str): Save directory of the level
+    """
+    role = level_role(level, arglist)
+    level_dir = os.path.join(arglist.save_dir, "level_{}_{}".format(level, role)) + "/"
+    snapshot_dir = os.path.join(arglist.save_dir, "snapshots", "level_{}".format(level))
+
+    driver = os.path.join(os.path.dirname(os.path.abspath(__file__)), "train_hvt_level_k.py")
+    command = [sys.executable, driver,
+               "--level", str(level),
+               "--training-role", role,
+               "--exp-name", "{}_level_{}_{}".format(arglist.exp_name, level, role),
+               "--save-dir", level_dir,
+               "--plots-dir", level_dir,
+               "--snapshot-dir", snapshot_dir,
+               "--opponent-refresh", str(arglist.opponent_refresh)]
+    if level > 0:
+        command += ["--opponent-dir", os.path.join(arglist.save_dir, "snapshots", "level_{}".format(level - 1))]
+
+    return command + passthrough, level_dir
+
+
+def run_pipeline(arglist, passthrough):
+    """
+    Start every level's process and wait for all of them, stopping the others if one fails
+
+    Args:
+        arglist (argparse.Namespace): Parsed commandline arguments object
+        passthrough (list): Arguments passed to every level
+
+    Returns:
+        (int) Exit code, 0 if every level finished successfully
+    """
+    processes = []
+    for level in range(arglist.max_level + 1):
+        command, level_dir = level_command(level, arglist, passthrough)
+        os.makedirs(level_dir, exist_ok=True)
+
+        # Each level logs to its own directory
+        log_file = open(os.path.join(level_dir, "train.log"), 'w')
+        print("Starting level {} ({}), log: {}".format(level, level_role(level, arglist), log_file.name))
+        processes.append((level, subprocess.Popen(command, stdout=log_file, stderr=subprocess.STDOUT), log_file))
+
+    t_start = time.time()
+    running = list(processes)
+    exit_code = 0
+    try:
+        while running:
+            time.sleep(5)
+            for entry in list(running):
+                level, process, log_file = entry
+                if process.poll() is None:
+                    continue
+
+                running.remove(entry)
+                log_file.close()
+                print("Level {} finished with exit code {} after {} s".format(level, process.returncode,
+                                                                              round(time.time() - t_start, 3)))
+                if process.returncode != 0 and exit_code == 0:
+                    exit_code = process.returncode
+                    for _, other, _ in running:
+                        other.terminate()
+    finally:
+        for _, process, log_file in running:
+            process.terminate()
+            log_file.close()
+
+    return exit_code
+
+
+if __name__ == '__main__':
+    """
+    Main function
+
+    Parses commandline arguments and calls run_pipeline()
+    """
+    # Parse commandline arguments
+    args, passthrough_args = parse_args()
+
+    # Start program
+    sys.exit(run_pipeline(args, passthrough_args))
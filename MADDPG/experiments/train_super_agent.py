@@ -10,6 +10,7 @@ Updated and Enhanced version of OpenAI Multi-Agent Deep Deterministic Policy Gra
 
 import argparse
 import csv
+import functools
 import numpy as np
 import os
 import pickle
@@ -38,9 +39,15 @@ if 'win' in sys.platform:
 sys.path.insert(0, module_parent_dir + '/MADDPG/')
 sys.path.insert(0, module_parent_dir + '/Multi-Agent-Particle-Environment/')
 
+from maddpg.common.checkpoint import AsyncCheckpointWriter
+from maddpg.common.evaluation import ParallelEvaluator
+from maddpg.common.numpy_policy import freeze_actor, to_numpy_actor
+from maddpg.common.policy_export import export_policies, is_policy_export, load_policy
 from maddpg.trainer.maddpg import MADDPGAgentTrainer
+from maddpg.trainer.opponent_pool import OpponentPool, PoolOpponent
 from multiagent_particle_env.make_env import make_env
 
+import maddpg.common.profiler as profiler
 import maddpg.common.tf_util as tf_util
 
 __author__ = 'Rolando Fernandez'
@@ -80,6 +87,23 @@ def parse_args():
     parser.add_argument("--gamma", type=float, default=0.95, help="Discount factor")
     parser.add_argument("--batch-size", type=int, default=1024, help="Number of episodes to optimize at the same time")
     parser.add_argument("--num-units", type=int, default=64, help="Number of units in the mlp")
+    parser.add_argument("--n-step", type=int, default=1,
+                        help="Number of rewards accumulated in the critic target, 1 for one-step targets")
+    parser.add_argument("--train-freq", type=int, default=100, help="Number of training steps between updates")
+    parser.add_argument("--gradient-steps", type=int, default=1,
+                        help="Number of gradient steps taken on each sampled batch")
+    parser.add_argument("--warmup", type=int, default=None,
+                        help="Minimum number of transitions in the replay buffer before updating, "
+                             "defaults to 30 for MADDPG and 12500 for CCM trainers")
+    parser.add_argument("--tau", type=float, default=0.01, help="Polyak averaging rate of the target networks")
+    parser.add_argument("--target-update-interval", type=int, default=0,
+                        help="Copy the networks to their targets every this many gradient steps instead of "
+                             "Polyak averaging, 0 to average")
+    parser.add_argument("--session-profile", type=str, default="single", choices=["single", "learner", "parallel"],
+                        help="TensorFlow thread pools: single thread, one large op at a time on every core (learner), "
+                             "or concurrent ops on every core (parallel)")
+    parser.add_argument("--precision", type=str, default="float32", choices=["float32", "bfloat16", "float16"],
+                        help="Precision of the MLP forward passes, variables stay float32")
 
     # Checkpointing
     parser.add_argument("--exp-name", type=str, default="debug", help="Name of the experiment")
@@ -91,6 +115,12 @@ def parse_args():
     parser.add_argument("--load-dir", type=str, default=None,
                         help="Directory in which training state and model are loaded")
     parser.add_argument("--model-file", type=str, default="debug", help="Exact name of model file to restore")
+    parser.add_argument("--keep-checkpoints", type=int, default=5,
+                        help="Number of most recent checkpoints to keep")
+    parser.add_argument("--keep-checkpoint-every", type=int, default=None,
+                        help="Additionally keep every n-th checkpoint")
+    parser.add_argument("--export-policy", action="store_true", default=False,
+                        help="Also export the actor weights to <checkpoint>.policy/ when saving")
 
     # Loss logging
     parser.add_argument("--log-loss", action="store_true", default=False)
@@ -106,15 +136,35 @@ def parse_args():
     parser.add_argument("--benchmark-iters", type=int, default=100000, help="Number of iterations run for benchmarking")
     parser.add_argument("--benchmark-dir", type=str, default="/tmp/debug/benchmark_files/",
                         help="Directory where benchmark data is saved")
+    parser.add_argument("--tf-inference", action="store_true", default=False,
+                        help="Run agents that are not being trained through TensorFlow instead of numpy")
     parser.add_argument("--plots-dir", type=str, default="/tmp/debug/learning_curves/",
                         help="Directory where plot data is saved")
     parser.add_argument("--logging", action="store_true", default=False, help="Flag to control logging of agent data")
     parser.add_argument("--log-append", type=str, default="", help="Additional string to append to log file")
+    parser.add_argument("--log-format", type=str, default="csv", choices=["csv", "npz"],
+                        help="Format of the state log, csv or chunked column npz")
+    parser.add_argument("--profile-rate", type=int, default=0,
+                        help="Environment steps between reports of the time spent per training phase, 0 to disable")
+    parser.add_argument("--profile-format", type=str, default="stdout,csv",
+                        help="Comma separated logger output formats of the profiling reports, files go to --save-dir")
 
     # CCM
     parser.add_argument("--perturbation", action="store_true", default=False,
                         help="Flag for controlling perturbation analysis")
     parser.add_argument("--seed", type=int, default=None, help="Random seed for evaluation")
+    parser.add_argument("--reset-bank", type=int, default=0,
+                        help="Number of pre-sampled initial states to reset episodes from, drawn reproducibly from "
+                             "--seed, 0 to sample a new state every episode. Only entity states are restored, so "
+                             "only scenarios with supports_reset_bank, e.g. the converge HVT scenarios, accept it")
+    parser.add_argument("--physics", type=str, default="reference", choices=["reference", "numpy", "numba", "auto"],
+                        help="Physics backend of the environment step, per-entity reference code or flat array "
+                             "kernels (auto uses numba when installed, otherwise numpy)")
+    parser.add_argument("--max-substeps", type=int, default=1,
+                        help="Maximum number of physics substeps for entities that come into contact during a step "
+                             "(continuous collision detection), 1 to disable")
+    parser.add_argument("--ccd-resolution", type=float, default=0.5,
+                        help="Largest relative move of a pair per substep, as a fraction of the pair's combined size")
     parser.add_argument("--history-length", type=int, default=1, help="History/Frames in input space")
     parser.add_argument("--training-history", type=int, default=1,
                         help="Number of frames of agent history to include in training")
@@ -125,6 +175,12 @@ def parse_args():
     parser.add_argument('--evaluate-rate', type=int, default=5000)
     parser.add_argument('--evaluate-length', type=int, default=100)
     parser.add_argument('--level-k-select-print', default=False)
+    parser.add_argument("--eval-workers", type=int, default=0,
+                        help="Number of processes evaluating the super-agent while it trains, 0 evaluates in the loop")
+    parser.add_argument("--eval-envs", type=int, default=4,
+                        help="Number of environments stepped together by each evaluation process")
+    parser.add_argument("--opponent-pool", action="store_true", default=False,
+                        help="Opponents share one actor graph and swap in their weights from an in-memory bank")
 
     return parser.parse_args()
 
@@ -172,16 +228,27 @@ def get_trainers(env, num_adversaries, obs_shape_n, arglist):
                          If using CCM, a list of maddpg.trainer.maddpg.MADDPGAgentTrainerCCM objects.
     """
     trainers = []
-    model = mlp_model
+    model = tf_util.mixed_precision_model(mlp_model, arglist.precision)
 
     trainer = MADDPGAgentTrainer
 
     max_opp_level = arglist.level
     super_agent_role = arglist.training_role[0]
 
+    # Opponents share one actor graph and differ only in their banked weights
+    pool = None
+    if arglist.opponent_pool:
+        opp_index = 0 if super_agent_role == "defender" else 1
+        pool = OpponentPool('{}_opponent_pool'.format("attacker" if opp_index == 0 else "defender"), model,
+                            obs_shape_n[opp_index], env.action_space[opp_index], num_units=arglist.num_units,
+                            numpy_inference=not arglist.tf_inference)
+
     if super_agent_role == "defender":
         # Adversaries
         for i in range(max_opp_level + 1):
+            if pool is not None:
+                trainers.append(pool.opponent('level_{}_attacker_{}'.format(i, 0), 0))
+                continue
             trainers.append(trainer(
                 'level_{}_attacker_{}'.format(i, 0), model, obs_shape_n, env.action_space, 0, arglist,
                 role="adversary",
@@ -202,6 +269,9 @@ def get_trainers(env, num_adversaries, obs_shape_n, arglist):
 
         # Good Agents
         for i in range(1, max_opp_level + 2):
+            if pool is not None:
+                trainers.append(pool.opponent('level_{}_defender_{}'.format(i - 1, 1), 1))
+                continue
             trainers.append(trainer(
                 'level_{}_defender_{}'.format(i - 1, 1), model, obs_shape_n, env.action_space, 1, arglist,
                 local_q_func=(arglist.good_policy == 'ddpg')))
@@ -229,6 +299,37 @@ def get_role_index(role=None):
     elif role == "attacker":
         return 0
 
+
+def update_opponent_selection(level_performances, p_opponent_selection, worst_performing_levels, arglist):
+    """
+    Emphasize the level the super-agent performed worst against
+
+    Args:
+        level_performances (np.array): Mean episode reward of the super-agent against each level
+        p_opponent_selection (np.array): Current opponent selection distribution
+        worst_performing_levels (list): History of worst performing levels, appended to
+        arglist (argparse.Namespace): Parsed commandline arguments object
+
+    Returns:
+        (np.array) Updated opponent selection distribution
+    """
+    np.set_printoptions(precision=2)
+    print("Evaluation complete, against level 0 to {} performances: {}".format(arglist.level,
+                                                                               level_performances))
+
+    worst_level = np.argmin(level_performances)
+    worst_performing_levels.append(worst_level)
+    print("Worst performing level is {}".format(worst_level))
+
+    # update p_select #TODO: check some other distributions
+    # p_opponent_selection = np.ones(arglist.level + 1) * 0.6 / arglist.level
+    p_opponent_selection = p_opponent_selection.copy()
+    p_opponent_selection[worst_level] = 1
+    p_opponent_selection /= np.sum(p_opponent_selection)
+    print("Opponent selection probability set to: {}".format(p_opponent_selection))
+
+    return p_opponent_selection
+
 def log_loss(arglist, ep_ct, agent_name, loss=None, initialize=False):
     """
 
@@ -281,7 +382,7 @@ def train(arglist):
         np.random.seed(arglist.seed)
         tf.set_random_seed(arglist.seed)
 
-    with tf_util.make_session(config=None, num_cpu=1, make_default=False, graph=None):
+    with tf_util.profile_session(arglist.session_profile):
         # with tf_util.single_threaded_session():
         ###########################################
         #         Create environment              #
@@ -289,12 +390,17 @@ def train(arglist):
         env = make_env(arglist.scenario, arglist=arglist, done=arglist.done_callback,
                        logging=arglist.logging, benchmark=arglist.benchmark)
 
+        # Profile the hot paths of the training loop
+        profiler.configure(arglist.profile_rate, arglist.save_dir, arglist.profile_format.split(","))
+        profiler.instrument_env(env)
+
         ###########################################
         #        Create agent trainers            #
         ###########################################
         obs_shape_n = [env.observation_space[i].shape for i in range(env.n)]
         num_adversaries = min(env.n, arglist.num_adversaries)
         trainers = get_trainers(env, num_adversaries, obs_shape_n, arglist)
+        pool = next((trainer.pool for trainer in trainers if isinstance(trainer, PoolOpponent)), None)
 
         print("Training super {} against level 0 to {} opponent."
               .format(arglist.training_role[0], arglist.level))
@@ -322,8 +428,37 @@ def train(arglist):
 
             for opp_level in range(0, arglist.level + 1):
                 opp_model_file = "level_{}_{}".format(opp_level, opponent_role)
-                tf_util.load_state(fname=arglist.load_dir + opp_model_file,
-                                   var_prefix="level_{}_{}_{}".format(opp_level, opponent_role, opponent_index))
+                opp_scope = "level_{}_{}_{}".format(opp_level, opponent_role, opponent_index)
+
+                # Prefer the policy-only export, opponents only need their actor weights
+                if is_policy_export(arglist.load_dir + opp_model_file + ".policy"):
+                    if pool is not None:
+                        pool.add_from_export(opp_scope, arglist.load_dir + opp_model_file + ".policy")
+                    else:
+                        load_policy(arglist.load_dir + opp_model_file + ".policy", opp_scope)
+                elif pool is not None:
+                    pool.add_from_checkpoint(opp_scope, arglist.load_dir + opp_model_file)
+                else:
+                    tf_util.load_state(fname=arglist.load_dir + opp_model_file, var_prefix=opp_scope)
+
+        # Opponents that were not loaded start from random weights, as a freshly built trainer would
+        if pool is not None:
+            for trainer in trainers:
+                if isinstance(trainer, PoolOpponent) and trainer.name not in pool:
+                    pool.add_random(trainer.name)
+
+        ###########################################
+        #        Freeze non-training actors       #
+        ###########################################
+        # Agents that are never updated act through a numpy copy of their policy
+        if not arglist.tf_inference:
+            training_index = arglist.level + 1 if training_role == "defender" else 0
+            evaluating = arglist.testing or arglist.display or arglist.benchmark
+            for i, trainer in enumerate(trainers):
+                if isinstance(trainer, PoolOpponent):
+                    continue
+                if evaluating or i != training_index:
+                    freeze_actor(trainer)
 
         ###########################################
         #       Create the save directory         #
@@ -361,7 +496,19 @@ def train(arglist):
         # Placeholder for benchmarking info
         agent_info = [[[]]]
 
-        saver = tf.train.Saver()
+        # Background evaluation against snapshots of every opponent level
+        evaluator = None
+        super_trainer = trainers[arglist.level + 1 if training_role == "defender" else 0]
+        if arglist.eval_workers > 0 and not (arglist.testing or arglist.display or arglist.benchmark):
+            opponent_trainers = [trainer for trainer in trainers if trainer is not super_trainer]
+            env_fn = functools.partial(make_env, arglist.scenario, arglist=arglist, done=arglist.done_callback,
+                                       clone_world=True)
+            evaluator = ParallelEvaluator(env_fn, [to_numpy_actor(trainer) for trainer in opponent_trainers],
+                                          get_role_index(training_role), arglist.max_episode_len,
+                                          num_workers=arglist.eval_workers, num_envs=arglist.eval_envs)
+
+        checkpointer = AsyncCheckpointWriter(keep_last=arglist.keep_checkpoints,
+                                             keep_every=arglist.keep_checkpoint_every)
         obs_n = env.reset()
         episode_step = 0
         train_step = 0
@@ -419,6 +566,7 @@ def train(arglist):
 
             # Environment step
             new_obs_n, rew_n, done_n, info_n = env.step(action_n)
+            profiler.step()
 
             # Logging step
             if arglist.logging:
@@ -509,18 +657,15 @@ def train(arglist):
             if (terminal or done) and evaluate_flag and evaluation_done:
                 evaluate_flag = False
                 level_performances = level_performances / arglist.evaluate_length
-                np.set_printoptions(precision=2)
-                print("Evaluation complete, against level 0 to {} performances: {}".format(arglist.level,
-                                                                                           level_performances))
-
-                worst_level = np.argmin(level_performances)
-                worst_performing_levels.append(worst_level)
-                print("Worst performing level is {}".format(worst_level))
+                p_opponent_selection = update_opponent_selection(level_performances, p_opponent_selection,
+                                                                 worst_performing_levels, arglist)
 
-                # update p_select #TODO: check some other distributions
-                # p_opponent_selection = np.ones(arglist.level + 1) * 0.6 / arglist.level
-                p_opponent_selection[worst_level] = 1
-                print("Opponent selection probability set to: {}".format(p_opponent_selection))
+            # Collect background evaluation results, training continues while they run
+            if (terminal or done) and evaluator is not None:
+                level_performances = evaluator.poll()
+                if level_performances is not None:
+                    p_opponent_selection = update_opponent_selection(level_performances, p_opponent_selection,
+                                                                     worst_performing_levels, arglist)
 
             # Pop evaluation list and update current evaluate level
             if (terminal or done) and evaluate_flag:
@@ -537,7 +682,10 @@ def train(arglist):
                 p_opponent_selection[evaluate_level] = 1
 
             # set up evaluate schedules
-            if (terminal or done) and (len(episode_rewards) % arglist.evaluate_rate == 0):
+            if (terminal or done) and (len(episode_rewards) % arglist.evaluate_rate == 0) and evaluator is not None:
+                if evaluator.submit(to_numpy_actor(super_trainer), arglist.evaluate_length):
+                    print("Evaluating a snapshot of the super-agent's network in the background.")
+            elif (terminal or done) and (len(episode_rewards) % arglist.evaluate_rate == 0):
                 print("Freezing current super-agent's network and performing evaluation.")
                 evaluate_flag = True
                 evaluation_done = False
@@ -579,8 +727,11 @@ def train(arglist):
                 # TODO: Implement some checks so that we don't overwrite old networks unintentionally?
 
                 # Save model state
-                tf_util.save_state(arglist.save_dir + arglist.exp_name + '_' + str(len(episode_rewards) + prev_ep_ct),
-                                   saver=saver)
+                model_file = arglist.save_dir + arglist.exp_name + '_' + str(len(episode_rewards) + prev_ep_ct)
+                checkpointer.save(model_file)
+                if arglist.export_policy:
+                    export_policies(model_file + ".policy",
+                                    [trainer.name for trainer in trainers if not isinstance(trainer, PoolOpponent)])
 
                 # Print statement depends on whether or not there are adversaries
                 if num_adversaries == 0:
@@ -608,35 +759,24 @@ def train(arglist):
                     final_ep_ag_rewards.append(np.mean(reward[-arglist.save_rate:]))
 
 
-                # Pickle dump trainning curve info
-                if not os.path.exists(arglist.plots_dir):
-                    os.makedirs(arglist.plots_dir)
-
+                # Pickle dump trainning curve info, written in the background with the checkpoint
                 rew_file_name = arglist.plots_dir + arglist.exp_name + '_rewards.pkl'
-                with open(rew_file_name, 'wb') as fp:
-                    pickle.dump(final_ep_rewards, fp)
+                checkpointer.save_pickle(rew_file_name, final_ep_rewards)
 
                 agrew_file_name = arglist.plots_dir + arglist.exp_name + '_agrewards.pkl'
-                with open(agrew_file_name, 'wb') as fp:
-                    pickle.dump(final_ep_ag_rewards, fp)
+                checkpointer.save_pickle(agrew_file_name, final_ep_ag_rewards)
 
                 worst_level_file_name = arglist.plots_dir + arglist.exp_name + '_worst_performing_level.pkl'
-                with open(worst_level_file_name, 'wb') as fp:
-                    pickle.dump(worst_performing_levels, fp)
+                checkpointer.save_pickle(worst_level_file_name, worst_performing_levels)
 
 
             # Saves final episode reward for plotting training curve later
             if len(episode_rewards) > arglist.num_episodes:
-                if not os.path.exists(arglist.plots_dir):
-                    os.makedirs(arglist.plots_dir)
-
                 rew_file_name = arglist.plots_dir + arglist.exp_name + '_rewards.pkl'
-                with open(rew_file_name, 'wb') as fp:
-                    pickle.dump(final_ep_rewards, fp)
+                checkpointer.save_pickle(rew_file_name, final_ep_rewards)
 
                 agrew_file_name = arglist.plots_dir + arglist.exp_name + '_agrewards.pkl'
-                with open(agrew_file_name, 'wb') as fp:
-                    pickle.dump(final_ep_ag_rewards, fp)
+                checkpointer.save_pickle(agrew_file_name, final_ep_ag_rewards)
 
                 # Log agent data for run
                 env.logger.save("State", arglist.save_dir,
@@ -646,6 +786,11 @@ def train(arglist):
                 print('...Worst performing history: {}'.format(worst_performing_levels))
                 break
 
+        if evaluator is not None:
+            evaluator.close()
+        checkpointer.close()
+        profiler.close()
+
 
 if __name__ == '__main__':
     """
@@ -0,0 +1,216 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+checkpoint.py
+
+Asynchronous checkpoint writer for MADDPG
+
+Variable values are snapshot into host memory with a single session.run on the training thread,
+then written as a regular tf.train.Saver checkpoint by a background thread, so checkpoints remain
+loadable with tf_util.load_state. Files are written to a temporary directory and renamed into place.
+
+Updated and Enhanced version of OpenAI Multi-Agent Deep Deterministic Policy Gradient (MADDPG) Algorithm
+(https://github.com/openai/maddpg)
+"""
+
+import atexit
+import glob
+import os
+import pickle
+import queue
+import shutil
+import threading
+
+import maddpg.common.profiler as profiler
+import maddpg.common.tf_util as tf_util
+import tensorflow as tf
+
+__author__ = 'Rolando Fernandez'
+__copyright__ = 'Copyright 2020, Multi-Agent Deep Deterministic Policy Gradient'
+__credits__ = ['Rolando Fernandez', 'OpenAI']
+__license__ = ''
+__version__ = '0.0.1'
+__maintainer__ = 'Rolando Fernandez'
+__email__ = 'rolando.fernandez1.civ@mail.mil'
+__status__ = 'Dev'
+
+
+def _atomic_write_bytes(fname, data):
+    """
+    Write bytes to a temporary file and rename it over fname
+
+    Args:
+        fname (str): Destination file
+        data (bytes): File contents
+    """
+    dirname = os.path.dirname(fname)
+    if any(dirname):
+        os.makedirs(dirname, exist_ok=True)
+    tmp_fname = fname + ".tmp"
+    with open(tmp_fname, 'wb') as fp:
+        fp.write(data)
+    os.replace(tmp_fname, fname)
+
+
+class AsyncCheckpointWriter(object):
+    """
+    Writes checkpoints and pickled training curves in a background thread.
+
+    Retention: the last keep_last checkpoints written by this writer are kept, plus every
+    keep_every-th checkpoint, which is never deleted. keep_last=None keeps everything.
+    """
+    def __init__(self, var_list=None, keep_last=5, keep_every=None, max_pending=2):
+        """
+        Args:
+            var_list (list): Variables to checkpoint, defaults to all global variables
+            keep_last (int): Number of most recent checkpoints to keep, None to keep all
+            keep_every (int): Additionally keep every n-th checkpoint, None to disable
+            max_pending (int): Maximum number of snapshots waiting to be written before save() blocks
+        """
+        self.var_list = var_list if var_list is not None else tf.global_variables()
+        self.keep_last = keep_last
+        self.keep_every = keep_every
+
+        # Names, dtypes and shapes needed to rebuild the variables in the writer's graph
+        self._specs = [(v.op.name, v.dtype.base_dtype, v.get_shape().as_list()) for v in self.var_list]
+
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._error = None
+        self._num_saved = 0
+        self._recent = []
+        self._kept = []
+
+        self._build_graph()
+
+        self._thread = threading.Thread(target=self._run, name="AsyncCheckpointWriter")
+        self._thread.daemon = True
+        self._thread.start()
+
+        atexit.register(self.close)
+
+    def _build_graph(self):
+        """
+        Private graph holding one variable per checkpointed variable, initialized from placeholders.
+        """
+        self._graph = tf.Graph()
+        with self._graph.as_default():
+            self._placeholders = []
+            variables = {}
+            for i, (name, dtype, shape) in enumerate(self._specs):
+                placeholder = tf.placeholder(dtype, shape, name="value_{}".format(i))
+                variables[name] = tf.Variable(placeholder, name="var_{}".format(i), trainable=False)
+                self._placeholders.append(placeholder)
+            self._init_op = tf.variables_initializer(list(variables.values()))
+            self._saver = tf.train.Saver(variables, max_to_keep=None, save_relative_paths=True)
+        self._sess = tf.Session(graph=self._graph, config=tf.ConfigProto(device_count={'GPU': 0}))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                kind, fname, payload = item
+                if kind == 'checkpoint':
+                    self._write_checkpoint(fname, payload)
+                else:
+                    _atomic_write_bytes(fname, payload)
+            except Exception as e:
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def _write_checkpoint(self, fname, values):
+        dirname = os.path.dirname(fname)
+        if any(dirname):
+            os.makedirs(dirname, exist_ok=True)
+
+        # Write into a temporary directory, then move data files before the index
+        tmp_dir = os.path.join(dirname, ".tmp_" + os.path.basename(fname))
+        if os.path.isdir(tmp_dir):
+            shutil.rmtree(tmp_dir)
+        os.makedirs(tmp_dir)
+        tmp_prefix = os.path.join(tmp_dir, os.path.basename(fname))
+
+        self._sess.run(self._init_op, feed_dict=dict(zip(self._placeholders, values)))
+        self._saver.save(self._sess, tmp_prefix, write_meta_graph=False, write_state=False)
+
+        tmp_files = glob.glob(glob.escape(tmp_prefix) + ".*")
+        for tmp_file in sorted(tmp_files, key=lambda f: f.endswith(".index")):
+            os.replace(tmp_file, fname + tmp_file[len(tmp_prefix):])
+        shutil.rmtree(tmp_dir)
+
+        self._retain(fname)
+
+        if any(dirname):
+            tf.train.update_checkpoint_state(dirname, fname, all_model_checkpoint_paths=self._kept + self._recent)
+
+    def _retain(self, fname):
+        self._num_saved += 1
+        if self.keep_every is not None and self._num_saved % self.keep_every == 0:
+            self._kept.append(fname)
+        else:
+            self._recent.append(fname)
+
+        if self.keep_last is None:
+            return
+
+        while len(self._recent) > max(self.keep_last, 1):
+            old = self._recent.pop(0)
+            # Same prefix saved again later, its files belong to the newer checkpoint
+            if old in self._recent or old in self._kept:
+                continue
+            for old_file in glob.glob(glob.escape(old) + ".*"):
+                os.remove(old_file)
+
+    def _check_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError("Asynchronous checkpoint write failed") from error
+
+    @profiler.profile('checkpoint')
+    def save(self, fname, sess=None):
+        """
+        Snapshot the variables and queue a checkpoint to be written to <fname>.
+
+        Blocks only on the snapshot, or when max_pending snapshots are already waiting.
+
+        Args:
+            fname (str): Checkpoint prefix, as passed to tf.train.Saver.save
+            sess (tf.Session): Session to read variables from, defaults to the current session
+        """
+        self._check_error()
+        sess = sess or tf_util.get_session()
+        values = sess.run(self.var_list)
+        self._queue.put(('checkpoint', fname, values))
+
+    @profiler.profile('checkpoint')
+    def save_pickle(self, fname, obj):
+        """
+        Pickle an object on the calling thread and write it to <fname> in the background.
+
+        Args:
+            fname (str): Destination file
+            obj (object): Picklable object, e.g. a list of episode rewards
+        """
+        self._check_error()
+        self._queue.put(('pickle', fname, pickle.dumps(obj)))
+
+    def flush(self):
+        """
+        Wait until all queued checkpoints have been written.
+        """
+        self._queue.join()
+        self._check_error()
+
+    def close(self):
+        """
+        Write all queued checkpoints and stop the background thread.
+        """
+        if not self._thread.is_alive():
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._sess.close()
+        self._check_error()
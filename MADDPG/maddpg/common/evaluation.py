@@ -0,0 +1,212 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+evaluation.py
+
+Background evaluation of a training agent against a fixed set of opponents
+
+Worker processes hold their own environments and NumPy copies of the opponents. Each evaluation
+request carries a NumPy snapshot of the training agent's actor and is split into per-opponent
+chunks of episodes, which the workers run in lockstep over several environments so that every
+step is one batched forward pass per agent. Results are collected without blocking the training
+loop.
+
+Updated and Enhanced version of OpenAI Multi-Agent Deep Deterministic Policy Gradient (MADDPG) Algorithm
+(https://github.com/openai/maddpg)
+"""
+
+import atexit
+import multiprocessing
+import numpy as np
+import queue
+import traceback
+
+__author__ = 'Rolando Fernandez'
+__copyright__ = 'Copyright 2020, Multi-Agent Deep Deterministic Policy Gradient'
+__credits__ = ['Rolando Fernandez', 'OpenAI']
+__license__ = ''
+__version__ = '0.0.1'
+__maintainer__ = 'Rolando Fernandez'
+__email__ = 'rolando.fernandez1.civ@mail.mil'
+__status__ = 'Dev'
+
+
+def evaluate_episodes(envs, actors, agent_index, num_episodes, max_episode_len):
+    """
+    Run episodes in lockstep over a list of environments
+
+    An episode ends when any agent is done or after max_episode_len steps, as in the training loop.
+
+    Args:
+        envs (list): List of multiagent_particle_env.environment.MultiAgentEnv objects
+        actors (list): NumPy actor for each agent in the environment
+        agent_index (int): Index of the agent whose reward is accumulated
+        num_episodes (int): Number of episodes to run
+        max_episode_len (int): Maximum episode length
+
+    Returns:
+        (float) Sum of the agent's episode rewards
+    """
+    total_reward = 0.0
+    remaining = num_episodes
+    while remaining > 0:
+        batch = envs[:min(len(envs), remaining)]
+        obs_n = [env.reset() for env in batch]
+        active = np.ones(len(batch), dtype=bool)
+
+        for _ in range(max_episode_len):
+            indices = np.flatnonzero(active)
+            action_n = [actor(np.array([obs_n[e][i] for e in indices])) for i, actor in enumerate(actors)]
+
+            for j, e in enumerate(indices):
+                obs_n[e], rew_n, done_n, _ = batch[e].step([action[j] for action in action_n])
+                total_reward += rew_n[agent_index]
+                if any(done_n):
+                    active[e] = False
+
+            if not np.any(active):
+                break
+
+        remaining -= len(batch)
+
+    return total_reward
+
+
+def _worker(env_fn, opponents, agent_index, num_envs, max_episode_len, worker_index, tasks, results):
+    # Every environment gets its own index, e.g. to seed the choice of reset bank entries
+    envs = [env_fn(env_index=worker_index * num_envs + e) for e in range(num_envs)]
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+
+        request_id, opponent, actor, num_episodes = task
+        try:
+            actors = [opponents[opponent]] * envs[0].n
+            actors[agent_index] = actor
+            reward = evaluate_episodes(envs, actors, agent_index, num_episodes, max_episode_len)
+            results.put((request_id, opponent, reward, num_episodes, None))
+        except Exception:
+            results.put((request_id, opponent, None, num_episodes, traceback.format_exc()))
+
+
+class ParallelEvaluator(object):
+    """
+    Evaluates snapshots of a training agent against every opponent in worker processes.
+
+    Only one evaluation is in flight at a time. submit() returns immediately and poll() returns
+    the mean reward against each opponent once all of its chunks have come back.
+    """
+    def __init__(self, env_fn, opponents, agent_index, max_episode_len, num_workers=2, num_envs=4):
+        """
+        Args:
+            env_fn (function): Picklable function creating an environment, called in each worker with a distinct
+                               env_index keyword, e.g. a functools.partial of make_env
+            opponents (list): NumPy actor of each opponent
+            agent_index (int): Index of the evaluated agent in the environment
+            max_episode_len (int): Maximum episode length
+            num_workers (int): Number of worker processes
+            num_envs (int): Number of environments stepped in lockstep by each worker
+        """
+        self.num_opponents = len(opponents)
+        self.num_workers = num_workers
+
+        # Workers must not inherit the TensorFlow session of the training process
+        context = multiprocessing.get_context("spawn")
+        self._tasks = context.Queue()
+        self._results = context.Queue()
+        self._workers = []
+        for worker_index in range(num_workers):
+            worker = context.Process(target=_worker, args=(env_fn, opponents, agent_index, num_envs, max_episode_len,
+                                                           worker_index, self._tasks, self._results))
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+
+        self._request_id = 0
+        self._rewards = None
+        self._episodes = None
+        self._remaining = 0
+
+        atexit.register(self.close)
+
+    @property
+    def busy(self):
+        return self._remaining > 0
+
+    def submit(self, actor, num_episodes):
+        """
+        Queue an evaluation of an actor snapshot against every opponent, unless one is in flight
+
+        Args:
+            actor (maddpg.common.numpy_policy.NumpyActor): Snapshot of the evaluated agent's actor
+            num_episodes (int): Number of episodes against each opponent
+
+        Returns:
+            (bool) True if the evaluation was queued
+        """
+        if self.busy:
+            return False
+
+        self._request_id += 1
+        self._rewards = np.zeros(self.num_opponents)
+        self._episodes = np.zeros(self.num_opponents)
+        self._remaining = 0
+
+        # Split each opponent's episodes so all workers share the load
+        chunk = int(np.ceil(num_episodes * self.num_opponents / float(self.num_workers)))
+        chunk = max(1, min(chunk, num_episodes))
+        for opponent in range(self.num_opponents):
+            for start in range(0, num_episodes, chunk):
+                self._tasks.put((self._request_id, opponent, actor, min(chunk, num_episodes - start)))
+                self._remaining += 1
+
+        return True
+
+    def poll(self, block=False):
+        """
+        Collect finished chunks
+
+        Args:
+            block (bool): Wait until the evaluation in flight is complete
+
+        Returns:
+            (numpy.array) Mean episode reward against each opponent when an evaluation has just
+                          completed, otherwise None
+        """
+        while self._remaining > 0:
+            try:
+                request_id, opponent, reward, num_episodes, error = self._results.get(block=block)
+            except queue.Empty:
+                return None
+
+            if error is not None:
+                self._remaining = 0
+                raise RuntimeError("Evaluation worker failed:\n{}".format(error))
+            if request_id != self._request_id:
+                continue
+
+            self._rewards[opponent] += reward
+            self._episodes[opponent] += num_episodes
+            self._remaining -= 1
+
+            if self._remaining == 0:
+                return self._rewards / self._episodes
+
+        return None
+
+    def close(self):
+        """
+        Stop the worker processes.
+        """
+        if not self._workers:
+            return
+        for _ in self._workers:
+            self._tasks.put(None)
+        for worker in self._workers:
+            worker.join(timeout=5)
+            if worker.is_alive():
+                worker.terminate()
+        self._workers = []
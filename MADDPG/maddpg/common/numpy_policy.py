@@ -0,0 +1,236 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+numpy_policy.py
+
+NumPy inference for agents that are not being trained
+
+Mirrors mlp_model (fully connected layers with relu activations and a linear output) followed by
+the Gumbel-softmax sampling of distributions.SoftCategoricalPd, so frozen opponents and agents in
+testing, display and benchmark modes can act without a TensorFlow session.run per step.
+
+Updated and Enhanced version of OpenAI Multi-Agent Deep Deterministic Policy Gradient (MADDPG) Algorithm
+(https://github.com/openai/maddpg)
+"""
+
+import numpy as np
+
+from maddpg.common.policy_export import DEFAULT_ACTIVATIONS, PolicyExport, group_layers, policy_variables
+
+__author__ = 'Rolando Fernandez'
+__copyright__ = 'Copyright 2020, Multi-Agent Deep Deterministic Policy Gradient'
+__credits__ = ['Rolando Fernandez', 'OpenAI']
+__license__ = ''
+__version__ = '0.0.1'
+__maintainer__ = 'Rolando Fernandez'
+__email__ = 'rolando.fernandez1.civ@mail.mil'
+__status__ = 'Dev'
+
+ACTIVATIONS = {'relu': lambda x: np.maximum(x, 0.0, out=x),
+               'tanh': lambda x: np.tanh(x, out=x),
+               'linear': lambda x: x}
+
+
+def softmax(logits):
+    """
+    Softmax over the last axis
+
+    Args:
+        logits (numpy.array): Unnormalized log probabilities
+
+    Returns:
+        (numpy.array) Probabilities
+    """
+    e = np.exp(logits - np.max(logits, axis=-1, keepdims=True))
+    return e / np.sum(e, axis=-1, keepdims=True)
+
+
+def gumbel_softmax_sample(logits):
+    """
+    Relaxed one-hot sample, as in SoftCategoricalPd.sample
+
+    Args:
+        logits (numpy.array): Unnormalized log probabilities
+
+    Returns:
+        (numpy.array) Sampled actions
+    """
+    u = np.random.random_sample(logits.shape).astype(logits.dtype)
+    return softmax(logits - np.log(-np.log(u)))
+
+
+class NumpyActor(object):
+    """
+    NumPy copy of an agent's p_func with the same call signature as MADDPGAgentTrainer.act
+    """
+    def __init__(self, layers):
+        """
+        Args:
+            layers (list): List of (weights, biases, activation) tuples, input layer first
+        """
+        self.layers = [(np.asarray(w, dtype=np.float32), np.asarray(b, dtype=np.float32), activation)
+                       for w, b, activation in layers]
+
+    @classmethod
+    def from_export(cls, export, name):
+        """
+        Args:
+            export (str or PolicyExport): Export directory or an opened export
+            name (str): Agent scope the weights were exported from
+        """
+        if not isinstance(export, PolicyExport):
+            export = PolicyExport(export)
+
+        return cls(export.layers(name))
+
+    @classmethod
+    def from_trainer(cls, trainer, sess=None, activations=DEFAULT_ACTIVATIONS):
+        """
+        Copy the current p_func weights of a trainer with a single session.run
+
+        Args:
+            trainer (maddpg.trainer.maddpg.MADDPGAgentTrainer): Trainer to copy
+            sess (tf.Session): Session to read variables from, defaults to the current session
+            activations (tuple): Activation of each layer
+        """
+        import maddpg.common.tf_util as tf_util
+
+        sess = sess or tf_util.get_session()
+        var_list = policy_variables(trainer.name)
+        values = sess.run(var_list)
+
+        return cls(group_layers([(var.op.name, value) for var, value in zip(var_list, values)], activations))
+
+    @property
+    def signature(self):
+        return tuple((w.shape, activation) for w, _, activation in self.layers)
+
+    def logits(self, obs):
+        """
+        Args:
+            obs (numpy.array): Observations, shape [B, obs_dim]
+
+        Returns:
+            (numpy.array) Action logits, shape [B, act_dim]
+        """
+        out = np.asarray(obs, dtype=np.float32)
+        for w, b, activation in self.layers:
+            out = ACTIVATIONS[activation](out @ w + b)
+
+        return out
+
+    def mode(self, obs):
+        """
+        Deterministic actions, as in SoftCategoricalPd.mode
+        """
+        return softmax(self.logits(obs))
+
+    def __call__(self, obs):
+        """
+        Sampled actions, as in MADDPGAgentTrainer.act
+
+        Args:
+            obs (numpy.array): Observations, shape [B, obs_dim]
+
+        Returns:
+            (numpy.array) Actions, shape [B, act_dim]
+        """
+        return gumbel_softmax_sample(self.logits(obs))
+
+
+class NumpyActorGroup(object):
+    """
+    Several NumpyActors evaluated together.
+
+    Actors with identical layer shapes have their weights stacked, so one batched matmul per
+    layer serves all of them and every environment in the batch.
+    """
+    def __init__(self, actors):
+        """
+        Args:
+            actors (list): List of NumpyActor objects, one per agent
+        """
+        self.actors = actors
+
+        # Stack the weights of actors with the same architecture
+        self.groups = []
+        signatures = [actor.signature for actor in actors]
+        for signature in sorted(set(signatures), key=signatures.index):
+            indices = [i for i, s in enumerate(signatures) if s == signature]
+            layers = []
+            for layer in range(len(signature)):
+                w = np.stack([actors[i].layers[layer][0] for i in indices])
+                b = np.stack([actors[i].layers[layer][1] for i in indices])[:, None, :]
+                layers.append((w, b, signature[layer][1]))
+            self.groups.append((indices, layers))
+
+    def logits(self, obs_n):
+        """
+        Args:
+            obs_n (list): Observations of each agent, each of shape [obs_dim] or [B, obs_dim]
+
+        Returns:
+            (list) Action logits of each agent, with the same leading shape as its observations
+        """
+        logits_n = [None] * len(self.actors)
+        for indices, layers in self.groups:
+            out = np.stack([np.asarray(obs_n[i], dtype=np.float32).reshape(-1, layers[0][0].shape[1])
+                            for i in indices])
+            for w, b, activation in layers:
+                out = ACTIVATIONS[activation](np.matmul(out, w) + b)
+            for j, i in enumerate(indices):
+                logits_n[i] = out[j].reshape(np.shape(obs_n[i])[:-1] + (out.shape[-1],))
+
+        return logits_n
+
+    def __call__(self, obs_n):
+        """
+        Sampled actions of every agent
+
+        Args:
+            obs_n (list): Observations of each agent, each of shape [obs_dim] or [B, obs_dim]
+
+        Returns:
+            (list) Actions of each agent, with the same leading shape as its observations
+        """
+        return [gumbel_softmax_sample(logits) for logits in self.logits(obs_n)]
+
+
+def freeze_actor(trainer, sess=None):
+    """
+    Route a trainer's actions through a NumPy copy of its current p_func.
+
+    Only trainer.act is replaced, the replay buffer, critic and target networks are untouched,
+    so the trainer can still serve as an opponent in other agents' updates. The copy is not
+    refreshed, so only freeze trainers that are no longer updated.
+
+    Args:
+        trainer (maddpg.trainer.maddpg.MADDPGAgentTrainer): Trainer to freeze
+        sess (tf.Session): Session to read variables from, defaults to the current session
+
+    Returns:
+        (NumpyActor) The actor now used by trainer.action
+    """
+    trainer.act = NumpyActor.from_trainer(trainer, sess)
+
+    return trainer.act
+
+
+def to_numpy_actor(trainer, sess=None):
+    """
+    NumPy actor of a trainer, reusing the one it already acts with if it is frozen
+
+    Args:
+        trainer (maddpg.trainer.trainer.AgentTrainer): Trainer or pool opponent
+        sess (tf.Session): Session to read variables from, defaults to the current session
+
+    Returns:
+        (NumpyActor) Actor with the trainer's current p_func weights
+    """
+    if isinstance(getattr(trainer, 'act', None), NumpyActor):
+        return trainer.act
+    if hasattr(trainer, 'numpy_actor'):
+        return trainer.numpy_actor()
+
+    return NumpyActor.from_trainer(trainer, sess)
@@ -0,0 +1,260 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+policy_export.py
+
+Policy-only export of trained agents
+
+Only the actor (p_func) weights of each agent are kept, without critics, target networks or
+optimizer slots. An export is a directory holding:
+    manifest.json : Per agent, the flat array file, total size and the name, shape and offset of each variable
+    <name>.npy    : Flat float32 array with the agent's p_func variables concatenated in graph order
+
+Exports can be loaded back into a graph built with the same model (see load_policy), or read as
+plain numpy weights for inference without TensorFlow (see PolicyExport.layers).
+
+Updated and Enhanced version of OpenAI Multi-Agent Deep Deterministic Policy Gradient (MADDPG) Algorithm
+(https://github.com/openai/maddpg)
+"""
+
+import json
+import numpy as np
+import os
+
+__author__ = 'Rolando Fernandez'
+__copyright__ = 'Copyright 2020, Multi-Agent Deep Deterministic Policy Gradient'
+__credits__ = ['Rolando Fernandez', 'OpenAI']
+__license__ = ''
+__version__ = '0.0.1'
+__maintainer__ = 'Rolando Fernandez'
+__email__ = 'rolando.fernandez1.civ@mail.mil'
+__status__ = 'Dev'
+
+MANIFEST = "manifest.json"
+
+# Activations of mlp_model, one per layer
+DEFAULT_ACTIVATIONS = ("relu", "relu", "linear")
+
+# SetFromFlat ops already built, keyed by graph and scope
+_SETTERS = {}
+
+
+def policy_variables(scope):
+    """
+    Trainable p_func variables of an agent, in graph creation order
+
+    Args:
+        scope (str): Agent scope, i.e. the trainer name
+
+    Returns:
+        (list) List of tf.Variable objects
+    """
+    import maddpg.common.tf_util as tf_util
+
+    return tf_util.scope_vars(scope + "/p_func/", trainable_only=True)
+
+
+def _relative_name(var, scope):
+    name = var.op.name
+    prefix = scope + "/p_func/"
+    return name[len(prefix):] if name.startswith(prefix) else name
+
+
+def group_layers(named_arrays, activations=DEFAULT_ACTIVATIONS):
+    """
+    Group fully connected weights and biases into layers
+
+    Args:
+        named_arrays (list): List of (variable name, numpy.array) pairs in graph order
+        activations (tuple): Activation of each layer
+
+    Returns:
+        (list) List of (weights, biases, activation) tuples, input layer first
+    """
+    weights = []
+    biases = []
+    for var_name, array in named_arrays:
+        if var_name.endswith("weights"):
+            weights.append(array)
+        elif var_name.endswith("biases"):
+            biases.append(array)
+    assert len(weights) == len(biases) == len(activations), \
+        "Weights do not match an MLP with {} layers".format(len(activations))
+
+    return list(zip(weights, biases, activations))
+
+
+def export_policies(path, scopes, sess=None, activations=DEFAULT_ACTIVATIONS):
+    """
+    Export the p_func weights of several agents with a single session.run.
+
+    Existing files of other agents in the export directory are kept, so agents trained in
+    different runs can be collected into one export.
+
+    Args:
+        path (str): Export directory, created if needed
+        scopes (list): Agent scopes (trainer names) to export
+        sess (tf.Session): Session to read variables from, defaults to the current session
+        activations (tuple): Activation of each layer, stored in the manifest for numpy inference
+    """
+    import maddpg.common.tf_util as tf_util
+
+    sess = sess or tf_util.get_session()
+    os.makedirs(path, exist_ok=True)
+
+    var_lists = [policy_variables(scope) for scope in scopes]
+    for scope, var_list in zip(scopes, var_lists):
+        assert len(var_list) > 0, "No p_func variables found in scope {}".format(scope)
+    values = sess.run(var_lists)
+
+    manifest_file = os.path.join(path, MANIFEST)
+    manifest = {'format': 1, 'agents': {}}
+    if os.path.isfile(manifest_file):
+        with open(manifest_file, 'r') as f:
+            manifest = json.load(f)
+
+    for scope, var_list, value_list in zip(scopes, var_lists, values):
+        flat = np.concatenate([np.asarray(value, dtype=np.float32).ravel() for value in value_list])
+
+        variables = []
+        offset = 0
+        for var, value in zip(var_list, value_list):
+            variables.append({'name': _relative_name(var, scope),
+                              'shape': list(value.shape),
+                              'offset': offset})
+            offset += int(value.size)
+
+        # Write the array before the manifest entry pointing to it
+        filename = scope + ".npy"
+        tmp_file = os.path.join(path, scope + ".tmp.npy")
+        np.save(tmp_file, flat)
+        os.replace(tmp_file, os.path.join(path, filename))
+
+        manifest['agents'][scope] = {'file': filename,
+                                     'size': int(flat.size),
+                                     'activations': list(activations),
+                                     'variables': variables}
+
+    tmp_file = manifest_file + ".tmp"
+    with open(tmp_file, 'w') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp_file, manifest_file)
+
+
+def is_policy_export(path):
+    """
+    Check whether a directory holds a policy export
+
+    Args:
+        path (str): Directory to check
+
+    Returns:
+        (bool) True if path contains a manifest
+    """
+    return os.path.isfile(os.path.join(path, MANIFEST))
+
+
+class PolicyExport(object):
+    """
+    Read access to a policy export directory.
+    """
+    def __init__(self, path):
+        """
+        Args:
+            path (str): Export directory written by export_policies
+        """
+        self.path = path
+        with open(os.path.join(path, MANIFEST), 'r') as f:
+            self.manifest = json.load(f)
+        self._flat = {}
+
+    @property
+    def names(self):
+        return sorted(self.manifest['agents'].keys())
+
+    def __contains__(self, name):
+        return name in self.manifest['agents']
+
+    def flat(self, name):
+        """
+        Flat float32 weights of an agent, read once and cached
+
+        Args:
+            name (str): Agent scope the weights were exported from
+
+        Returns:
+            (numpy.array) Flat weights, shape [size]
+        """
+        if name not in self._flat:
+            entry = self.manifest['agents'][name]
+            flat = np.load(os.path.join(self.path, entry['file']))
+            assert flat.shape == (entry['size'],), "Policy export {} is corrupt for {}".format(self.path, name)
+            self._flat[name] = flat
+
+        return self._flat[name]
+
+    def arrays(self, name):
+        """
+        Weights of an agent as arrays in their original shapes
+
+        Args:
+            name (str): Agent scope the weights were exported from
+
+        Returns:
+            (list) List of (variable name, numpy.array) pairs in graph order
+        """
+        flat = self.flat(name)
+        arrays = []
+        for var in self.manifest['agents'][name]['variables']:
+            size = int(np.prod(var['shape']))
+            arrays.append((var['name'], flat[var['offset']:var['offset'] + size].reshape(var['shape'])))
+
+        return arrays
+
+    def layers(self, name):
+        """
+        Weights of an agent grouped per fully connected layer
+
+        Args:
+            name (str): Agent scope the weights were exported from
+
+        Returns:
+            (list) List of (weights, biases, activation) tuples, input layer first
+        """
+        return group_layers(self.arrays(name), self.manifest['agents'][name]['activations'])
+
+
+def load_policy(export, name, scope=None, sess=None):
+    """
+    Assign exported p_func weights to an agent in the current graph.
+
+    The assign op is built once per scope and reused, so repeatedly swapping weights into the
+    same agent does not grow the graph.
+
+    Args:
+        export (str or PolicyExport): Export directory or an opened export
+        name (str): Agent scope the weights were exported from
+        scope (str): Agent scope to load into, defaults to name
+        sess (tf.Session): Session to assign in, defaults to the current session
+    """
+    import maddpg.common.tf_util as tf_util
+
+    if not isinstance(export, PolicyExport):
+        export = PolicyExport(export)
+    scope = scope or name
+    sess = sess or tf_util.get_session()
+
+    key = (sess.graph, scope)
+    if key not in _SETTERS:
+        var_list = policy_variables(scope)
+        with sess.graph.as_default():
+            _SETTERS[key] = (var_list, tf_util.SetFromFlat(var_list))
+    var_list, setter = _SETTERS[key]
+
+    variables = export.manifest['agents'][name]['variables']
+    assert [v['shape'] for v in variables] == [tf_util.var_shape(v) for v in var_list], \
+        "Exported policy {} does not match the p_func of scope {}".format(name, scope)
+
+    with sess.as_default():
+        setter(export.flat(name))
@@ -0,0 +1,305 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+profiler.py
+
+Named timers and counters for the hot paths of the training loop.
+
+Timers accumulate wall clock time and calls per phase, e.g. 'env/physics', 'action', 'replay/sample'
+or 'q_train', and counters accumulate event counts. Profiling is disabled by default, timer() then
+returns a shared no-op context manager and count() returns immediately, so the instrumentation left
+in the trainers costs about one function call.
+
+Once enabled with configure(), the per-phase breakdown and the environment steps per second are
+written every `interval` environment steps through the output formats of maddpg.common.logger:
+    steps_per_sec: Environment steps per second over the interval
+    ms/<phase>: Mean milliseconds per call
+    pct/<phase>: Percent of the interval's wall clock time, nested phases (e.g. env/physics within
+                 env/step) are included in their parent's percentage
+    calls/<phase>: Number of calls
+    n/<counter>: Count
+
+Updated and Enhanced version of OpenAI Multi-Agent Deep Deterministic Policy Gradient (MADDPG) Algorithm
+(https://github.com/openai/maddpg)
+"""
+
+import functools
+import time
+
+from maddpg.common import logger
+
+__author__ = 'Rolando Fernandez'
+__copyright__ = 'Copyright 2020, Multi-Agent Deep Deterministic Policy Gradient'
+__credits__ = ['Rolando Fernandez', 'OpenAI']
+__license__ = ''
+__version__ = '0.0.1'
+__maintainer__ = 'Rolando Fernandez'
+__email__ = 'rolando.fernandez1.civ@mail.mil'
+__status__ = 'Dev'
+
+
+class _NullTimer(object):
+    """
+    Timer used while profiling is disabled
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer(object):
+    """
+    Adds the time spent in a with block to a phase of a Profiler
+    """
+    __slots__ = ('totals', 'name', 'start')
+
+    def __init__(self, totals, name):
+        self.totals = totals
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        total = self.totals.get(self.name)
+        elapsed = time.perf_counter() - self.start
+        if total is None:
+            self.totals[self.name] = [elapsed, 1]
+        else:
+            total[0] += elapsed
+            total[1] += 1
+        return False
+
+
+class Profiler(object):
+    """
+    Per-phase timers and counters, reported every interval environment steps.
+    """
+    def __init__(self, interval=0, dir=None, format_strs=('stdout',)):
+        """
+        Args:
+            interval (int): Environment steps between reports, 0 disables profiling
+            dir (str): Directory of the file output formats
+            format_strs (list): maddpg.common.logger output formats, e.g. stdout, log, csv, json, tensorboard
+        """
+        self.enabled = interval > 0
+        self.interval = interval
+        self.timers = {}
+        self.counters = {}
+        self.steps = 0
+        self.t_start = time.perf_counter()
+
+        self.logger = None
+        if self.enabled:
+            output_formats = [logger.make_output_format(format_str, dir or logger.get_dir(), log_suffix='_profile')
+                              for format_str in format_strs if format_str]
+            self.logger = logger.Logger(dir=dir, output_formats=output_formats)
+
+    def timer(self, name):
+        """
+        Context manager timing a phase
+
+        Args:
+            name (str): Phase name
+
+        Returns:
+            Context manager adding the time spent in its block to the phase
+        """
+        if not self.enabled:
+            return _NULL_TIMER
+
+        return _Timer(self.timers, name)
+
+    def count(self, name, n=1):
+        """
+        Add to a counter
+
+        Args:
+            name (str): Counter name
+            n (int): Amount added
+        """
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def step(self, n=1):
+        """
+        Count environment steps and report once interval steps have passed since the last report
+
+        Args:
+            n (int): Number of environment steps
+        """
+        if not self.enabled:
+            return
+
+        self.steps += n
+        if self.steps >= self.interval:
+            self.dump()
+
+    def dump(self):
+        """
+        Write the breakdown since the last report and start a new interval
+
+        Returns:
+            (dict) Reported values
+        """
+        if not self.enabled:
+            return {}
+
+        elapsed = max(time.perf_counter() - self.t_start, 1e-12)
+        self.logger.logkv('steps', self.steps)
+        self.logger.logkv('steps_per_sec', self.steps / elapsed)
+        for name, (total, calls) in self.timers.items():
+            self.logger.logkv('ms/' + name, 1e3 * total / calls)
+            self.logger.logkv('pct/' + name, 100.0 * total / elapsed)
+            self.logger.logkv('calls/' + name, calls)
+        for name, count in self.counters.items():
+            self.logger.logkv('n/' + name, count)
+        values = self.logger.dumpkvs()
+
+        self.timers = {}
+        self.counters = {}
+        self.steps = 0
+        self.t_start = time.perf_counter()
+
+        return values
+
+    def close(self):
+        """
+        Report the last partial interval and close the output formats
+        """
+        if not self.enabled:
+            return
+
+        if self.steps > 0:
+            self.dump()
+        self.logger.close()
+        self.enabled = False
+
+
+# Profiler used by the free functions below, disabled until configure() is called
+_CURRENT = Profiler()
+
+
+def configure(interval, dir=None, format_strs=('stdout',)):
+    """
+    Enable or disable profiling
+
+    Args:
+        interval (int): Environment steps between reports, 0 disables profiling
+        dir (str): Directory of the file output formats
+        format_strs (list): maddpg.common.logger output formats, e.g. stdout, log, csv, json, tensorboard
+
+    Returns:
+        (Profiler) The current profiler
+    """
+    global _CURRENT
+
+    _CURRENT.close()
+    _CURRENT = Profiler(interval, dir, format_strs)
+
+    return _CURRENT
+
+
+def get_current():
+    return _CURRENT
+
+
+def timer(name):
+    """
+    Context manager timing a phase of the current profiler, a no-op while profiling is disabled
+
+    Usage:
+    with profiler.timer("q_train"):
+        code
+    """
+    return _CURRENT.timer(name)
+
+
+def count(name, n=1):
+    _CURRENT.count(name, n)
+
+
+def step(n=1):
+    _CURRENT.step(n)
+
+
+def dump():
+    return _CURRENT.dump()
+
+
+def close():
+    _CURRENT.close()
+
+
+def timed(name, func):
+    """
+    Wrap a function so that its calls are timed as a phase
+
+    Args:
+        name (str): Phase name
+        func (function): Function to wrap
+
+    Returns:
+        (function) Wrapped function
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _CURRENT.enabled:
+            return func(*args, **kwargs)
+
+        with _CURRENT.timer(name):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def profile(name):
+    """
+    Decorator timing every call of a function as a phase
+
+    Usage:
+    @profiler.profile("replay/sample")
+    def sample_index(self, idxes): code
+    """
+    def decorator(func):
+        return timed(name, func)
+
+    return decorator
+
+
+def instrument_env(env):
+    """
+    Time an environment's steps and resets, its world's physics step and its scenario callbacks
+    as the phases env/step, env/reset, env/physics and env/callbacks.
+
+    Does nothing while profiling is disabled, so the environment keeps its original methods.
+    Instrument the environment after cloning its world, since clones share the wrapped world step.
+
+    Args:
+        env (multiagent_particle_env.environment.MultiAgentEnv): Environment to instrument
+
+    Returns:
+        (multiagent_particle_env.environment.MultiAgentEnv) The environment
+    """
+    if not _CURRENT.enabled:
+        return env
+
+    env.world.step = timed('env/physics', env.world.step)
+    for name in ('reward_callback', 'observation_callback', 'done_callback', 'info_callback', 'logging_callback'):
+        callback = getattr(env, name, None)
+        if callback is not None:
+            setattr(env, name, timed('env/callbacks', callback))
+    env.step = timed('env/step', env.step)
+    env.reset = timed('env/reset', env.reset)
+
+    return env
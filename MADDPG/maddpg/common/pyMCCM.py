@@ -17,6 +17,8 @@ import matplotlib.pyplot as plt
 import time
 import warnings
 
+import maddpg.common.profiler as profiler
+
 __author__ = 'Rolando Fernandez'
 __copyright__ = 'Copyright 2020, Multi-Agent Deep Deterministic Policy Gradient'
 __credits__ = ['Rolando Fernandez', 'OpenAI']
@@ -275,6 +277,7 @@ def _check_auto_predictability(x, embedding_dim, tau, predsteplist=None):
     return signal_out
 
 
+@profiler.profile('ccm/score')
 def get_score(a_vec, b_vec, e_max=3, estimate_dim=True, tau=None, iterations=10, predstep=10, full_out=False, show_plot=True,
               clock=False):
     """
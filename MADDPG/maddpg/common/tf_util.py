@@ -324,6 +324,30 @@ def single_threaded_session():
     return make_session(num_cpu=1)
 
 
+# Inter-op and intra-op thread pool sizes of each session profile, given the number of CPUs
+SESSION_PROFILES = collections.OrderedDict([
+    # Everything on one thread, enough for batch size 1 actor inference and the default of every driver
+    ('single', lambda num_cpu: (1, 1)),
+    # Few ops at a time, each batch matmul split over every core
+    ('learner', lambda num_cpu: (2, num_cpu)),
+    # Independent ops, e.g. the updates of different agents, spread over every core
+    ('parallel', lambda num_cpu: (num_cpu, num_cpu)),
+])
+
+
+def profile_session(profile="single", make_default=False, graph=None):
+    """Returns a session with the thread pools of a named profile in SESSION_PROFILES,
+    sized from os.cpu_count()"""
+    inter_op, intra_op = SESSION_PROFILES[profile](os.cpu_count() or 1)
+    config = tf.ConfigProto(
+        allow_soft_placement=True,
+        inter_op_parallelism_threads=inter_op,
+        intra_op_parallelism_threads=intra_op)
+    config.gpu_options.allow_growth = True
+
+    return make_session(config=config, make_default=make_default, graph=graph)
+
+
 def in_session(f):
     @functools.wraps(f)
     def newfunc(*args, **kwargs):
@@ -346,6 +370,36 @@ def initialize():
 # Model components
 # ================================================================
 
+PRECISIONS = {'float32': tf.float32, 'bfloat16': tf.bfloat16, 'float16': tf.float16}
+
+
+def _float32_variable_getter(getter, name, *args, **kwargs):
+    """Custom getter keeping variables in float32 and casting them to the requested dtype"""
+    dtype = kwargs.get('dtype', tf.float32)
+    kwargs['dtype'] = tf.float32
+    variable = getter(name, *args, **kwargs)
+    return variable if dtype == tf.float32 else tf.cast(variable, dtype)
+
+
+def mixed_precision_model(model, precision="float32"):
+    """Wrap an MLP model so its forward pass runs in a lower precision.
+
+    Variables, and therefore checkpoints, optimizer updates and policy exports, stay float32. Inputs
+    and weights are cast to the precision for the forward pass and outputs are cast back to float32.
+    bfloat16 and float16 matmuls are only faster on CPUs with native support for them."""
+    if precision == "float32":
+        return model
+    dtype = PRECISIONS[precision]
+
+    def _model(input, num_outputs, scope, reuse=False, num_units=64, rnn_cell=None):
+        with tf.variable_scope(tf.get_variable_scope(), custom_getter=_float32_variable_getter):
+            out = model(tf.cast(input, dtype), num_outputs, scope, reuse=reuse, num_units=num_units,
+                        rnn_cell=rnn_cell)
+        return tf.cast(out, tf.float32)
+
+    return _model
+
+
 def normc_initializer(std=1.0, axis=0):
     def _initializer(shape, dtype=None, partition_info=None):  # pylint: disable=W0613
         out = np.random.randn(*shape).astype(dtype.as_numpy_dtype)
@@ -424,12 +478,11 @@ def function(inputs, outputs, updates=None, givens=None):
         f = _Function(inputs, outputs.values(), updates, givens=givens)
         return lambda *args, **kwargs: type(outputs)(zip(outputs.keys(), f(*args, **kwargs)))
     else:
-        f = _Function(inputs, [outputs], updates, givens=givens)
-        return lambda *args, **kwargs: f(*args, **kwargs)[0]
+        return _Function(inputs, [outputs], updates, givens=givens, single_output=True)
 
 
 class _Function(object):
-    def __init__(self, inputs, outputs, updates, givens):
+    def __init__(self, inputs, outputs, updates, givens, single_output=False):
         for inpt in inputs:
             if not hasattr(inpt, 'make_feed_dict') and not (type(inpt) is tf.Tensor and len(inpt.op.inputs) == 0):
                 assert False, "inputs should all be placeholders, constants, or have a make_feed_dict method"
@@ -439,6 +492,7 @@ class _Function(object):
         self.update_group = tf.group(*updates)
         self.outputs_update = list(outputs) + [self.update_group]
         self.givens = {} if givens is None else givens
+        self.single_output = single_output
 
     def _feed_input(self, feed_dict, inpt, value):
         if hasattr(inpt, 'make_feed_dict'):
@@ -446,7 +500,9 @@ class _Function(object):
         else:
             feed_dict[inpt] = adjust_shape(inpt, value)
 
-    def __call__(self, *args, **kwargs):
+    def feed_dict(self, *args, **kwargs):
+        """Build the feed dict of a call once, so it can be passed to run() several times,
+        e.g. to take several gradient steps on the same batch."""
         assert len(args) + len(kwargs) <= len(self.inputs), "Too many arguments provided"
         feed_dict = {}
         # Update feed dict with givens.
@@ -457,8 +513,14 @@ class _Function(object):
             self._feed_input(feed_dict, inpt, value)
         for inpt_name, value in kwargs.items():
             self._feed_input(feed_dict, self.input_names[inpt_name], value)
+        return feed_dict
+
+    def run(self, feed_dict):
         results = get_session().run(self.outputs_update, feed_dict=feed_dict)[:-1]
-        return results
+        return results[0] if self.single_output else results
+
+    def __call__(self, *args, **kwargs):
+        return self.run(self.feed_dict(*args, **kwargs))
 
 
 # ================================================================
@@ -13,8 +13,9 @@ import tensorflow as tf
 
 from maddpg.common.distributions import make_pdtype
 from maddpg.trainer.replay_buffer import ReplayBuffer
-from maddpg.trainer.trainer import AgentTrainer
+from maddpg.trainer.trainer import AgentTrainer, UpdateSchedule
 
+import maddpg.common.profiler as profiler
 import maddpg.common.tf_util as tf_util
 
 __author__ = 'Rolando Fernandez'
@@ -27,53 +28,46 @@ __email__ = 'rolando.fernandez1.civ@mail.mil'
 __status__ = 'Dev'
 
 
-def discount_with_dones(rewards, dones, gamma):
+def make_update_exp(vals, target_vals, optimize_expr, tau=1e-2, hard_update_interval=0):
     """
-    Discounts agent rewards with dones from scenario dones funtion.
+    Update target network values using polyak averaging (exponentially decaying average), or by copying
+    them every hard_update_interval optimizer steps.
 
-    Args:
-        rewards (list): Rewards for all agents
-        dones (list): Dones for all agents
-        gamma (float): Scalar for reward
-
-    Returns:
-         Discounted rewards
-    """
-    discounted = []
-    r = 0
-    for reward, done in zip(rewards[::-1], dones[::-1]):
-        r = reward + (gamma * r)
-        r = r * (1. - done)
-        discounted.append(r)
-
-    return discounted[::-1]
-
-
-def make_update_exp(vals, target_vals):
-    """
-    Update target network values using polyak averaging (exponentially decaying average).
+    The update runs as a control dependency of the optimizer step, so running the returned operation
+    takes one training step and updates the target network in the same session.run.
 
     Args:
         vals (tf.Variable): Network variables
         target_vals (tf.Variable): Target network variables
+        optimize_expr (tf.Operation): Optimizer step of the network
+        tau (float): Polyak averaging rate, 1 - polyak coefficient
+        hard_update_interval (int): Copy the network every this many optimizer steps instead of
+                                    averaging, 0 for Polyak averaging
 
     Returns
-        Updated target network values
+        (tf.Operation) Optimizer step followed by the target network update
     """
-    # Polyak coefficient for Polyak-averaging of the target network
-    polyak = 1.0 - 1e-2
+    pairs = list(zip(sorted(vals, key=lambda v: v.name), sorted(target_vals, key=lambda v: v.name)))
+
+    if hard_update_interval > 0:
+        counter = tf.Variable(0, dtype=tf.int64, trainable=False, name="target_update_counter")
 
-    expression = []
-    for var, var_target in zip(sorted(vals, key=lambda v: v.name), sorted(target_vals, key=lambda v: v.name)):
-        # Exponentially decaying average
-        expression.append(var_target.assign(polyak * var_target + (1.0 - polyak) * var))
-    expression = tf.group(*expression)
+    with tf.control_dependencies([optimize_expr]):
+        if hard_update_interval > 0:
+            step = tf.assign_add(counter, 1)
+            expression = tf.cond(tf.equal(step % hard_update_interval, 0),
+                                 lambda: tf.group(*[var_target.assign(var) for var, var_target in pairs]),
+                                 tf.no_op)
+        else:
+            # Exponentially decaying average
+            expression = tf.group(*[var_target.assign((1.0 - tau) * var_target + tau * var)
+                                    for var, var_target in pairs])
 
-    return tf_util.function([], [], updates=[expression])
+    return expression
 
 
 def p_train(make_obs_ph_n, act_space_n, p_index, p_func, q_func, optimizer, grad_norm_clipping=None,
-            local_q_func=False, num_units=64, scope="trainer", reuse=None):
+            local_q_func=False, num_units=64, tau=1e-2, hard_update_interval=0, scope="trainer", reuse=None):
     """
     Policy learning guided by Q-value
 
@@ -87,13 +81,14 @@ def p_train(make_obs_ph_n, act_space_n, p_index, p_func, q_func, optimizer, grad
         grad_norm_clipping (float): Value by which to clip the norm of the gradient
         local_q_func (boolean): Flag for using local q function
         num_units (int): The number outputs for the layers of the model
+        tau (float): Polyak averaging rate of the target network
+        hard_update_interval (int): Copy the target network every this many steps instead, 0 to average
         scope (str): The name of the scope
         reuse (boolean): Flag specifying whether to reuse the scope
 
     Returns:
         act (function): Action function for retrieving agent action.
-        train (function): Training function for P network
-        update_target_p (function): Update function for updating P network values
+        train (function): Training function for P network, also updating the target P network
         p_debug (dict): Contains 'p_values' and 'target_act' of the P network
     """
     with tf.variable_scope(scope, reuse=reuse):
@@ -127,25 +122,25 @@ def p_train(make_obs_ph_n, act_space_n, p_index, p_func, q_func, optimizer, grad
 
         optimize_expr = tf_util.minimize_and_clip(optimizer, loss, p_func_vars, grad_norm_clipping)
 
-        # Create callable functions
-        train = tf_util.function(inputs=obs_ph_n + act_ph_n, outputs=loss, updates=[optimize_expr])
-        act = tf_util.function(inputs=[obs_ph_n[p_index]], outputs=act_sample)
-        p_values = tf_util.function([obs_ph_n[p_index]], p)
-
         # Target network
         target_p = p_func(p_input, int(act_pdtype_n[p_index].param_shape()[0]),
                           scope="target_p_func", num_units=num_units)
         target_p_func_vars = tf_util.scope_vars(tf_util.absolute_scope_name("target_p_func"))
-        update_target_p = make_update_exp(p_func_vars, target_p_func_vars)
+        update_target_p = make_update_exp(p_func_vars, target_p_func_vars, optimize_expr, tau, hard_update_interval)
 
         target_act_sample = act_pdtype_n[p_index].pdfromflat(target_p).sample()
+
+        # Create callable functions
+        train = tf_util.function(inputs=obs_ph_n + act_ph_n, outputs=loss, updates=[update_target_p])
+        act = tf_util.function(inputs=[obs_ph_n[p_index]], outputs=act_sample)
+        p_values = tf_util.function([obs_ph_n[p_index]], p)
         target_act = tf_util.function(inputs=[obs_ph_n[p_index]], outputs=target_act_sample)
 
-        return act, train, update_target_p, {'p_values': p_values, 'target_act': target_act}
+        return act, train, {'p_values': p_values, 'target_act': target_act}
 
 
 def q_train(make_obs_ph_n, act_space_n, q_index, q_func, optimizer, grad_norm_clipping=None,
-            local_q_func=False, num_units=64, scope="trainer", reuse=None):
+            local_q_func=False, num_units=64, tau=1e-2, hard_update_interval=0, scope="trainer", reuse=None):
     """
     Q-Learning
 
@@ -157,12 +152,13 @@ def q_train(make_obs_ph_n, act_space_n, q_index, q_func, optimizer, grad_norm_cl
         grad_norm_clipping (float): Value by which to clip the norm of the gradient
         local_q_func (boolean): Flag for using local q function
         num_units (int): The number outputs for the layers of the model
+        tau (float): Polyak averaging rate of the target network
+        hard_update_interval (int): Copy the target network every this many steps instead, 0 to average
         scope (str): The name of the scope
         reuse (boolean): Flag specifying whether to reuse the scope
 
     Returns:
-        train (function): Training function for Q network
-        update_target_q (function): Update function for updating Q network values
+        train (function): Training function for Q network, also updating the target Q network
         q_debug (dict): Contains 'q_values' and 'target_q_values' of the Q network
     """
     with tf.variable_scope(scope, reuse=reuse):
@@ -189,18 +185,17 @@ def q_train(make_obs_ph_n, act_space_n, q_index, q_func, optimizer, grad_norm_cl
 
         optimize_expr = tf_util.minimize_and_clip(optimizer, loss, q_func_vars, grad_norm_clipping)
 
-        # Create callable functions
-        train = tf_util.function(inputs=obs_ph_n + act_ph_n + [target_ph], outputs=loss, updates=[optimize_expr])
-        q_values = tf_util.function(obs_ph_n + act_ph_n, q)
-
         # Target network
         target_q = q_func(q_input, 1, scope="target_q_func", num_units=num_units)[:, 0]
         target_q_func_vars = tf_util.scope_vars(tf_util.absolute_scope_name("target_q_func"))
-        update_target_q = make_update_exp(q_func_vars, target_q_func_vars)
+        update_target_q = make_update_exp(q_func_vars, target_q_func_vars, optimize_expr, tau, hard_update_interval)
 
+        # Create callable functions
+        train = tf_util.function(inputs=obs_ph_n + act_ph_n + [target_ph], outputs=loss, updates=[update_target_q])
+        q_values = tf_util.function(obs_ph_n + act_ph_n, q)
         target_q_values = tf_util.function(obs_ph_n + act_ph_n, target_q)
 
-        return train, update_target_q, {'q_values': q_values, 'target_q_values': target_q_values}
+        return train, {'q_values': q_values, 'target_q_values': target_q_values}
 
 
 class MADDPGAgentTrainer(AgentTrainer):
@@ -232,7 +227,7 @@ class MADDPGAgentTrainer(AgentTrainer):
             obs_ph_n.append(tf_util.BatchInput(obs_shape_n[i], name="observation" + str(i)).get())
 
         # Create all the functions necessary to train the model
-        self.q_train, self.q_update, self.q_debug = q_train(
+        self.q_train, self.q_debug = q_train(
             scope=self.name,
             make_obs_ph_n=obs_ph_n,
             act_space_n=act_space_n,
@@ -241,9 +236,11 @@ class MADDPGAgentTrainer(AgentTrainer):
             optimizer=tf.train.AdamOptimizer(learning_rate=args.lr),
             grad_norm_clipping=0.5,
             local_q_func=local_q_func,
-            num_units=args.num_units
+            num_units=args.num_units,
+            tau=args.tau,
+            hard_update_interval=args.target_update_interval
         )
-        self.act, self.p_train, self.p_update, self.p_debug = p_train(
+        self.act, self.p_train, self.p_debug = p_train(
             scope=self.name,
             make_obs_ph_n=obs_ph_n,
             act_space_n=act_space_n,
@@ -253,14 +250,18 @@ class MADDPGAgentTrainer(AgentTrainer):
             optimizer=tf.train.AdamOptimizer(learning_rate=args.lr),
             grad_norm_clipping=0.5,
             local_q_func=local_q_func,
-            num_units=args.num_units
+            num_units=args.num_units,
+            tau=args.tau,
+            hard_update_interval=args.target_update_interval
         )
 
         # Create experience buffer
         self.replay_buffer = ReplayBuffer(int(1e6))
-        self.max_replay_buffer_len = 30 # args.batch_size * args.max_episode_len TODO: Change back
+        self.schedule = UpdateSchedule.from_args(args, warmup=30)
+        self.max_replay_buffer_len = self.schedule.warmup
         self.replay_sample_index = None
 
+    @profiler.profile('action')
     def action(self, obs):
         """
         Retrieves action for agent from the P network given the observations
@@ -293,6 +294,7 @@ class MADDPGAgentTrainer(AgentTrainer):
         """
         self.replay_sample_index = None
 
+    @profiler.profile('update')
     def update(self, agents, steps):
         """
         Update agent networks
@@ -305,12 +307,8 @@ class MADDPGAgentTrainer(AgentTrainer):
             (list) Training loss for the agents
                    [q_loss, p_loss, mean_target_q, mean_reward, mean_target_q_next, std_target_q]
         """
-        # Replay buffer is not large enough
-        if len(self.replay_buffer) < self.max_replay_buffer_len:
-            return
-
-        # Only update every 100 steps
-        if not steps % 100 == 0:
+        # Replay buffer is not large enough or not an update step
+        if not self.schedule.ready(self.replay_buffer, steps):
             return
 
         # Collect replay sample from all agents
@@ -319,13 +317,25 @@ class MADDPGAgentTrainer(AgentTrainer):
         act_n = []
         self.replay_sample_index = self.replay_buffer.make_index(self.args.batch_size)
         self_index = self.replay_sample_index
+        index_n = []
         for i in range(self.n):
             index = agents[i].replay_buffer.make_index(self.args.batch_size)
             obs, act, rew, obs_next, done = agents[i].replay_buffer.sample_index(index)
             obs_n.append(obs)
             obs_next_n.append(obs_next)
             act_n.append(act)
+            index_n.append(np.asarray(index))
         obs, act, rew, obs_next, done = self.replay_buffer.sample_index(self_index)
+        discount = self.args.gamma
+
+        # N-step returns, every agent's next observation is taken the same number of steps ahead
+        if self.args.n_step > 1:
+            rew, bootstrap_index, done, discount = self.replay_buffer.sample_n_step(self_index, self.args.n_step,
+                                                                                    self.args.gamma)
+            steps_ahead = bootstrap_index - np.asarray(self_index)
+            for i in range(self.n):
+                next_index = np.minimum(index_n[i] + steps_ahead, len(agents[i].replay_buffer) - 1)
+                obs_next_n[i] = agents[i].replay_buffer.sample_index(next_index)[3]
 
         # Train Q Network
         num_sample = 1
@@ -334,14 +344,17 @@ class MADDPGAgentTrainer(AgentTrainer):
         for i in range(num_sample):
             target_act_next_n = [agents[i].p_debug['target_act'](obs_next_n[i]) for i in range(self.n)]
             target_q_next = self.q_debug['target_q_values'](*(obs_next_n + target_act_next_n))
-            target_q += rew + self.args.gamma * (1.0 - done) * target_q_next
+            target_q += rew + discount * (1.0 - done) * target_q_next
         target_q /= num_sample
-        q_loss = self.q_train(*(obs_n + act_n + [target_q]))
-
-        # Train P Network
-        p_loss = self.p_train(*(obs_n + act_n))
 
-        self.p_update()
-        self.q_update()
+        # Train Q and P Networks, reusing the batch's feed dicts for every gradient step
+        # Each training step also updates its target network
+        q_feed = self.q_train.feed_dict(*(obs_n + act_n + [target_q]))
+        p_feed = self.p_train.feed_dict(*(obs_n + act_n))
+        for _ in range(self.schedule.gradient_steps):
+            with profiler.timer('q_train'):
+                q_loss = self.q_train.run(q_feed)
+            with profiler.timer('p_train'):
+                p_loss = self.p_train.run(p_feed)
 
         return [q_loss, p_loss, np.mean(target_q), np.mean(rew), np.mean(target_q_next), np.std(target_q)]
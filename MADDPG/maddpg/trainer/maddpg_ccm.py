@@ -15,10 +15,12 @@ import time
 import tensorflow as tf
 
 from maddpg.common.distributions import make_pdtype
-from maddpg.trainer.trainer import AgentTrainer
+from maddpg.trainer.maddpg import make_update_exp
+from maddpg.trainer.trainer import AgentTrainer, UpdateSchedule
 from maddpg.trainer.replay_buffer import ReplayBuffer
 
 import maddpg.common.pyMCCM as ccm
+import maddpg.common.profiler as profiler
 import maddpg.common.tf_util as tf_util
 
 __author__ = 'Rolando Fernandez'
@@ -31,53 +33,9 @@ __email__ = 'rolando.fernandez1.civ@mail.mil'
 __status__ = 'Dev'
 
 
-def discount_with_dones(rewards, dones, gamma):
-    """
-    Discounts agent rewards with dones from scenario dones funtion.
-
-    Args:
-        rewards (list): Rewards for all agents
-        dones (list): Dones for all agents
-        gamma (float): Scalar for reward
-
-    Returns:
-         Discounted rewards
-    """
-    discounted = []
-    r = 0
-    for reward, done in zip(rewards[::-1], dones[::-1]):
-        r = reward + (gamma * r)
-        r = r * (1. - done)
-        discounted.append(r)
-
-    return discounted[::-1]
-
-
-def make_update_exp(vals, target_vals):
-    """
-    Update target network values using polyak averaging (exponentially decaying average).
-
-    Args:
-        vals (tf.Variable): Network variables
-        target_vals (tf.Variable): Target network variables
-
-    Returns
-        Updated target network values
-    """
-    # Polyak coefficient for Polyak-averaging of the target network
-    polyak = 1.0 - 1e-2
-
-    expression = []
-    for var, var_target in zip(sorted(vals, key=lambda v: v.name), sorted(target_vals, key=lambda v: v.name)):
-        # Exponentially decaying average
-        expression.append(var_target.assign(polyak * var_target + (1.0 - polyak) * var))
-    expression = tf.group(*expression)
-
-    return tf_util.function([], [], updates=[expression])
-
-
 def p_train(make_obs_ph_n, act_space_n, make_obs_history_n, make_act_history_n, p_index, p_func, q_func, optimizer,
-            grad_norm_clipping=None, local_q_func=False, num_units=64, scope="trainer", reuse=None):
+            grad_norm_clipping=None, local_q_func=False, num_units=64, tau=1e-2, hard_update_interval=0,
+            scope="trainer", reuse=None):
     """
     Policy learning guided by Q-value
 
@@ -93,13 +51,14 @@ def p_train(make_obs_ph_n, act_space_n, make_obs_history_n, make_act_history_n,
         grad_norm_clipping (float): Value by which to clip the norm of the gradient
         local_q_func (boolean): Flag for using local q function
         num_units (int): The number outputs for the layers of the model
+        tau (float): Polyak averaging rate of the target network
+        hard_update_interval (int): Copy the target network every this many steps instead, 0 to average
         scope (str): The name of the scope
         reuse (boolean): Flag specifying whether to reuse the scope
 
     Returns:
         act (function): Action function for retrieving agent action.
-        train (function): Training function for P network
-        update_target_p (function): Update function for updating P network values
+        train (function): Training function for P network, also updating the target P network
         p_debug (dict): Contains 'p_values' and 'target_act' of the P network
     """
     with tf.variable_scope(scope, reuse=reuse):
@@ -168,10 +127,16 @@ def p_train(make_obs_ph_n, act_space_n, make_obs_history_n, make_act_history_n,
 
         optimize_expr = tf_util.minimize_and_clip(optimizer, loss, p_func_vars, grad_norm_clipping)
 
+        # Target network
+        target_p = p_func(p_input, int(act_pdtype_n[p_index].param_shape()[0]),
+                          scope="target_p_func", num_units=num_units)
+        target_p_func_vars = tf_util.scope_vars(tf_util.absolute_scope_name("target_p_func"))
+        update_target_p = make_update_exp(p_func_vars, target_p_func_vars, optimize_expr, tau, hard_update_interval)
+
         # Create callable functions
         train = tf_util.function(
             inputs=obs_ph_n + obs_history_n + act_ph_n + act_history_n + ccm_ph_n + ccm_lambda + ccm_switch,
-            outputs=loss, updates=[optimize_expr])
+            outputs=loss, updates=[update_target_p])
 
         # Original implementation
         # act = tf_util.function(inputs=[obs_ph_n[p_index]], outputs=act_sample)
@@ -181,12 +146,6 @@ def p_train(make_obs_ph_n, act_space_n, make_obs_history_n, make_act_history_n,
         act = tf_util.function(inputs=[obs_ph_n[p_index]] + [obs_history_n[p_index]], outputs=act_sample)
         p_values = tf_util.function(inputs=[obs_ph_n[p_index]] + [obs_history_n[p_index]], outputs=p)
 
-        # target network
-        target_p = p_func(p_input, int(act_pdtype_n[p_index].param_shape()[0]),
-                          scope="target_p_func", num_units=num_units)
-        target_p_func_vars = tf_util.scope_vars(tf_util.absolute_scope_name("target_p_func"))
-        update_target_p = make_update_exp(p_func_vars, target_p_func_vars)
-
         target_act_sample = act_pdtype_n[p_index].pdfromflat(target_p).sample()
 
         # Original implementation
@@ -195,11 +154,12 @@ def p_train(make_obs_ph_n, act_space_n, make_obs_history_n, make_act_history_n,
         # Modified
         target_act = tf_util.function(inputs=[obs_ph_n[p_index]] + [obs_history_n[p_index]], outputs=target_act_sample)
 
-        return act, train, update_target_p, {'p_values': p_values, 'target_act': target_act}
+        return act, train, {'p_values': p_values, 'target_act': target_act}
 
 
 def q_train(make_obs_ph_n, act_space_n, make_obs_history_n, make_act_history_n, q_index, q_func, optimizer,
-            grad_norm_clipping=None, local_q_func=False, scope="trainer", reuse=None, num_units=64):
+            grad_norm_clipping=None, local_q_func=False, scope="trainer", reuse=None, num_units=64, tau=1e-2,
+            hard_update_interval=0):
     """
     Q-Learning
 
@@ -213,13 +173,14 @@ def q_train(make_obs_ph_n, act_space_n, make_obs_history_n, make_act_history_n,
         grad_norm_clipping (float): Value by which to clip the norm of the gradient
         local_q_func (boolean): Flag for using local q function
         num_units (int): The number outputs for the layers of the model
+        tau (float): Polyak averaging rate of the target network
+        hard_update_interval (int): Copy the target network every this many steps instead, 0 to average
         scope (str): The name of the scope
         reuse (boolean): Flag specifying whether to reuse the scope
 
     Returns:
-        train (function): Training function for Q network
-        update_target_q (function): Update function for updating Q network values
-        q_debug (dict): Contains 'q_values' and 'target_q_values' of the Q network
+        train (function): Training function for Q network, also updating the target Q network
+        q_debug (dict): Contains 'q_values', 'target_q_values' and 'train_without_target_update' of the Q network
     """
     with tf.variable_scope(scope, reuse=reuse):
         # Create distribtuions
@@ -268,19 +229,24 @@ def q_train(make_obs_ph_n, act_space_n, make_obs_history_n, make_act_history_n,
 
         optimize_expr = tf_util.minimize_and_clip(optimizer, loss, q_func_vars, grad_norm_clipping)
 
-        # Create callable functions
-        train = tf_util.function(inputs=obs_ph_n + obs_history_n + act_ph_n + act_history_n + [target_ph],
-                                 outputs=loss, updates=[optimize_expr])
-        q_values = tf_util.function(obs_ph_n + obs_history_n + act_ph_n + act_history_n, q)
-
         # Target network
         target_q = q_func(q_input, 1, scope="target_q_func", num_units=num_units)[:, 0]
         target_q_func_vars = tf_util.scope_vars(tf_util.absolute_scope_name("target_q_func"))
-        update_target_q = make_update_exp(q_func_vars, target_q_func_vars)
+        update_target_q = make_update_exp(q_func_vars, target_q_func_vars, optimize_expr, tau, hard_update_interval)
 
+        # Create callable functions
+        train = tf_util.function(inputs=obs_ph_n + obs_history_n + act_ph_n + act_history_n + [target_ph],
+                                 outputs=loss, updates=[update_target_q])
+        q_values = tf_util.function(obs_ph_n + obs_history_n + act_ph_n + act_history_n, q)
         target_q_values = tf_util.function(obs_ph_n + obs_history_n + act_ph_n + act_history_n, target_q)
 
-        return train, update_target_q, {'q_values': q_values, 'target_q_values': target_q_values}
+        # The CCM update trains the Q network without moving its target network
+        train_without_target_update = tf_util.function(
+            inputs=obs_ph_n + obs_history_n + act_ph_n + act_history_n + [target_ph], outputs=loss,
+            updates=[optimize_expr])
+
+        return train, {'q_values': q_values, 'target_q_values': target_q_values,
+                       'train_without_target_update': train_without_target_update}
 
 
 class MADDPGAgentTrainerCCM(AgentTrainer):
@@ -330,7 +296,7 @@ class MADDPGAgentTrainerCCM(AgentTrainer):
         # obs_ph_n = [tf.concat(3*[x],1,name="observation{}".format(i)) for i,x in enumerate(obs_ph_n)]
 
         # Create all the functions necessary to train the model
-        self.q_train, self.q_update, self.q_debug = q_train(
+        self.q_train, self.q_debug = q_train(
             scope=self.name,
             make_obs_ph_n=obs_ph_n,
             act_space_n=act_space_n,
@@ -341,9 +307,11 @@ class MADDPGAgentTrainerCCM(AgentTrainer):
             optimizer=tf.train.AdamOptimizer(learning_rate=args.lr),
             grad_norm_clipping=0.5,
             local_q_func=local_q_func,
-            num_units=args.num_units
+            num_units=args.num_units,
+            tau=args.tau,
+            hard_update_interval=args.target_update_interval
         )
-        self.act, self.p_train, self.p_update, self.p_debug = p_train(
+        self.act, self.p_train, self.p_debug = p_train(
             scope=self.name,
             make_obs_ph_n=obs_ph_n,
             act_space_n=act_space_n,
@@ -355,13 +323,17 @@ class MADDPGAgentTrainerCCM(AgentTrainer):
             optimizer=tf.train.AdamOptimizer(learning_rate=args.lr),
             grad_norm_clipping=0.5,
             local_q_func=local_q_func,
-            num_units=args.num_units
+            num_units=args.num_units,
+            tau=args.tau,
+            hard_update_interval=args.target_update_interval
         )
         # Create experience buffer
         self.replay_buffer = ReplayBuffer(1e6)
-        self.max_replay_buffer_len = 4 * args.batch_size * args.max_episode_len
+        self.schedule = UpdateSchedule.from_args(args, warmup=12500)
+        self.max_replay_buffer_len = self.schedule.warmup
         self.replay_sample_index = None
 
+    @profiler.profile('action')
     def action(self, obs):
         """
         Retrieves action for agent from the P network given the observations
@@ -403,6 +375,7 @@ class MADDPGAgentTrainerCCM(AgentTrainer):
         """
         self.replay_sample_index = None
 
+    @profiler.profile('update')
     def update(self, agents, steps):
         """
         Update agent networks
@@ -415,13 +388,8 @@ class MADDPGAgentTrainerCCM(AgentTrainer):
             (list) Training loss for the agents
                    [q_loss, p_loss, mean_target_q, mean_reward, mean_target_q_next, std_target_q]
         """
-        # Replay buffer is not large enough
-        # if len(self.replay_buffer) < self.max_replay_buffer_len:
-        if len(self.replay_buffer) < 12500:
-            return
-
-        # Only update every 100 steps
-        if not steps % 100 == 0:
+        # Replay buffer is not large enough or not an update step
+        if not self.schedule.ready(self.replay_buffer, steps):
             return
 
         self.replay_sample_index = self.replay_buffer.make_index(self.args.batch_size)
@@ -453,6 +421,15 @@ class MADDPGAgentTrainerCCM(AgentTrainer):
             act_n.append(act)
             act_h_n.append(act_h)
         _, _, rew, _, done, _, _, rew_h, _, done_h = self.replay_buffer.sample_index(index, history=0)
+        discount = self.args.gamma
+
+        # N-step returns, next observations are taken at the bootstrap index
+        if self.args.n_step > 1:
+            rew, bootstrap_index, done, discount = self.replay_buffer.sample_n_step(index, self.args.n_step,
+                                                                                    self.args.gamma)
+            for i in range(self.n):
+                _, _, _, obs_next_n[i], _, _, _, _, obs_next_h_n[i], _ = agents[i].\
+                    replay_buffer.sample_index(bootstrap_index, history=hist)
 
         obs_h_n = [[list() for _ in range(len(obs_n[0]))] if len(x) == 0 else x for x in obs_h_n]
         obs_next_h_n = [[list() for _ in range(len(obs_next_n[0]))] if len(x) == 0 else x for x in obs_next_h_n]
@@ -471,22 +448,24 @@ class MADDPGAgentTrainerCCM(AgentTrainer):
             target_q_next = self.q_debug['target_q_values'](*(obs_next_n + obs_next_h_n + target_act_next_n + act_h_n))
 
             # TODO: Possible error point
-            target_q += rew + self.args.gamma * (1.0 - done) * target_q_next
+            target_q += rew + discount * (1.0 - done) * target_q_next
 
         target_q /= num_sample
 
         # TODO: Possible error point
-        q_loss = self.q_train(*(obs_n + obs_h_n + act_n + act_h_n + [target_q]))
-
-        # Train P network
-        # p_loss = self.p_train(*(obs_n + act_n))
-        p_loss = self.p_train(*(obs_n + obs_h_n + act_n + act_h_n + [ccm_loss] + [ccm_lambda] + [ccm_switch]))
-
-        self.p_update()
-        self.q_update()
+        # Train Q and P networks, reusing the batch's feed dicts for every gradient step
+        # Each training step also updates its target network
+        q_feed = self.q_train.feed_dict(*(obs_n + obs_h_n + act_n + act_h_n + [target_q]))
+        p_feed = self.p_train.feed_dict(*(obs_n + obs_h_n + act_n + act_h_n + [ccm_loss] + [ccm_lambda] + [ccm_switch]))
+        for _ in range(self.schedule.gradient_steps):
+            with profiler.timer('q_train'):
+                q_loss = self.q_train.run(q_feed)
+            with profiler.timer('p_train'):
+                p_loss = self.p_train.run(p_feed)
 
         return [q_loss, p_loss, np.mean(target_q), np.mean(rew), np.mean(target_q_next), np.std(target_q)]
 
+    @profiler.profile('ccm/update')
     def ccm_update(self, agents, steps):
         """
         CCM Update agent networks
@@ -500,9 +479,7 @@ class MADDPGAgentTrainerCCM(AgentTrainer):
                    [q_loss, p_loss, mean_target_q, mean_reward, mean_target_q_next, std_target_q]
         """
         # Replay buffer is not large enough
-        # if len(self.replay_buffer) < self.max_replay_buffer_len:
-        if len(self.replay_buffer) < 12500:
-            # print("{}/{}".format(len(self.replay_buffer),self.max_replay_buffer_len))
+        if not self.schedule.warm(self.replay_buffer):
             return
 
         # Only update every 4 episodes
@@ -588,6 +565,15 @@ class MADDPGAgentTrainerCCM(AgentTrainer):
 
         # Modified
         _, _, rew, _, done, _, _, rew_h, _, done_h = self.replay_buffer.sample_index(index, history=0)
+        discount = self.args.gamma
+
+        # N-step returns, next observations are taken at the bootstrap index
+        if self.args.n_step > 1:
+            rew, bootstrap_index, done, discount = self.replay_buffer.sample_n_step(index, self.args.n_step,
+                                                                                    self.args.gamma)
+            for i in range(self.n):
+                _, _, _, obs_next_n[i], _, _, _, _, obs_next_h_n[i], _ = agents[i].\
+                    replay_buffer.sample_index(bootstrap_index, history=hist)
 
         obs_h_n = [[list() for _ in range(len(obs_n[0]))] if len(x) == 0 else x for x in obs_h_n]
         obs_next_h_n = [[list() for _ in range(len(obs_next_n[0]))] if len(x) == 0 else x for x in obs_next_h_n]
@@ -601,18 +587,20 @@ class MADDPGAgentTrainerCCM(AgentTrainer):
             target_q_next = self.q_debug['target_q_values'](*(obs_next_n + obs_next_h_n + target_act_next_n + act_h_n))
 
             # TODO: Possible error point
-            target_q += rew + self.args.gamma * (1.0 - done) * target_q_next
+            target_q += rew + discount * (1.0 - done) * target_q_next
 
         target_q /= num_sample
 
         # TODO: Possible error point
-        q_loss = self.q_train(*(obs_n + obs_h_n + act_n + act_h_n + [target_q]))
-
-        # Train P network
-        # p_loss = self.p_train(*(obs_n + act_n))
-        p_loss = self.p_train(*(obs_n + obs_h_n + act_n + act_h_n + [ccm_loss] + [ccm_lambda] + [ccm_switch]))
-
-        self.p_update()
-        # self.q_update()
+        # Train Q and P networks, reusing the batch's feed dicts for every gradient step
+        # Only the P network's training step updates its target network
+        q_train = self.q_debug['train_without_target_update']
+        q_feed = q_train.feed_dict(*(obs_n + obs_h_n + act_n + act_h_n + [target_q]))
+        p_feed = self.p_train.feed_dict(*(obs_n + obs_h_n + act_n + act_h_n + [ccm_loss] + [ccm_lambda] + [ccm_switch]))
+        for _ in range(self.schedule.gradient_steps):
+            with profiler.timer('q_train'):
+                q_loss = q_train.run(q_feed)
+            with profiler.timer('p_train'):
+                p_loss = self.p_train.run(p_feed)
 
         return [q_loss, p_loss, np.mean(target_q), np.mean(rew), np.mean(target_q_next), np.std(target_q)]
@@ -0,0 +1,474 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+maddpg_shared.py
+
+MADDPG with parameter sharing for homogeneous agents.
+
+A group of interchangeable agents, e.g. the predators of openai/simple_tag, shares one actor and one
+centralized critic instead of building a full MADDPGAgentTrainer per agent. Both networks are conditioned
+on a learned embedding of the agent's id within the group, so the agents can still specialize. The group
+is updated with a single batched step: a batch is sampled for every member and the batches are stacked,
+each row carrying the id of the member it trains. Graph size and the number of optimizer steps per update
+stay constant as the group grows.
+
+Each member is exposed through a SharedMADDPGAgentTrainer with its own replay buffer and the interface of
+MADDPGAgentTrainer, so the drivers' training loop and the other agents' MADDPG trainers work unchanged.
+
+Updated and Enhanced version of OpenAI Multi-Agent Deep Deterministic Policy Gradient (MADDPG) Algorithm
+(https://github.com/openai/maddpg)
+"""
+
+import numpy as np
+import tensorflow as tf
+
+from maddpg.common.distributions import make_pdtype
+from maddpg.trainer.maddpg import make_update_exp
+from maddpg.trainer.replay_buffer import ReplayBuffer
+from maddpg.trainer.trainer import AgentTrainer, UpdateSchedule
+
+import maddpg.common.profiler as profiler
+import maddpg.common.tf_util as tf_util
+
+__author__ = 'Rolando Fernandez'
+__copyright__ = 'Copyright 2020, Multi-Agent Deep Deterministic Policy Gradient'
+__credits__ = ['Rolando Fernandez', 'OpenAI']
+__license__ = ''
+__version__ = '0.0.1'
+__maintainer__ = 'Rolando Fernandez'
+__email__ = 'rolando.fernandez1.civ@mail.mil'
+__status__ = 'Dev'
+
+
+def embedded_model(model, ids_ph, num_ids, embedding_dim):
+    """
+    Wrap a model so that its input is concatenated with a learned embedding of the agent id.
+
+    The embedding is a variable of the model's scope, so it is trained with the network, copied to the
+    target network and saved with the model.
+
+    Args:
+        model (function): MLP Neural Network model
+        ids_ph (tf.placeholder): Agent id within the group of every input row, shape [None], int32
+        num_ids (int): Number of agents in the group
+        embedding_dim (int): Size of the embedding
+
+    Returns:
+        (function) Model with the signature of model
+    """
+    def _model(input, num_outputs, scope, reuse=False, num_units=64, rnn_cell=None):
+        with tf.variable_scope(scope, reuse=reuse):
+            embedding = tf.get_variable("agent_embedding", [num_ids, embedding_dim],
+                                        initializer=tf.random_normal_initializer(stddev=1.0 / np.sqrt(embedding_dim)))
+            input = tf.concat([input, tf.nn.embedding_lookup(embedding, ids_ph)], 1)
+        return model(input, num_outputs, scope, reuse=reuse, num_units=num_units, rnn_cell=rnn_cell)
+
+    return _model
+
+
+def shared_p_train(make_obs_ph_n, act_space_n, group_indices, own_obs_ph, ids_ph, p_func, q_func, optimizer,
+                   grad_norm_clipping=None, local_q_func=False, num_units=64, tau=1e-2, hard_update_interval=0,
+                   scope="trainer", reuse=None):
+    """
+    Policy learning of a shared actor guided by the shared Q-value
+
+    Every row of a batch trains the member given by its id: the member's action in the critic input is
+    replaced by the actor's action on the member's own observation.
+
+    Args:
+        make_obs_ph_n (tf.placeholder): Placeholder for the observation space of all agents
+        act_space_n (list): A list of the action spaces for all agents
+        group_indices (list): Agent index numbers of the members of the group, in member id order
+        own_obs_ph (tf.placeholder): Observation of the member of every row
+        ids_ph (tf.placeholder): Member id of every row
+        p_func (function): MLP Neural Network model conditioned on the member id, see embedded_model()
+        q_func (function): MLP Neural Network model conditioned on the member id, see embedded_model()
+        optimizer (function): Network Optimizer function
+        grad_norm_clipping (float): Value by which to clip the norm of the gradient
+        local_q_func (boolean): Flag for using local q function
+        num_units (int): The number outputs for the layers of the model
+        tau (float): Polyak averaging rate of the target network
+        hard_update_interval (int): Copy the target network every this many steps instead, 0 to average
+        scope (str): The name of the scope
+        reuse (boolean): Flag specifying whether to reuse the scope
+
+    Returns:
+        act (function): Action function taking the observations and member ids
+        train (function): Training function for P network, also updating the target P network
+        p_debug (dict): Contains 'p_values' and 'target_act' of the P network
+    """
+    with tf.variable_scope(scope, reuse=reuse):
+        # Create distribtuions
+        act_pdtype_n = [make_pdtype(act_space) for act_space in act_space_n]
+        act_pdtype = act_pdtype_n[group_indices[0]]
+
+        # Set up placeholders
+        obs_ph_n = make_obs_ph_n
+        act_ph_n = [act_pdtype_n[i].sample_placeholder([None], name="action" + str(i)) for i in range(len(act_space_n))]
+
+        p = p_func(own_obs_ph, int(act_pdtype.param_shape()[0]), scope="p_func", num_units=num_units)
+        p_func_vars = tf_util.scope_vars(tf_util.absolute_scope_name("p_func"))
+
+        # Wrap parameters in distribution
+        act_pd = act_pdtype.pdfromflat(p)
+
+        act_sample = act_pd.sample()
+        p_reg = tf.reduce_mean(tf.square(act_pd.flatparam()))
+
+        # Each row replaces the action of its own member with the policy's action
+        act_input_n = act_ph_n + []
+        for member, index in enumerate(group_indices):
+            mask = tf.cast(tf.equal(ids_ph, member), tf.float32)[:, None]
+            act_input_n[index] = mask * act_sample + (1.0 - mask) * act_ph_n[index]
+        q_input = tf.concat(obs_ph_n + act_input_n, 1)
+        if local_q_func:
+            q_input = tf.concat([own_obs_ph, act_sample], 1)
+        q = q_func(q_input, 1, scope="q_func", reuse=True, num_units=num_units)[:, 0]
+        pg_loss = -tf.reduce_mean(q)
+
+        loss = pg_loss + p_reg * 1e-3
+
+        optimize_expr = tf_util.minimize_and_clip(optimizer, loss, p_func_vars, grad_norm_clipping)
+
+        # Target network
+        target_p = p_func(own_obs_ph, int(act_pdtype.param_shape()[0]), scope="target_p_func", num_units=num_units)
+        target_p_func_vars = tf_util.scope_vars(tf_util.absolute_scope_name("target_p_func"))
+        update_target_p = make_update_exp(p_func_vars, target_p_func_vars, optimize_expr, tau, hard_update_interval)
+
+        target_act_sample = act_pdtype.pdfromflat(target_p).sample()
+
+        # Create callable functions
+        train = tf_util.function(inputs=obs_ph_n + act_ph_n + [own_obs_ph, ids_ph], outputs=loss,
+                                 updates=[update_target_p])
+        act = tf_util.function(inputs=[own_obs_ph, ids_ph], outputs=act_sample)
+        p_values = tf_util.function([own_obs_ph, ids_ph], p)
+        target_act = tf_util.function(inputs=[own_obs_ph, ids_ph], outputs=target_act_sample)
+
+        return act, train, {'p_values': p_values, 'target_act': target_act}
+
+
+def shared_q_train(make_obs_ph_n, act_space_n, own_obs_ph, own_act_ph, ids_ph, q_func, optimizer,
+                   grad_norm_clipping=None, local_q_func=False, num_units=64, tau=1e-2, hard_update_interval=0,
+                   scope="trainer", reuse=None):
+    """
+    Q-Learning of a shared critic, the Q-value of every row being that of the member given by its id
+
+    Args:
+        make_obs_ph_n (tf.placeholder): Placeholder for the observation space of all agents
+        act_space_n (list): A list of the action spaces for all agents
+        own_obs_ph (tf.placeholder): Observation of the member of every row, used by the local q function
+        own_act_ph (tf.placeholder): Action of the member of every row, used by the local q function
+        ids_ph (tf.placeholder): Member id of every row
+        q_func (function): MLP Neural Network model conditioned on the member id, see embedded_model()
+        optimizer (function): Network Optimizer function
+        grad_norm_clipping (float): Value by which to clip the norm of the gradient
+        local_q_func (boolean): Flag for using local q function
+        num_units (int): The number outputs for the layers of the model
+        tau (float): Polyak averaging rate of the target network
+        hard_update_interval (int): Copy the target network every this many steps instead, 0 to average
+        scope (str): The name of the scope
+        reuse (boolean): Flag specifying whether to reuse the scope
+
+    Returns:
+        train (function): Training function for Q network, also updating the target Q network
+        q_debug (dict): Contains 'q_values' and 'target_q_values' of the Q network
+    """
+    with tf.variable_scope(scope, reuse=reuse):
+        # Create distribtuions
+        act_pdtype_n = [make_pdtype(act_space) for act_space in act_space_n]
+
+        # Set up placeholders
+        obs_ph_n = make_obs_ph_n
+        act_ph_n = [act_pdtype_n[i].sample_placeholder([None], name="action"+str(i)) for i in range(len(act_space_n))]
+        target_ph = tf.placeholder(tf.float32, [None], name="target")
+
+        q_input = tf.concat(obs_ph_n + act_ph_n, 1)
+        if local_q_func:
+            q_input = tf.concat([own_obs_ph, own_act_ph], 1)
+        q = q_func(q_input, 1, scope="q_func", num_units=num_units)[:, 0]
+        q_func_vars = tf_util.scope_vars(tf_util.absolute_scope_name("q_func"))
+
+        loss = tf.reduce_mean(tf.square(q - target_ph))
+
+        optimize_expr = tf_util.minimize_and_clip(optimizer, loss, q_func_vars, grad_norm_clipping)
+
+        # Target network
+        target_q = q_func(q_input, 1, scope="target_q_func", num_units=num_units)[:, 0]
+        target_q_func_vars = tf_util.scope_vars(tf_util.absolute_scope_name("target_q_func"))
+        update_target_q = make_update_exp(q_func_vars, target_q_func_vars, optimize_expr, tau, hard_update_interval)
+
+        # Create callable functions
+        inputs = obs_ph_n + act_ph_n + [own_obs_ph, own_act_ph, ids_ph]
+        train = tf_util.function(inputs=inputs + [target_ph], outputs=loss, updates=[update_target_q])
+        q_values = tf_util.function(inputs, q)
+        target_q_values = tf_util.function(inputs, target_q)
+
+        return train, {'q_values': q_values, 'target_q_values': target_q_values}
+
+
+class SharedMADDPGGroup(object):
+    """
+    Shared actor and critic of a group of homogeneous agents, trained with MADDPG
+    """
+    def __init__(self, name, model, obs_shape_n, act_space_n, agent_indices, args, local_q_func=False):
+        """
+        Args:
+            name (str): Name of the group, the scope of its networks
+            model (function): MLP Neural Network model for the agents.
+            obs_shape_n (list): List with the shape of the observation space of each agent
+            act_space_n (list): A list of the action spaces for all agents
+            agent_indices (list): Agent index numbers of the members of the group, the member ids being their
+                                  positions in this list
+            args (argparse.Namespace): Parsed commandline arguments object
+            local_q_func (boolean): Flag for using local q function
+
+        Raises:
+            ValueError: When the agents have different observation shapes or action spaces
+        """
+        first = agent_indices[0]
+        for i in agent_indices:
+            if tuple(obs_shape_n[i]) != tuple(obs_shape_n[first]) or act_space_n[i] != act_space_n[first]:
+                raise ValueError("Agents {} and {} are not homogeneous, they cannot share parameters".format(first, i))
+
+        self.name = name
+        self.n = len(obs_shape_n)
+        self.agent_indices = list(agent_indices)
+        self.members = {index: member for member, index in enumerate(self.agent_indices)}
+        self.args = args
+
+        # Set up observation space placeholder
+        obs_ph_n = []
+        for i in range(self.n):
+            obs_ph_n.append(tf_util.BatchInput(obs_shape_n[i], name="observation" + str(i)).get())
+
+        # Member id, observation and action of the member every row belongs to
+        ids_ph = tf.placeholder(tf.int32, [None], name="agent_id")
+        own_obs_ph = tf_util.BatchInput(obs_shape_n[first], name="own_observation").get()
+        own_act_ph = make_pdtype(act_space_n[first]).sample_placeholder([None], name="own_action")
+
+        model = embedded_model(model, ids_ph, len(self.agent_indices), args.agent_embedding_dim)
+
+        # Create all the functions necessary to train the model
+        self.q_train, self.q_debug = shared_q_train(
+            scope=self.name,
+            make_obs_ph_n=obs_ph_n,
+            act_space_n=act_space_n,
+            own_obs_ph=own_obs_ph,
+            own_act_ph=own_act_ph,
+            ids_ph=ids_ph,
+            q_func=model,
+            optimizer=tf.train.AdamOptimizer(learning_rate=args.lr),
+            grad_norm_clipping=0.5,
+            local_q_func=local_q_func,
+            num_units=args.num_units,
+            tau=args.tau,
+            hard_update_interval=args.target_update_interval
+        )
+        self.act, self.p_train, self.p_debug = shared_p_train(
+            scope=self.name,
+            make_obs_ph_n=obs_ph_n,
+            act_space_n=act_space_n,
+            group_indices=self.agent_indices,
+            own_obs_ph=own_obs_ph,
+            ids_ph=ids_ph,
+            p_func=model,
+            q_func=model,
+            optimizer=tf.train.AdamOptimizer(learning_rate=args.lr),
+            grad_norm_clipping=0.5,
+            local_q_func=local_q_func,
+            num_units=args.num_units,
+            tau=args.tau,
+            hard_update_interval=args.target_update_interval
+        )
+
+        self.schedule = UpdateSchedule.from_args(args, warmup=30)
+
+        # One trainer per member, sharing the networks
+        self.trainers = [SharedMADDPGAgentTrainer('agent_{}'.format(i), self, i) for i in self.agent_indices]
+
+    @profiler.profile('update')
+    def update(self, agents, steps):
+        """
+        Update the shared networks with one batched step over the samples of all members
+
+        A batch of args.batch_size joint transitions is sampled from every member's replay buffer, taking
+        every agent's observation and action at the same steps, and the batches are stacked.
+
+        Args:
+            agents (list): List of trainers of all agents
+            steps (int): Current training step
+
+        Returns:
+            (list) Training loss for the group
+                   [q_loss, p_loss, mean_target_q, mean_reward, mean_target_q_next, std_target_q]
+        """
+        # Replay buffer is not large enough or not an update step
+        if not self.schedule.ready(self.trainers[0].replay_buffer, steps):
+            return
+
+        # Collect replay samples of every member
+        batch_size = self.args.batch_size
+        obs_n = [[] for _ in range(self.n)]
+        act_n = [[] for _ in range(self.n)]
+        obs_next_n = [[] for _ in range(self.n)]
+        own_obs, own_act, own_obs_next, ids, rew, done, discount = [], [], [], [], [], [], []
+        for member, index in enumerate(self.agent_indices):
+            replay_buffer = agents[index].replay_buffer
+            sample_index = np.asarray(replay_buffer.make_index(batch_size))
+            samples = [agents[i].replay_buffer.sample_index(sample_index) for i in range(self.n)]
+            member_rew, member_done = samples[index][2], samples[index][4]
+            member_discount = np.full(batch_size, self.args.gamma)
+            next_obs = [sample[3] for sample in samples]
+
+            # N-step returns, every agent's next observation is taken the same number of steps ahead
+            if self.args.n_step > 1:
+                member_rew, bootstrap_index, member_done, member_discount = replay_buffer.sample_n_step(
+                    sample_index, self.args.n_step, self.args.gamma)
+                next_obs = [agents[i].replay_buffer.sample_index(
+                    np.minimum(bootstrap_index, len(agents[i].replay_buffer) - 1))[3] for i in range(self.n)]
+
+            for i in range(self.n):
+                obs_n[i].append(samples[i][0])
+                act_n[i].append(samples[i][1])
+                obs_next_n[i].append(next_obs[i])
+            own_obs.append(samples[index][0])
+            own_act.append(samples[index][1])
+            own_obs_next.append(next_obs[index])
+            ids.append(np.full(batch_size, member, dtype=np.int32))
+            rew.append(member_rew)
+            done.append(member_done)
+            discount.append(member_discount)
+
+        # Stack the members' batches
+        obs_n = [np.concatenate(obs) for obs in obs_n]
+        act_n = [np.concatenate(act) for act in act_n]
+        obs_next_n = [np.concatenate(obs_next) for obs_next in obs_next_n]
+        own_obs, own_act, own_obs_next = np.concatenate(own_obs), np.concatenate(own_act), np.concatenate(own_obs_next)
+        ids, rew, done, discount = np.concatenate(ids), np.concatenate(rew), np.concatenate(done), np.concatenate(discount)
+
+        # Train Q Network
+        target_act_next_n = [agents[i].p_debug['target_act'](obs_next_n[i]) for i in range(self.n)]
+        own_target_act_next = self.p_debug['target_act'](own_obs_next, ids)
+        target_q_next = self.q_debug['target_q_values'](*(obs_next_n + target_act_next_n +
+                                                          [own_obs_next, own_target_act_next, ids]))
+        target_q = rew + discount * (1.0 - done) * target_q_next
+
+        # Train Q and P Networks, reusing the batch's feed dicts for every gradient step
+        # Each training step also updates its target network
+        q_feed = self.q_train.feed_dict(*(obs_n + act_n + [own_obs, own_act, ids, target_q]))
+        p_feed = self.p_train.feed_dict(*(obs_n + act_n + [own_obs, ids]))
+        for _ in range(self.schedule.gradient_steps):
+            with profiler.timer('q_train'):
+                q_loss = self.q_train.run(q_feed)
+            with profiler.timer('p_train'):
+                p_loss = self.p_train.run(p_feed)
+
+        return [q_loss, p_loss, np.mean(target_q), np.mean(rew), np.mean(target_q_next), np.std(target_q)]
+
+
+class SharedMADDPGAgentTrainer(AgentTrainer):
+    """
+    Agent Trainer of a member of a SharedMADDPGGroup
+    """
+    def __init__(self, name, group, agent_index):
+        """
+        Args:
+            name (str): Name of the agent
+            group (SharedMADDPGGroup): Group sharing its networks with the agent
+            agent_index (int): Agent index number
+        """
+        self.name = name
+        self.group = group
+        self.n = group.n
+        self.agent_index = agent_index
+        self.member = group.members[agent_index]
+        self.args = group.args
+
+        # Networks of the group conditioned on this agent's id, as in MADDPGAgentTrainer
+        self.p_debug = {'p_values': self._p_values, 'target_act': self._target_act}
+
+        # Create experience buffer
+        self.replay_buffer = ReplayBuffer(int(1e6))
+        self.schedule = group.schedule
+        self.max_replay_buffer_len = self.schedule.warmup
+        self.replay_sample_index = None
+
+    def _ids(self, obs):
+        return np.full(len(obs), self.member, dtype=np.int32)
+
+    def _p_values(self, obs):
+        return self.group.p_debug['p_values'](obs, self._ids(obs))
+
+    def _target_act(self, obs):
+        return self.group.p_debug['target_act'](obs, self._ids(obs))
+
+    @profiler.profile('action')
+    def action(self, obs):
+        """
+        Retrieves action for agent from the shared P network given the observations
+
+        Args:
+            obs (np.array): Observations of the world for an agent
+
+        Returns:
+            Action for an agent
+        """
+        return self.group.act(obs[None], self._ids(obs[None]))[0]
+
+    def experience(self, obs, act, rew, new_obs, done, terminal):
+        """
+        Store transition in the replay buffer.
+
+        Args:
+            obs (np.array): Observations of the world for an agent
+            act (list): Action for an agent
+            rew (float): Reward for an agent
+            new_obs (np.array): New observations of the world for an agent
+            done (): Done for an agent
+            terminal (boolean): Flag for whether the final episode has been reached.
+        """
+        self.replay_buffer.add(obs, act, rew, new_obs, float(done))
+
+    def preupdate(self):
+        """
+        Reset replay_sample_index to None.
+        """
+        self.replay_sample_index = None
+
+    def update(self, agents, steps):
+        """
+        Update the group's networks, the first member runs the batched update of the whole group
+
+        Args:
+            agents (list): List of trainers of all agents
+            steps (int): Current training step
+
+        Returns:
+            (list) Training loss for the group, None for the other members
+                   [q_loss, p_loss, mean_target_q, mean_reward, mean_target_q_next, std_target_q]
+        """
+        if self.member != 0:
+            return
+
+        return self.group.update(agents, steps)
+
+
+def make_shared_trainers(name, model, obs_shape_n, act_space_n, agent_indices, args, local_q_func=False):
+    """
+    Creates the trainers of a group of homogeneous agents sharing one actor and one critic.
+
+    Args:
+        name (str): Name of the group, the scope of its networks
+        model (function): MLP Neural Network model for the agents.
+        obs_shape_n (list): List with the shape of the observation space of each agent
+        act_space_n (list): A list of the action spaces for all agents
+        agent_indices (list): Agent index numbers of the members of the group
+        args (argparse.Namespace): Parsed commandline arguments object
+        local_q_func (boolean): Flag for using local q function
+
+    Returns:
+        (list) SharedMADDPGAgentTrainer objects, one for each member in agent_indices order
+    """
+    return SharedMADDPGGroup(name, model, obs_shape_n, act_space_n, agent_indices, args,
+                             local_q_func=local_q_func).trainers
@@ -0,0 +1,289 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+opponent_pool.py
+
+Pool of frozen opponents sharing a single actor graph
+
+Every opponent in the pool is an entry in an in-memory weight bank (flat float32 p_func weights).
+One p_func graph is built for the whole pool and the selected opponent's weights are assigned to it
+with tf_util.SetFromFlat, so the graph does not grow with the number of opponents. Opponents never
+train, so no critic, target network or optimizer is built for them.
+
+Updated and Enhanced version of OpenAI Multi-Agent Deep Deterministic Policy Gradient (MADDPG) Algorithm
+(https://github.com/openai/maddpg)
+"""
+
+from collections import OrderedDict
+
+import numpy as np
+import tensorflow as tf
+
+from maddpg.common.distributions import make_pdtype
+from maddpg.common.numpy_policy import NumpyActor
+from maddpg.common.policy_export import DEFAULT_ACTIVATIONS, PolicyExport, group_layers, policy_variables
+from maddpg.trainer.replay_buffer import ReplayBuffer
+from maddpg.trainer.trainer import AgentTrainer
+
+import maddpg.common.tf_util as tf_util
+
+__author__ = 'Rolando Fernandez'
+__copyright__ = 'Copyright 2020, Multi-Agent Deep Deterministic Policy Gradient'
+__credits__ = ['Rolando Fernandez', 'OpenAI']
+__license__ = ''
+__version__ = '0.0.1'
+__maintainer__ = 'Rolando Fernandez'
+__email__ = 'rolando.fernandez1.civ@mail.mil'
+__status__ = 'Dev'
+
+
+class OpponentPool(object):
+    """
+    Weight bank of frozen opponents with one shared actor graph.
+    """
+    def __init__(self, name, model, obs_shape, act_space, num_units=64, numpy_inference=False,
+                 activations=DEFAULT_ACTIVATIONS):
+        """
+        Args:
+            name (str): Scope of the shared actor graph
+            model (function): MLP Neural Network model used by the opponents
+            obs_shape (tuple): Shape of the opponents' observation space
+            act_space (gym.Space): Opponents' action space
+            num_units (int): The number of outputs for the fully connected layers of the model
+            numpy_inference (bool): Act with NumPy copies of the banked weights instead of the graph
+            activations (tuple): Activation of each layer of the model, used for NumPy inference
+        """
+        self.name = name
+        self.numpy_inference = numpy_inference
+        self.activations = activations
+
+        with tf.variable_scope(name):
+            act_pdtype = make_pdtype(act_space)
+            obs_ph = tf_util.BatchInput(obs_shape, name="observation").get()
+
+            p = model(obs_ph, int(act_pdtype.param_shape()[0]), scope="p_func", num_units=num_units)
+            act_sample = act_pdtype.pdfromflat(p).sample()
+
+        self._var_list = policy_variables(name)
+        self._var_names = [v.op.name[len(name + "/p_func/"):] for v in self._var_list]
+        self._shapes = [tf_util.var_shape(v) for v in self._var_list]
+        self.size = int(sum(np.prod(shape) for shape in self._shapes))
+
+        self._act = tf_util.function(inputs=[obs_ph], outputs=act_sample)
+        self._set_flat = tf_util.SetFromFlat(self._var_list)
+        self._init_op = tf.variables_initializer(self._var_list)
+
+        # Flat weights per opponent key
+        self.bank = OrderedDict()
+        self._numpy_actors = {}
+        self._opponents = {}
+        self.active = None
+
+    def __len__(self):
+        return len(self.bank)
+
+    def __contains__(self, key):
+        return key in self.bank
+
+    def keys(self):
+        return list(self.bank.keys())
+
+    def add(self, key, flat):
+        """
+        Add or replace the weights of an opponent
+
+        Args:
+            key (str): Opponent key
+            flat (numpy.array): Flat p_func weights, in the order of the pool's variables
+        """
+        flat = np.asarray(flat, dtype=np.float32).ravel()
+        assert flat.size == self.size, \
+            "Opponent {} has {} weights, the pool's actor has {}".format(key, flat.size, self.size)
+
+        self.bank[key] = flat
+        self._numpy_actors.pop(key, None)
+        if self.active == key:
+            self.active = None
+
+    def add_from_export(self, key, export, name=None):
+        """
+        Add an opponent from a policy export
+
+        Args:
+            key (str): Opponent key
+            export (str or PolicyExport): Export directory or an opened export
+            name (str): Agent scope the weights were exported from, defaults to key
+        """
+        if not isinstance(export, PolicyExport):
+            export = PolicyExport(export)
+        name = name or key
+
+        variables = export.manifest['agents'][name]['variables']
+        assert [v['shape'] for v in variables] == self._shapes, \
+            "Exported policy {} does not match the pool's actor".format(name)
+        self.add(key, export.flat(name))
+
+    def add_from_checkpoint(self, key, fname, scope=None):
+        """
+        Add an opponent from a full tf.train.Saver checkpoint, reading only its p_func variables
+
+        Args:
+            key (str): Opponent key
+            fname (str): Checkpoint prefix
+            scope (str): Agent scope in the checkpoint, defaults to key
+        """
+        scope = scope or key
+        reader = tf.train.NewCheckpointReader(fname)
+        self.add(key, np.concatenate([reader.get_tensor(scope + "/p_func/" + var_name).ravel()
+                                      for var_name in self._var_names]))
+
+    def add_from_trainer(self, key, trainer, sess=None):
+        """
+        Snapshot the current p_func weights of a live trainer, e.g. to add a historical opponent
+
+        Args:
+            key (str): Opponent key
+            trainer (maddpg.trainer.maddpg.MADDPGAgentTrainer): Trainer to snapshot
+            sess (tf.Session): Session to read variables from, defaults to the current session
+        """
+        sess = sess or tf_util.get_session()
+        self.add(key, np.concatenate([value.ravel() for value in sess.run(policy_variables(trainer.name))]))
+
+    def add_random(self, key, sess=None):
+        """
+        Add an opponent with freshly initialized weights
+
+        Args:
+            key (str): Opponent key
+            sess (tf.Session): Session to run the initializer in, defaults to the current session
+        """
+        sess = sess or tf_util.get_session()
+        sess.run(self._init_op)
+        self.active = None
+        self.add(key, np.concatenate([value.ravel() for value in sess.run(self._var_list)]))
+
+    def activate(self, key):
+        """
+        Assign an opponent's weights to the shared actor graph, if not already active
+
+        Args:
+            key (str): Opponent key
+        """
+        if self.active != key:
+            self._set_flat(self.bank[key])
+            self.active = key
+
+    def numpy_actor(self, key):
+        """
+        NumPy copy of an opponent's policy, built once per key
+
+        Args:
+            key (str): Opponent key
+
+        Returns:
+            (maddpg.common.numpy_policy.NumpyActor) Actor with the banked weights
+        """
+        if key not in self._numpy_actors:
+            arrays = []
+            offset = 0
+            for var_name, shape in zip(self._var_names, self._shapes):
+                size = int(np.prod(shape))
+                arrays.append((var_name, self.bank[key][offset:offset + size].reshape(shape)))
+                offset += size
+            self._numpy_actors[key] = NumpyActor(group_layers(arrays, self.activations))
+
+        return self._numpy_actors[key]
+
+    def act(self, key, obs):
+        """
+        Sampled actions of an opponent
+
+        Args:
+            key (str): Opponent key
+            obs (numpy.array): Observations, shape [B, obs_dim]
+
+        Returns:
+            (numpy.array) Actions, shape [B, act_dim]
+        """
+        if self.numpy_inference:
+            return self.numpy_actor(key)(obs)
+
+        self.activate(key)
+        return self._act(obs)
+
+    def opponent(self, key, agent_index):
+        """
+        Trainer-like handle of an opponent, usable in place of a MADDPGAgentTrainer
+
+        Args:
+            key (str): Opponent key
+            agent_index (int): Index of the opponent in the environment
+
+        Returns:
+            (PoolOpponent) Opponent handle, created once per key
+        """
+        if key not in self._opponents:
+            self._opponents[key] = PoolOpponent(self, key, agent_index)
+
+        return self._opponents[key]
+
+
+class PoolOpponent(AgentTrainer):
+    """
+    Frozen opponent acting through an OpponentPool.
+
+    Keeps its own replay buffer so training agents can sample it in their critic update.
+    The opponent does not train, so its target policy is its policy.
+    """
+    def __init__(self, pool, key, agent_index):
+        """
+        Args:
+            pool (OpponentPool): Pool holding the opponent's weights
+            key (str): Opponent key in the pool
+            agent_index (int): Index of the opponent in the environment
+        """
+        self.pool = pool
+        self.name = key
+        self.agent_index = agent_index
+
+        self.replay_buffer = ReplayBuffer(int(1e6))
+        self.p_debug = {'target_act': self.act}
+
+    def act(self, obs):
+        return self.pool.act(self.name, obs)
+
+    def numpy_actor(self):
+        return self.pool.numpy_actor(self.name)
+
+    def action(self, obs):
+        """
+        Retrieves action for the opponent given the observations
+
+        Args:
+            obs (np.array): Observations of the world for an agent
+
+        Returns:
+            Action for an agent
+        """
+        return self.act(obs[None])[0]
+
+    def experience(self, obs, act, rew, new_obs, done, terminal):
+        """
+        Store transition in the replay buffer.
+
+        Args:
+            obs (np.array): Observations of the world for an agent
+            act (list): Action for an agent
+            rew (float): Reward for an agent
+            new_obs (np.array): New observations of the world for an agent
+            done (): Done for an agent
+            terminal (boolean): Flag for whether the final episode has been reached.
+        """
+        self.replay_buffer.add(obs, act, rew, new_obs, float(done))
+
+    def preupdate(self):
+        pass
+
+    def update(self, agents, steps):
+        return None
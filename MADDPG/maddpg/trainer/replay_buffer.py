@@ -13,6 +13,8 @@ from collections import deque
 import numpy as np
 import random
 
+import maddpg.common.profiler as profiler
+
 __author__ = 'Rolando Fernandez'
 __copyright__ = 'Copyright 2020, Multi-Agent Deep Deterministic Policy Gradient'
 __credits__ = ['Rolando Fernandez', 'OpenAI']
@@ -23,6 +25,46 @@ __email__ = 'rolando.fernandez1.civ@mail.mil'
 __status__ = 'Dev'
 
 
+def discount_with_dones(rewards, dones, gamma):
+    """
+    Discounts agent rewards with dones from scenario dones funtion.
+
+    Equivalent to the reverse recursion r_t = (reward_t + gamma * r_t+1) * (1 - done_t), computed with
+    cumulative sums within the segments separated by dones. Intended for episode length sequences,
+    gamma ** -len(rewards) must be representable.
+
+    Args:
+        rewards (list): Rewards for all agents
+        dones (list): Dones for all agents
+        gamma (float): Scalar for reward
+
+    Returns:
+         Discounted rewards
+    """
+    rewards = np.asarray(rewards, dtype=np.float64)
+    dones = np.asarray(dones, dtype=np.float64)
+    if rewards.size == 0:
+        return []
+
+    # Scaled rewards, a done zeroes its own step and stops everything after it from reaching earlier steps
+    alive = 1.0 - dones
+    powers = gamma ** np.arange(rewards.size, dtype=np.float64)
+    scaled = rewards * alive * powers
+
+    # Reverse cumulative sum, minus what lies beyond the first done at or after each step
+    tail = np.cumsum(scaled[::-1])[::-1]
+    tail = np.append(tail, 0.0)
+    done_idx = np.flatnonzero(dones)
+    next_done = np.full(rewards.size, rewards.size)
+    if done_idx.size > 0:
+        pos = np.searchsorted(done_idx, np.arange(rewards.size))
+        has_done = pos < done_idx.size
+        next_done[has_done] = done_idx[pos[has_done]]
+    discounted = (tail[:-1] - tail[next_done]) / powers * alive
+
+    return list(discounted)
+
+
 class ReplayBuffer(object):
     def __init__(self, size):
         """
@@ -34,10 +76,78 @@ class ReplayBuffer(object):
         """
         # self._storage = []
         self._storage = deque([])
-        self._count = deque([])
         self._maxsize = int(size)
         self._next_idx = 0
 
+        self._init_scalars()
+
+    def _init_scalars(self):
+        """
+        Rewards, dones and episode ends mirrored in ring arrays for vectorized n-step returns, and the
+        episode start index used by make_episode_index.
+
+        The arrays grow by doubling until they hold the storage's maximum length, then wrap around.
+        Logical index i, as used by make_index, lives at (self._start + i) % len(self._rewards).
+
+        Episode starts are kept as transition counts (self._next_idx at add time) in
+        self._episode_starts[self._episode_head:self._episode_tail], oldest first.
+        """
+        self._start = 0
+        self._rewards = np.zeros(min(1024, self._maxsize + 1))
+        self._dones = np.zeros(self._rewards.shape, dtype=bool)
+        self._ends = np.zeros(self._rewards.shape, dtype=bool)
+        self._last_obs_tp1 = None
+        self._last_done = False
+
+        self._episode_starts = np.zeros(1024, dtype=np.int64)
+        self._episode_head = 0
+        self._episode_tail = 0
+
+    def _physical(self, idxes):
+        return (self._start + np.asarray(idxes)) % self._rewards.shape[0]
+
+    def _add_episode_start(self, count):
+        if self._episode_tail == self._episode_starts.shape[0]:
+            # Compact the live starts to the front, growing only if more than half are live
+            live = self._episode_starts[self._episode_head:self._episode_tail]
+            if 2 * live.shape[0] > self._episode_starts.shape[0]:
+                self._episode_starts = np.zeros(2 * self._episode_starts.shape[0], dtype=np.int64)
+            self._episode_starts[:live.shape[0]] = live
+            self._episode_head, self._episode_tail = 0, live.shape[0]
+
+        self._episode_starts[self._episode_tail] = count
+        self._episode_tail += 1
+
+    def _add_scalars(self, obs_t, reward, obs_tp1, done, popped):
+        # A transition not starting where the previous one ended closes the previous episode
+        new_episode = self._last_obs_tp1 is None or self._last_done
+        if self._last_obs_tp1 is not None and not np.array_equal(obs_t, self._last_obs_tp1):
+            self._ends[self._physical(len(self._storage) - 2 + popped)] = True
+            new_episode = True
+        self._last_obs_tp1 = obs_tp1
+        self._last_done = bool(done)
+
+        if new_episode:
+            self._add_episode_start(self._next_idx)
+
+        # Drop episodes whose first transition has left the buffer
+        oldest = self._next_idx + 1 - len(self._storage)
+        while self._episode_head < self._episode_tail and self._episode_starts[self._episode_head] < oldest:
+            self._episode_head += 1
+
+        if popped:
+            self._start = (self._start + 1) % self._rewards.shape[0]
+        elif len(self._storage) > self._rewards.shape[0]:
+            capacity = min(2 * self._rewards.shape[0], self._maxsize + 1)
+            self._rewards = np.concatenate([self._rewards, np.zeros(capacity - self._rewards.shape[0])])
+            self._dones = np.concatenate([self._dones, np.zeros(capacity - self._dones.shape[0], dtype=bool)])
+            self._ends = np.concatenate([self._ends, np.zeros(capacity - self._ends.shape[0], dtype=bool)])
+
+        i = self._physical(len(self._storage) - 1)
+        self._rewards[i] = reward
+        self._dones[i] = bool(done)
+        self._ends[i] = False
+
     def __len__(self):
         """
         Compute the length of the replay buffer object
@@ -53,9 +163,10 @@ class ReplayBuffer(object):
         """
         # self._storage = []
         self._storage = deque([])
-        self._count = deque([])
         self._next_idx = 0
+        self._init_scalars()
 
+    @profiler.profile('replay/add')
     def add(self, obs_t, action, reward, obs_tp1, done):
         """
         Add a transition data element to replay buffer
@@ -80,14 +191,14 @@ class ReplayBuffer(object):
         data = (obs_t, action, reward, obs_tp1, done)
 
         if self._maxsize >= len(self._storage):
-            self._count.append(self._next_idx)
             self._storage.append(data)
+            popped = False
         else:
-            self._count.append(self._next_idx)
-            self._count.popleft()
-
             self._storage.append(data)
             self._storage.popleft()
+            popped = True
+
+        self._add_scalars(obs_t, reward, obs_tp1, done, popped)
 
         self._next_idx += 1
 
@@ -206,32 +317,71 @@ class ReplayBuffer(object):
         np.random.shuffle(idx)
         return idx
 
+    def episode_bounds(self, episodes=None):
+        """
+        Start and end (exclusive) indexes of complete episodes in the buffer, oldest first.
+
+        An episode ends at a done or when the next transition does not continue it, so episodes
+        cut short by a done have their own length. The episode still being collected is excluded.
+
+        Args:
+            episodes (np.array): Positions of the episodes to return, defaults to all of them
+
+        Returns:
+            (tuple) (np.array(starts), np.array(ends))
+        """
+        oldest = self._next_idx - len(self._storage)
+        if episodes is None:
+            episodes = np.arange(self.num_episodes())
+        episodes = self._episode_head + np.asarray(episodes, dtype=np.int64)
+
+        return self._episode_starts[episodes] - oldest, self._episode_starts[episodes + 1] - oldest
+
+    def num_episodes(self):
+        """
+        Returns:
+            (int) Number of complete episodes in the buffer
+        """
+        return max(self._episode_tail - self._episode_head - 1, 0)
+
     def make_episode_index(self, batch_ep_size, ep_len, shuffle=True):
         """
-        Create lists of (n) random indexes and (m) random indexes, where n = batch_ep_size and m = ep_len
+        Create lists of indexes for (n) episodes of (m) transitions, where n = batch_ep_size and m = ep_len
+
+        Episodes are looked up in the episode start index maintained by add, so only the sampled
+        episodes are visited. Episodes shorter than ep_len, i.e. ended early by a done, are skipped.
 
         Args:
-            batch_ep_size (int):
-            ep_len (int):
-            shuffle (boolean): Flag for whether to shuffle indexes
+            batch_ep_size (int): Number of episodes to sample
+            ep_len (int): Number of transitions taken from the start of each episode
+            shuffle (boolean): Flag for whether to sample random episodes and shuffle indexes, otherwise
+                               the latest episodes are used
 
         Returns:
-            (tuple) Random shuffled list of (n) indices and (n) ccm episode indices
+            (tuple) Random shuffled list of (n * m) indices and (n) ccm episode indices
                     (idx, ep_idx)
 
         """
-        ep_start_locs = [i for i, x in enumerate(self._count) if x % ep_len == 0][0:-1]
-        eps = [x for x in range(len(ep_start_locs))][::-1]
+        num_episodes = self.num_episodes()
 
+        eps = []
         if shuffle:
-            np.random.shuffle(eps)
-        eps = eps[0:batch_ep_size]
-        eps = [ep_start_locs[x] for x in eps]
-
-        # eps = [ep_start_locs[random.randint(0,len(ep_start_locs)-1)] for _ in range(batch_ep_size)]
-        # np.random.shuffle(eps)
-        # temp = int(len(ep_start_locs)/2)
-        # eps = ep_start_locs[temp:temp+batch_ep_size]
+            # Draw a few extra candidates in case some episodes are too short
+            candidates = random.sample(range(num_episodes), min(num_episodes, 2 * batch_ep_size))
+            starts, ends = self.episode_bounds(candidates)
+            eps = [start for start, end in zip(starts, ends) if end - start >= ep_len][:batch_ep_size]
+            if len(eps) < batch_ep_size and len(candidates) < num_episodes:
+                starts, ends = self.episode_bounds(np.random.permutation(num_episodes))
+                eps = list(starts[ends - starts >= ep_len][:batch_ep_size])
+        else:
+            # Latest episodes first
+            position = num_episodes - 1
+            while len(eps) < batch_ep_size and position >= 0:
+                count = min(position + 1, 2 * batch_ep_size)
+                starts, ends = self.episode_bounds(np.arange(position, position - count, -1))
+                eps += list(starts[ends - starts >= ep_len][:batch_ep_size - len(eps)])
+                position -= count
+
         idx = [x for ep in eps for x in range(ep, ep + ep_len)]
 
         if shuffle:
@@ -240,6 +390,7 @@ class ReplayBuffer(object):
 
         return idx, ep_idx
 
+    @profiler.profile('replay/sample')
     def sample_index(self, idxes, history=0):
         """
         Sample experiences for the given indices.
@@ -255,6 +406,47 @@ class ReplayBuffer(object):
         """
         return self._encode_sample(idxes)
 
+    @profiler.profile('replay/sample')
+    def sample_n_step(self, idxes, n_step, gamma):
+        """
+        Discounted n-step returns for the given indices.
+
+        Returns are accumulated over at most n_step transitions and stop early at a done, at the
+        end of an episode (the next stored transition does not continue it) or at the newest
+        transition. The critic target is then
+            returns + discounts * (1 - dones) * Q_target(next observation at bootstrap index)
+
+        Args:
+            idxes (list): List of transition indexes
+            n_step (int): Maximum number of rewards to accumulate
+            gamma (float): Discount factor
+
+        Returns:
+            (tuple) (np.array(returns), np.array(bootstrap_indexes), np.array(bootstrap_dones),
+                    np.array(bootstrap_discounts))
+        """
+        last = len(self._storage) - 1
+        idxes = np.minimum(np.asarray(idxes, dtype=np.int64), last)
+
+        # Logical positions of the next n_step transitions of each index, shape [B, n_step]
+        positions = np.minimum(idxes[:, None] + np.arange(n_step)[None, :], last)
+        physical = self._physical(positions)
+        rewards = self._rewards[physical]
+        dones = self._dones[physical]
+        stops = dones | self._ends[physical] | (positions == last)
+
+        # Step k is included while none of the steps before it stopped the return
+        included = np.ones(positions.shape, dtype=bool)
+        included[:, 1:] = np.cumprod(~stops[:, :-1], axis=1).astype(bool)
+
+        returns = np.sum(rewards * included * (gamma ** np.arange(n_step))[None, :], axis=1)
+        num_steps = np.sum(included, axis=1)
+        bootstrap = idxes + num_steps - 1
+        bootstrap_dones = dones[np.arange(len(idxes)), num_steps - 1].astype(np.float64)
+
+        return returns, bootstrap, bootstrap_dones, gamma ** num_steps
+
+    @profiler.profile('replay/sample')
     def sample(self, batch_size):
         """
         Sample a batch of experiences.
@@ -20,6 +20,55 @@ __email__ = 'rolando.fernandez1.civ@mail.mil'
 __status__ = 'Dev'
 
 
+class UpdateSchedule(object):
+    """
+    When and how often a trainer updates its networks.
+
+    Updates start once the replay buffer holds warmup transitions and then happen every
+    train_freq training steps, each taking gradient_steps optimizer steps on one sampled batch.
+    """
+    def __init__(self, train_freq=100, gradient_steps=1, warmup=30):
+        """
+        Args:
+            train_freq (int): Number of training steps between updates
+            gradient_steps (int): Number of gradient steps taken on each sampled batch
+            warmup (int): Minimum number of transitions in the replay buffer before updating
+        """
+        assert train_freq > 0 and gradient_steps > 0, "train_freq and gradient_steps must be positive"
+
+        self.train_freq = train_freq
+        self.gradient_steps = gradient_steps
+        self.warmup = warmup
+
+    @classmethod
+    def from_args(cls, args, warmup):
+        """
+        Args:
+            args (argparse.Namespace): Parsed commandline arguments object
+            warmup (int): Warmup used when args.warmup is not set
+        """
+        return cls(train_freq=args.train_freq, gradient_steps=args.gradient_steps,
+                   warmup=warmup if args.warmup is None else args.warmup)
+
+    def warm(self, replay_buffer):
+        """
+        Returns:
+            (bool) True if the replay buffer holds enough transitions to update
+        """
+        return len(replay_buffer) >= self.warmup
+
+    def ready(self, replay_buffer, steps):
+        """
+        Args:
+            replay_buffer (maddpg.trainer.replay_buffer.ReplayBuffer): Trainer's replay buffer
+            steps (int): Current training step
+
+        Returns:
+            (bool) True if the trainer should update at this step
+        """
+        return self.warm(replay_buffer) and steps % self.train_freq == 0
+
+
 class AgentTrainer(object):
     """
     Defines the base AgentTrainer object.
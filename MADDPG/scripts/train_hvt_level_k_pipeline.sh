@@ -0,0 +1,31 @@
+#!/bin/sh
+max_level=4
+training_role=attacker
+exp_name=maddpg_hvt_1v1
+scenario=converge/simple_hvt_1v1_model17
+total_episodes=150000
+save_rate=1000
+opponent_refresh=1000
+episode_len=50
+num_adversaries=1
+pred_policy=maddpg
+prey_policy=maddpg
+save_dir=/tmp/level_k_pipeline/
+
+python ../experiments/train_level_k_pipeline.py \
+--max-level $max_level \
+--training-role $training_role \
+--exp-name $exp_name \
+--save-dir $save_dir \
+--opponent-refresh $opponent_refresh \
+--scenario $scenario \
+--done-callback \
+--good-policy $prey_policy \
+--adv-policy $pred_policy \
+--num-adversaries $num_adversaries \
+--num-episodes $total_episodes \
+--max-episode-len $episode_len \
+--save-rate $save_rate \
+
+
+echo Finished...
@@ -10,8 +10,12 @@ Updated and Enhanced version of OpenAI Multi-Agent Particle Environment
 (https://github.com/openai/multiagent-particle-envs)
 """
 
+from collections import namedtuple
+
 import numpy as np
 
+from multiagent_particle_env import physics
+
 __author__ = 'Rolando Fernandez'
 __copyright__ = 'Copyright 2020, Multi-Agent Particle Environment'
 __credits__ = ['Rolando Fernandez', 'OpenAI']
@@ -21,24 +25,129 @@ __maintainer__ = 'Rolando Fernandez'
 __email__ = 'rolando.fernandez1.civ@mail.mil'
 __status__ = 'Dev'
 
+# World attributes holding lists of entities
+ENTITY_LISTS = ('agents', 'food', 'forests', 'landmarks', 'stationary_agents')
+
+# State of a world captured by World.snapshot()
+#   data (numpy.array): Every captured state array, flattened and concatenated as float64
+#   sizes (numpy.array): Size of each captured state array in data, -1 where the state was None
+#   rng (tuple): numpy global RNG state, or None when not captured
+WorldSnapshot = namedtuple('WorldSnapshot', ['data', 'sizes', 'rng'])
+
+# Slot names of each class, including those of its base classes
+_SLOT_NAMES = {}
+
+
+def _attributes(obj):
+    """
+    Attributes of an object, stored in slots or in its __dict__
+
+    Args:
+        obj (object): Object
+
+    Returns:
+        (list) (name, value) pairs
+    """
+    cls = obj.__class__
+    names = _SLOT_NAMES.get(cls)
+    if names is None:
+        names = tuple(name for klass in cls.__mro__ for name in getattr(klass, '__slots__', ())
+                      if name not in ('__dict__', '__weakref__'))
+        _SLOT_NAMES[cls] = names
+
+    attributes = [(name, getattr(obj, name)) for name in names]
+    if hasattr(obj, '__dict__'):
+        attributes.extend(obj.__dict__.items())
+
+    return attributes
+
+
+def _shallow_copy(obj):
+    """
+    Shallow copy of an object's attributes, without the overhead of copy.copy
+
+    Args:
+        obj (object): Object to copy
+
+    Returns:
+        (object) Copy of the object
+    """
+    clone = obj.__class__.__new__(obj.__class__)
+    for key, value in _attributes(obj):
+        setattr(clone, key, value)
+
+    return clone
+
+
+def _copy_with_arrays(obj):
+    """
+    Shallow copy of an object with its numpy array attributes copied
+
+    Args:
+        obj (object): Object to copy, e.g. an EntityState or Action
+
+    Returns:
+        (object) Copy of the object
+    """
+    clone = obj.__class__.__new__(obj.__class__)
+    for key, value in _attributes(obj):
+        setattr(clone, key, value.copy() if isinstance(value, np.ndarray) else value)
+
+    return clone
+
 
 class EntityState(object):
     """
     Physical/External Base State of All Entities
+
+    Once the world has bound the state, see World.state_arrays(), p_pos and p_vel are views into rows of
+    the world's position and velocity arrays. Assigning an array of the same shape to them then copies
+    it into the row, so scenario code can keep assigning new arrays. Assigning anything else, e.g. None,
+    unbinds the state until the world binds it again.
     """
+    __slots__ = ('_p_pos', '_p_vel', '_bound')
 
     def __init__(self):
         # Physical Position (p_pos) [np.array]
-        self.p_pos = None
+        self._p_pos = None
 
         # Physical Velocity (p_vel) [np.array]
-        self.p_vel = None
+        self._p_vel = None
+
+        # p_pos and p_vel are views into World arrays
+        self._bound = False
+
+    @property
+    def p_pos(self):
+        return self._p_pos
+
+    @p_pos.setter
+    def p_pos(self, value):
+        self._p_pos = self._assign(self._p_pos, value)
+
+    @property
+    def p_vel(self):
+        return self._p_vel
+
+    @p_vel.setter
+    def p_vel(self, value):
+        self._p_vel = self._assign(self._p_vel, value)
+
+    def _assign(self, current, value):
+        if self._bound and current is not None and value is not None and np.shape(value) == current.shape:
+            if value is not current:
+                current[...] = value
+            return current
+
+        self._bound = False
+        return value
 
 
 class AgentState(EntityState):
     """
     State of Agents (Including Communication and Internal/Mental state)
     """
+    __slots__ = ('c', 'state')
 
     def __init__(self):
         super(AgentState, self).__init__()
@@ -53,6 +162,7 @@ class Action(object):
     """
     Action of the Agent
     """
+    __slots__ = ('c', 'u')
 
     def __init__(self):
         # Communication Action (c)
@@ -66,6 +176,8 @@ class Entity(object):
     """
     Properties and State of Physical World Entity
     """
+    __slots__ = ('accel', 'collide', 'color', 'density', 'has_sense', 'index', 'initial_mass', 'is_agent',
+                 'max_speed', 'movable', 'name', 'sense_region', 'size', 'state')
 
     def __init__(self):
         # Acceleration
@@ -119,6 +231,7 @@ class Landmark(Entity):
     """
     Properties of Landmark Entities
     """
+    __slots__ = ('boundary',)
 
     def __init__(self):
         super(Landmark, self).__init__()
@@ -130,6 +243,8 @@ class Agent(Entity):
     """
     Properties of agent Entities
     """
+    __slots__ = ('action', 'action_callback', 'adversary', 'blind', 'c_noise', 'counter', 'goal_a', 'goal_b',
+                 'is_fixed', 'is_fixed_policy', 'is_perturbed_policy', 'leader', 'silent', 'speaker', 'u_noise', 'u_range')
 
     def __init__(self):
         super(Agent, self).__init__()
@@ -158,6 +273,9 @@ class Agent(Entity):
         # Identify as agent
         self.is_agent = True
 
+        # Agent is fixed, set by scenarios with fixed adversaries
+        self.is_fixed = False
+
         # Agent uses fixed policy
         self.is_fixed_policy = False
 
@@ -206,6 +324,19 @@ class World(object):
         self.contact_force = 1e+2
         self.contact_margin = 1e-3
 
+        # Physics backend of step(), one of multiagent_particle_env.physics.BACKENDS
+        self.physics = 'reference'
+
+        # Continuous collision detection, enabled when max_substeps > 1. Steps are split into up to
+        # max_substeps substeps for the entities of pairs that come within reach of each other during
+        # the step, so that such a pair moves by at most ccd_resolution times its combined size per substep
+        self.ccd_resolution = 0.5
+        self.max_substeps = 1
+
+        # Pairs of entities, as (id(entity_a), id(entity_b)), that were within reach of each other at
+        # some point of the last step, see is_collision()
+        self.swept_contacts = set()
+
         # Whether agents share rewards
         self.collaborative = False
 
@@ -227,6 +358,146 @@ class World(object):
         # Logging headers
         self.log_headers = []
 
+        # Position and velocity arrays of the entities, see state_arrays()
+        self._bound_entities = None
+        self._p_pos = None
+        self._p_vel = None
+
+    def clone(self):
+        """
+        Copy of the world with its own entities, states and actions.
+
+        Much cheaper than copy.deepcopy or running a scenario's make_world again. Entity states and
+        actions are copied with their arrays, other entity attributes such as callbacks and colors
+        are shared with this world, and references between entities (e.g. goal_a) point to the copies.
+
+        Returns:
+            (multiagent_particle_env.core.World) Copy of the world
+        """
+        world = _copy_with_arrays(self)
+        world.swept_contacts = set()
+        world._bound_entities = None
+
+        clones = {}
+        for name in ENTITY_LISTS:
+            entities = []
+            for entity in getattr(self, name):
+                if id(entity) not in clones:
+                    clone = _shallow_copy(entity)
+                    clone.state = _copy_with_arrays(entity.state)
+                    clone.state._bound = False
+                    if isinstance(entity, Agent):
+                        clone.action = _copy_with_arrays(entity.action)
+                    clones[id(entity)] = clone
+                entities.append(clones[id(entity)])
+            setattr(world, name, entities)
+
+        # Point references between entities to the copies
+        for clone in clones.values():
+            for key, value in _attributes(clone):
+                if id(value) in clones:
+                    setattr(clone, key, clones[id(value)])
+
+        return world
+
+    def state_slots(self):
+        """
+        State attributes captured by snapshot(), in a fixed order.
+
+        Returns:
+            (list) (state, attribute name) pairs: p_pos and p_vel of every entity, then communication
+                   state c and perturbation state of every agent
+        """
+        slots = []
+        for entity in self.entities:
+            slots.append((entity.state, 'p_pos'))
+            slots.append((entity.state, 'p_vel'))
+        for agent in self.agents:
+            slots.append((agent.state, 'c'))
+            slots.append((agent.state, 'state'))
+
+        return slots
+
+    def snapshot(self, rng=True):
+        """
+        Capture the dynamic state of the world: entity positions and velocities, agent communication
+        and perturbation states and, optionally, the numpy global RNG state.
+
+        Args:
+            rng (boolean): Whether to capture the numpy global RNG state
+
+        Returns:
+            (WorldSnapshot) Snapshot to pass to restore()
+        """
+        values = [getattr(state, name) for state, name in self.state_slots()]
+        sizes = np.array([-1 if value is None else np.size(value) for value in values])
+        arrays = [np.ravel(value) for value in values if value is not None]
+        data = np.concatenate(arrays).astype(np.float64) if arrays else np.zeros(0)
+
+        return WorldSnapshot(data, sizes, np.random.get_state() if rng else None)
+
+    def restore(self, snapshot):
+        """
+        Restore a state captured by snapshot() on this world, or on a clone of it.
+
+        Existing state arrays of the right size are overwritten in place, so references to them stay
+        valid. The RNG state is restored when the snapshot holds one.
+
+        Args:
+            snapshot (WorldSnapshot): Snapshot from snapshot()
+        """
+        slots = self.state_slots()
+        assert len(slots) == len(snapshot.sizes), "Snapshot was taken from a world with other entities"
+
+        offset = 0
+        for (state, name), size in zip(slots, snapshot.sizes):
+            if size < 0:
+                setattr(state, name, None)
+                continue
+
+            values = snapshot.data[offset:offset + size]
+            offset += size
+            current = getattr(state, name)
+            if isinstance(current, np.ndarray) and current.size == size:
+                current[...] = values.reshape(current.shape)
+            else:
+                setattr(state, name, values.copy())
+
+        if snapshot.rng is not None:
+            np.random.set_state(snapshot.rng)
+
+    def state_arrays(self):
+        """
+        Positions and velocities of all entities as contiguous arrays, in the order of self.entities.
+
+        Row i of each array is the state.p_pos or state.p_vel of entity i, so updating the arrays updates
+        the entities and the other way around. The arrays are rebuilt, and the states bound to them, when
+        the entities change or a state was unbound by an assignment, see EntityState. Rows of states
+        whose p_pos or p_vel is None are zero and stay detached from the state.
+
+        Returns:
+            p_pos (numpy.array): Entity positions, shape [E, dim_p]
+            p_vel (numpy.array): Entity velocities, shape [E, dim_p]
+        """
+        entities = self.entities
+        bound = self._bound_entities
+        if bound is None or len(bound) != len(entities) or \
+                any(entity is not other or not entity.state._bound for entity, other in zip(entities, bound)):
+            self._p_pos = np.zeros((len(entities), self.dimension_position))
+            self._p_vel = np.zeros((len(entities), self.dimension_position))
+            for i, entity in enumerate(entities):
+                state = entity.state
+                if state._p_pos is not None:
+                    self._p_pos[i] = state._p_pos
+                    state._p_pos = self._p_pos[i]
+                if state._p_vel is not None:
+                    self._p_vel[i] = state._p_vel
+                    state._p_vel = self._p_vel[i]
+                state._bound = True
+            self._bound_entities = entities
+
+        return self._p_pos, self._p_vel
+
     @property
     def entities(self):
         """
@@ -274,18 +545,21 @@ class World(object):
         for agent in self.scripted_agents:
             agent.action = agent.action_callback(agent, self)
 
-        # Gather forces applied to entities
-        p_force = [None] * len(self.entities)
+        if self.physics == 'reference' and self.max_substeps <= 1:
+            # Gather forces applied to entities
+            p_force = [None] * len(self.entities)
 
-        # Apply agent physical controls
-        p_force = self.apply_action_force(p_force)
+            # Apply agent physical controls
+            p_force = self.apply_action_force(p_force)
 
-        # Apply environment forces
-        if self.apply_contact_forces:
-            p_force = self.apply_environment_force(p_force)
+            # Apply environment forces
+            if self.apply_contact_forces:
+                p_force = self.apply_environment_force(p_force)
 
-        # Integrate physical state
-        self.integrate_state(p_force)
+            # Integrate physical state
+            self.integrate_state(p_force)
+        else:
+            self.step_physics()
 
         # Update agent state
         for agent in self.agents:
@@ -393,6 +667,143 @@ class World(object):
 
             entity.state.p_pos += entity.state.p_vel * self.dt
 
+    def step_physics(self):
+        """
+        Apply action and contact forces and integrate the physical state of all entities with the
+        flat array kernels of the world's physics backend, in place on the arrays of state_arrays().
+
+        Equivalent to apply_action_force(), apply_environment_force() and integrate_state(), including
+        the order in which action noise is drawn.
+
+        With continuous collision detection (max_substeps > 1), the step is first taken as usual. Pairs of
+        entities that come within reach of each other along the straight paths of that step and move by more
+        than ccd_resolution times their combined size are then stepped again in substeps, together with the
+        contact forces of every substep, while all other entities keep the single step. The pairs that were
+        within reach of each other during any substep are recorded in swept_contacts.
+        """
+        kernels = physics.kernels(self.physics)
+        entities = self.entities
+
+        # Entity properties
+        collide = np.array([entity.collide for entity in entities], dtype=bool)
+        movable = np.array([entity.movable for entity in entities], dtype=bool)
+        active = movable & ~np.array([entity.is_agent and entity.is_perturbed_policy for entity in entities],
+                                     dtype=bool)
+        size = np.array([entity.size for entity in entities], dtype=np.float64)
+        mass = np.array([entity.mass for entity in entities], dtype=np.float64)
+        max_speed = np.array([np.inf if entity.max_speed is None else entity.max_speed for entity in entities],
+                             dtype=np.float64)
+
+        # Physical state, updated in place
+        p_pos, p_vel = self.state_arrays()
+
+        # Apply agent physical controls
+        action_force = np.zeros_like(p_pos)
+        for i, agent in enumerate(self.agents):
+            if agent.movable:
+                noise = np.random.randn(*agent.action.u.shape) * agent.u_noise if agent.u_noise else 0.0
+                action_force[i] = agent.action.u + noise
+
+        ccd = self.max_substeps > 1
+        if ccd:
+            start_pos, start_vel = p_pos.copy(), p_vel.copy()
+
+        # Apply environment forces
+        p_force = action_force.copy() if ccd else action_force
+        if self.apply_contact_forces:
+            kernels.contact_forces(p_pos, size, collide, movable, self.contact_force, self.contact_margin, p_force)
+
+        # Integrate physical state
+        kernels.integrate(p_pos, p_vel, p_force, mass, max_speed, active, self.damping, self.dt)
+
+        # Continuous collision detection
+        if ccd:
+            path = [start_pos, p_pos]
+            first, second, travel, reach = physics.swept_pairs(start_pos, p_pos, size, active)
+            fast = travel > self.ccd_resolution * reach
+            if np.any(fast):
+                substeps = np.max(np.ceil(travel[fast] / (self.ccd_resolution * reach[fast])))
+                substeps = int(min(self.max_substeps, substeps))
+                substepped = np.zeros_like(active)
+                substepped[first[fast]] = True
+                substepped[second[fast]] = True
+                substepped &= active
+
+                # Damping per substep compounds to the damping of a whole step
+                damping = 1 - (1 - self.damping) ** (1.0 / substeps)
+                pos, vel = start_pos.copy(), start_vel.copy()
+                path = [start_pos]
+                for k in range(1, substeps + 1):
+                    p_force = action_force.copy()
+                    if self.apply_contact_forces:
+                        kernels.contact_forces(pos, size, collide, movable, self.contact_force, self.contact_margin,
+                                               p_force)
+                    kernels.integrate(pos, vel, p_force, mass, max_speed, substepped, damping, self.dt / substeps)
+
+                    # All other entities move along their single step
+                    others = ~substepped
+                    pos[others] = start_pos[others] + (p_pos[others] - start_pos[others]) * k / substeps
+                    path.append(pos.copy())
+
+                p_pos[substepped] = pos[substepped]
+                p_vel[substepped] = vel[substepped]
+
+            # Record the contacts along the path of the step
+            self.swept_contacts = set()
+            for start, end in zip(path[:-1], path[1:]):
+                first, second, _, _ = physics.swept_pairs(start, end, size, active)
+                for a, b in zip(first, second):
+                    self.swept_contacts.add((id(entities[a]), id(entities[b])))
+                    self.swept_contacts.add((id(entities[b]), id(entities[a])))
+
+    def collision_matrix(self, entities_a, entities_b):
+        """
+        Determine which pairs of entities collided, like is_collision() over every pair at once.
+
+        Args:
+            entities_a (list): Entity objects
+            entities_b (list): Entity objects
+
+        Returns:
+            (numpy.array) Boolean [len(entities_a), len(entities_b)] matrix, True where the entities collided
+        """
+        pos_a = np.array([entity.state.p_pos for entity in entities_a], dtype=np.float64).reshape(len(entities_a), -1)
+        pos_b = np.array([entity.state.p_pos for entity in entities_b], dtype=np.float64).reshape(len(entities_b), -1)
+        size_a = np.array([entity.size for entity in entities_a], dtype=np.float64)
+        size_b = np.array([entity.size for entity in entities_b], dtype=np.float64)
+
+        collided = physics.kernels(self.physics).within(pos_a, pos_b, size_a[:, None] + size_b[None, :])
+
+        # Contacts during the last step found by continuous collision detection
+        if self.swept_contacts:
+            index_b = {id(entity): j for j, entity in enumerate(entities_b)}
+            for i, entity in enumerate(entities_a):
+                for j in [index_b[other] for first, other in self.swept_contacts
+                          if first == id(entity) and other in index_b]:
+                    collided[i, j] = True
+
+        return collided
+
+    def sense_matrix(self, entities_a, entities_b):
+        """
+        Determine which entities b are in the sense region of which entities a, like in_sense_region()
+        over every pair at once.
+
+        Args:
+            entities_a (list): Entity objects
+            entities_b (list): Entity objects
+
+        Returns:
+            (numpy.array) Boolean [len(entities_a), len(entities_b)] matrix, True where entity b is in the
+                          sense region of entity a
+        """
+        pos_a = np.array([entity.state.p_pos for entity in entities_a], dtype=np.float64).reshape(len(entities_a), -1)
+        pos_b = np.array([entity.state.p_pos for entity in entities_b], dtype=np.float64).reshape(len(entities_b), -1)
+        region_a = np.array([entity.size + entity.sense_region for entity in entities_a], dtype=np.float64)
+        size_b = np.array([entity.size for entity in entities_b], dtype=np.float64)
+
+        return physics.kernels(self.physics).within(pos_a, pos_b, region_a[:, None] + size_b[None, :])
+
     def update_agent_state(self, agent):
         """
         Update the state of the agent
@@ -507,7 +918,8 @@ class World(object):
             agent_b (multiagent_particle_env.core.Agent): Agent object
 
         Returns:
-            (boolean) True if collision occurred else False
+            (boolean) True if collision occurred, at the end of the last step or during it when
+                      continuous collision detection is enabled, else False
         """
         # Compute actual distance between entities
         delta_pos = agent_a.state.p_pos - agent_b.state.p_pos
@@ -516,6 +928,10 @@ class World(object):
         # Minimum allowable distance
         dist_min = agent_a.size + agent_b.size
 
+        # Contact during the last step found by continuous collision detection
+        if self.swept_contacts and (id(agent_a), id(agent_b)) in self.swept_contacts:
+            return True
+
         # Collision occurs is distance is less then the minimum allowable distance
         return True if dist < dist_min else False
 
@@ -211,6 +211,7 @@ class MultiAgentEnv(gym.Env):
         """
         # Reset world
         self.reset_callback(self.world)
+        self.world.swept_contacts = set()
 
         # Reset renderer
         self._reset_render()
@@ -7,6 +7,8 @@ logger.py
 
 import numpy as np
 import errno
+import glob
+import json
 import os
 
 __author__ = 'Rolando Fernandez'
@@ -51,29 +53,10 @@ class Logger(object):
         if not self.is_logging:
             return
         log = self.logs[log_id]
-        try:
-            path = path.split("/")
-        except:
-            path = path.split("\\")
-        path = "/".join(path)
-        if path[-1] != "/":
-            path = path + "/"
-        if not os.path.isdir(path):
-            try:
-                os.makedirs(path)
-            except OSError as e:
-                if e.errno != errno.EEXIST:
-                    raise
+        path = _make_dir(path)
         if not filename:
             filename = log_id
-        if os.path.isfile(path + filename + "." + filetype):
-            copy = 1
-            new_filename = filename + "(" + str(copy) + ")"
-            while os.path.isfile(path + new_filename + "." + filetype):
-                copy += 1
-                new_filename = filename + "(" + str(copy) + ")"
-            filename = new_filename
-        f = open(path + filename + "." + filetype, 'w')
+        f = open(_unique_path(path, filename, filetype), 'w')
         f.write(','.join([str(x) for x in log.header]) + "\n")
         for line in log.data:
             out_line = ','.join([str(x) for x in line]) + "\n"
@@ -81,6 +64,272 @@ class Logger(object):
         f.close()
 
 
+def _unique_path(path, filename, filetype):
+    """
+    Path for a new log file that does not overwrite an existing one, appending "(n)" when needed.
+
+    Args:
+        path (str): Directory ending in "/"
+        filename (str): Base name of the file
+        filetype (str): File extension
+
+    Returns:
+        (str) Full path for the new file
+    """
+    if os.path.exists(path + filename + "." + filetype):
+        copy = 1
+        new_filename = filename + "(" + str(copy) + ")"
+        while os.path.exists(path + new_filename + "." + filetype):
+            copy += 1
+            new_filename = filename + "(" + str(copy) + ")"
+        filename = new_filename
+
+    return path + filename + "." + filetype
+
+
+def _make_dir(path):
+    """
+    Normalize path separators, append a trailing "/" and create the directory if needed.
+
+    Args:
+        path (str): Directory path
+
+    Returns:
+        (str) Normalized directory path ending in "/"
+    """
+    path = path.replace("\\", "/")
+    if path[-1] != "/":
+        path = path + "/"
+    if not os.path.isdir(path):
+        try:
+            os.makedirs(path)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+    return path
+
+
+class StreamingLog(object):
+    """
+    Log that buffers rows by column and flushes them to disk as chunked .npz files.
+
+    A log is a directory holding header.json and chunk_XXXXXX.npz files, one array per column.
+    The directory is only created by the first flush, so a log that never receives rows leaves
+    nothing on disk. Chunks are written to a temporary file and renamed into place, so a crash
+    loses at most the rows buffered since the last flush.
+    """
+    def __init__(self, header, directory, chunk_rows=50000):
+        """
+        Args:
+            header (list): Column names
+            directory (str): Directory the chunks are streamed to
+            chunk_rows (int): Number of buffered rows that triggers a flush
+        """
+        assert type(header) == list
+        self.header = header
+        self.directory = directory.replace("\\", "/").rstrip("/") + "/"
+        self.chunk_rows = chunk_rows
+        self.num_chunks = 0
+        self.num_rows = 0
+        self.columns = [[] for _ in header]
+
+    def open(self):
+        """
+        Create the log directory and its header.json, if not created yet.
+        """
+        if os.path.exists(self.directory + "header.json"):
+            return
+        _make_dir(self.directory)
+        with open(self.directory + "header.json", 'w') as f:
+            json.dump([str(x) for x in self.header], f)
+
+    def append(self, data):
+        """
+        Buffer a row, flushing when the buffer reaches chunk_rows.
+
+        Args:
+            data (list): Row of values, one per column
+        """
+        for column, value in zip(self.columns, data):
+            column.append(value)
+        self.num_rows += 1
+
+        if len(self.columns[0]) >= self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        """
+        Write buffered rows to a new chunk file and clear the buffer.
+        """
+        if not self.columns or len(self.columns[0]) == 0:
+            return
+        self.open()
+
+        arrays = {}
+        for i, column in enumerate(self.columns):
+            array = np.asarray(column)
+            if array.dtype == object:
+                array = array.astype(str)
+            arrays["col_{}".format(i)] = array
+
+        chunk_name = "chunk_{:06d}.npz".format(self.num_chunks)
+        tmp_path = self.directory + "tmp_" + chunk_name
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, self.directory + chunk_name)
+
+        self.num_chunks += 1
+        self.columns = [[] for _ in self.header]
+
+
+class StreamingLogger(Logger):
+    """
+    Drop-in replacement for Logger that streams rows to chunked .npz files instead of holding
+    the whole run in memory.
+
+    Rows are spooled to "<spool_dir>/<log_id>_<pid>_<n>.partial/" while the run is in progress.
+    On save the spool is either exported to "<path>/<filename>.csv" or, for the "npz" filetype,
+    the directory itself is renamed to "<path>/<filename>.npz".
+    """
+    _spool_count = 0
+
+    def __init__(self, is_logging, spool_dir, filetype="csv", chunk_rows=50000):
+        """
+        Args:
+            is_logging (bool): Flag for whether logging is enabled
+            spool_dir (str): Directory in-progress logs are streamed to
+            filetype (str): Default output format for save, "csv" or "npz"
+            chunk_rows (int): Number of buffered rows that triggers a flush
+        """
+        super(StreamingLogger, self).__init__(is_logging)
+        self.spool_dir = spool_dir
+        self.filetype = filetype
+        self.chunk_rows = chunk_rows
+
+    def _spool_path(self, key):
+        StreamingLogger._spool_count += 1
+        return "{}/{}_{}_{}.partial/".format(self.spool_dir.rstrip("/\\"), key, os.getpid(),
+                                            StreamingLogger._spool_count)
+
+    def new(self, key, header):
+        if not self.is_logging:
+            return
+        self.logs[key] = StreamingLog(header, self._spool_path(key), self.chunk_rows)
+
+    def add(self, log_id, data):
+        if not self.is_logging:
+            return
+        log = self.logs[log_id]
+        data = list(data)
+        assert len(data) == len(log.header)
+
+        log.append(data)
+
+    def save(self, log_id, path, filename=False, filetype=None):
+        """
+        Flush and finalize a log, then start a fresh one under the same id.
+
+        Args:
+            log_id (str): Log identifier
+            path (str): Output directory
+            filename (str): Output name without extension, defaults to log_id
+            filetype (str): "npz" for the chunked column format, "csv" to export to CSV,
+                            defaults to the logger's filetype
+        """
+        if not self.is_logging:
+            return
+        log = self.logs[log_id]
+        log.flush()
+        log.open()
+        path = _make_dir(path)
+        if not filename:
+            filename = log_id
+        if filetype is None:
+            filetype = self.filetype
+
+        if filetype == "csv":
+            write_log_csv(log.directory, _unique_path(path, filename, filetype))
+            for chunk in glob.glob(log.directory + "*"):
+                os.remove(chunk)
+            os.rmdir(log.directory)
+        else:
+            os.replace(log.directory, _unique_path(path, filename, filetype))
+
+        self.logs[log_id] = StreamingLog(log.header, self._spool_path(log_id), self.chunk_rows)
+
+
+def iter_log_chunks(directory):
+    """
+    Iterate over the chunks of a streaming log without loading the whole log into memory.
+
+    Args:
+        directory (str): Log directory written by StreamingLogger
+
+    Yields:
+        (dict) Column name to numpy.array for each chunk, in write order
+    """
+    directory = directory.rstrip("/\\") + "/"
+    with open(directory + "header.json", 'r') as f:
+        header = json.load(f)
+
+    for chunk_path in sorted(glob.glob(directory + "chunk_*.npz")):
+        with np.load(chunk_path) as chunk:
+            yield {name: chunk["col_{}".format(i)] for i, name in enumerate(header)}
+
+
+def read_log(directory):
+    """
+    Load a streaming log into memory.
+
+    Args:
+        directory (str): Log directory written by StreamingLogger
+
+    Returns:
+        (dict) Column name to numpy.array holding every row of the log
+    """
+    directory = directory.rstrip("/\\") + "/"
+    with open(directory + "header.json", 'r') as f:
+        header = json.load(f)
+
+    columns = {name: [] for name in header}
+    for chunk in iter_log_chunks(directory):
+        for name in header:
+            columns[name].append(chunk[name])
+
+    data = {}
+    for name in header:
+        if not columns[name]:
+            data[name] = np.array([])
+            continue
+        try:
+            data[name] = np.concatenate(columns[name])
+        except (TypeError, ValueError):
+            # Chunks inferred different types for the column, fall back to strings
+            data[name] = np.concatenate([c.astype(str) for c in columns[name]])
+
+    return data
+
+
+def write_log_csv(directory, csv_path):
+    """
+    Export a streaming log to CSV one chunk at a time.
+
+    Args:
+        directory (str): Log directory written by StreamingLogger
+        csv_path (str): Output CSV file
+    """
+    directory = directory.rstrip("/\\") + "/"
+    with open(directory + "header.json", 'r') as f:
+        header = json.load(f)
+
+    with open(csv_path, 'w') as f:
+        f.write(','.join(header) + "\n")
+        for chunk in iter_log_chunks(directory):
+            for row in zip(*[chunk[name].tolist() for name in header]):
+                f.write(','.join([str(x) for x in row]) + "\n")
+
+
 def logger_test():
     """
     Simple test function for logging.
@@ -18,7 +18,8 @@ communication actions in this array. See environment.py for more details.
 """
 
 from multiagent_particle_env.environment import MultiAgentEnv
-from multiagent_particle_env.logger import Log, Logger
+from multiagent_particle_env.logger import Log, Logger, StreamingLogger
+from multiagent_particle_env.reset_bank import ResetBank
 
 import multiagent_particle_env.scenarios as scenarios
 
@@ -32,7 +33,8 @@ __email__ = 'rolando.fernandez1.civ@mail.mil'
 __status__ = 'Dev'
 
 
-def make_env(scenario_name, arglist=None, done=False, logging=False, benchmark=False):
+def make_env(scenario_name, arglist=None, done=False, logging=False, benchmark=False, clone_world=False,
+             env_index=None):
     """
     Creates a MultiAgentEnv object as env. This can be used similar to a gym
     environment by calling env.reset() and env.step().
@@ -53,26 +55,61 @@ def make_env(scenario_name, arglist=None, done=False, logging=False, benchmark=F
                            (usually only done during evaluation)
         benchmark (boolean): Whether you want to produce benchmarking data
                              (usually only done during evaluation)
+        clone_world (boolean): Copy a world built once per scenario and arglist instead of running
+                               the scenario's make_world, e.g. when creating many environments.
+                               The copies start from the same state until they are reset.
+        env_index (int): Index of the environment among those built from the same arglist, seeds its choice of
+                         reset bank entries together with arglist.seed. None draws the choice seed from the
+                         global numpy RNG
 
     Returns:
         env (multiagent_particle_env.environment.MultiAgentEnv): Multi-Agent Particle Environment object
     """
-    # Load scenario from script
-    scenario = scenarios.load(scenario_name + ".py").Scenario()
-
-    # Create world
-    if arglist is not None:
-        world = scenario.make_world(arglist)
+    # Load scenario from script and create world
+    if clone_world:
+        factory = scenarios.world_factory(scenario_name + ".py", arglist)
+        scenario = factory.scenario
+        world = factory.make_world()
     else:
-        world = scenario.make_world()
-
-    # Set up logger
-    logger = Logger(logging)
+        scenario = scenarios.load(scenario_name + ".py").Scenario()
+        if arglist is not None:
+            world = scenario.make_world(arglist)
+        else:
+            world = scenario.make_world()
+
+    # Physics backend of the world's step, see multiagent_particle_env.physics
+    if arglist is not None and getattr(arglist, "physics", None):
+        world.physics = arglist.physics
+
+    # Continuous collision detection with physics substeps
+    if arglist is not None and getattr(arglist, "max_substeps", None):
+        world.max_substeps = arglist.max_substeps
+        world.ccd_resolution = getattr(arglist, "ccd_resolution", world.ccd_resolution)
+
+    # Set up logger, streaming to the save directory when one is available
+    if logging and arglist is not None and getattr(arglist, "save_dir", None):
+        logger = StreamingLogger(logging, arglist.save_dir, filetype=getattr(arglist, "log_format", "csv"))
+    else:
+        logger = Logger(logging)
 
     # Set up callbacks
     info_callback = None
     logging_callback = None
     done_callback = None
+    reset_callback = scenario.reset_world
+
+    # Reset from a bank of pre-sampled initial states. The bank is reproducible from the seed, the choice of
+    # entries is seeded per environment so that environments built from the same arglist reset differently
+    if arglist is not None and getattr(arglist, "reset_bank", 0) > 0:
+        if not scenario.supports_reset_bank:
+            raise ValueError("Scenario {} does not support reset banks, they only restore entity states, "
+                             "see BaseScenario.supports_reset_bank".format(scenario_name))
+        seed = getattr(arglist, "seed", None)
+        choice_seed = None
+        if seed is not None and env_index is not None:
+            choice_seed = [seed, env_index]
+        reset_callback = ResetBank(world, scenario.reset_world, arglist.reset_bank, seed=seed,
+                                   accept=scenario.reset_filter, choice_seed=choice_seed).reset
 
     if done:
         done_callback = scenario.done
@@ -84,7 +121,7 @@ def make_env(scenario_name, arglist=None, done=False, logging=False, benchmark=F
         info_callback = scenario.benchmark_data
 
     # Create multi-agent environment
-    env = MultiAgentEnv(world, arglist, logger, reset_callback=scenario.reset_world,
+    env = MultiAgentEnv(world, arglist, logger, reset_callback=reset_callback,
                         reward_callback=scenario.reward, observation_callback=scenario.observation,
                         logging_callback=logging_callback, info_callback=info_callback, done_callback=done_callback)
 
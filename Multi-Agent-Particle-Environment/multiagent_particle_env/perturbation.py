@@ -0,0 +1,194 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+perturbation.py
+
+Vectorized double pendulum dynamics used by the chaotic perturbation strategies.
+
+All functions operate on batches of pendulum states with shape [B, 4], where each row is
+[theta_1, omega_1, theta_2, omega_2] and angles are measured from the downward vertical,
+so the states of every perturbed agent across any number of worlds can be advanced at once.
+
+Updated and Enhanced version of OpenAI Multi-Agent Particle Environment
+(https://github.com/openai/multiagent-particle-envs)
+"""
+
+import numpy as np
+
+__author__ = 'Rolando Fernandez'
+__copyright__ = 'Copyright 2020, Multi-Agent Particle Environment'
+__credits__ = ['Rolando Fernandez', 'OpenAI']
+__license__ = ''
+__version__ = '0.0.1'
+__maintainer__ = 'Rolando Fernandez'
+__email__ = 'rolando.fernandez1.civ@mail.mil'
+__status__ = 'Dev'
+
+# Pendulum constants
+G = 9.8
+M1, M2 = 1.0, 1.0
+L1, L2 = 0.49, 0.49
+
+# Integration step, matches the 1/40 scaling of the original Euler update
+DT = 1.0 / 40.0
+
+
+def double_pendulum_derivatives(states, l1=L1, l2=L2):
+    """
+    Differential dynamics of a batch of double pendulums
+
+    Args:
+        states (numpy.array): Pendulum states, shape [B, 4]
+        l1 (float): Length of the first arm
+        l2 (float): Length of the second arm
+
+    Returns:
+        dydx (numpy.array): Time derivative of the pendulum states, shape [B, 4]
+    """
+    th1, w1, th2, w2 = states[:, 0], states[:, 1], states[:, 2], states[:, 3]
+
+    del_ = th2 - th1
+    sin_del = np.sin(del_)
+    cos_del = np.cos(del_)
+    sin_th1 = np.sin(th1)
+    sin_th2 = np.sin(th2)
+
+    den1 = (M1 + M2) * l1 - M2 * l1 * cos_del * cos_del
+    den2 = (l2 / l1) * den1
+
+    dydx = np.empty_like(states)
+    dydx[:, 0] = w1
+    dydx[:, 1] = (M2 * l1 * w1 * w1 * sin_del * cos_del +
+                  M2 * G * sin_th2 * cos_del +
+                  M2 * l2 * w2 * w2 * sin_del -
+                  (M1 + M2) * G * sin_th1) / den1
+    dydx[:, 2] = w2
+    dydx[:, 3] = (-M2 * l2 * w2 * w2 * sin_del * cos_del +
+                  (M1 + M2) * G * sin_th1 * cos_del -
+                  (M1 + M2) * l1 * w1 * w1 * sin_del -
+                  (M1 + M2) * G * sin_th2) / den2
+
+    return dydx
+
+
+def double_pendulum_rk4(states, dt=DT, l1=L1, l2=L2):
+    """
+    Advance a batch of double pendulums by one fixed RK4 step
+
+    Args:
+        states (numpy.array): Pendulum states, shape [B, 4]
+        dt (float): Integration step
+        l1 (float): Length of the first arm
+        l2 (float): Length of the second arm
+
+    Returns:
+        new_states (numpy.array): Updated pendulum states, shape [B, 4]
+        d_states (numpy.array): Change in pendulum states over the step, shape [B, 4]
+    """
+    states = np.asarray(states, dtype=np.float64).reshape(-1, 4)
+
+    k1 = double_pendulum_derivatives(states, l1, l2)
+    k2 = double_pendulum_derivatives(states + 0.5 * dt * k1, l1, l2)
+    k3 = double_pendulum_derivatives(states + 0.5 * dt * k2, l1, l2)
+    k4 = double_pendulum_derivatives(states + dt * k3, l1, l2)
+
+    d_states = (dt / 6.0) * (k1 + 2.0 * k2 + 2.0 * k3 + k4)
+
+    return states + d_states, d_states
+
+
+def double_pendulum_positions(states, l1=L1, l2=L2):
+    """
+    Cartesian position of the tip of a batch of double pendulums
+
+    Args:
+        states (numpy.array): Pendulum states, shape [B, 4]
+        l1 (float): Length of the first arm
+        l2 (float): Length of the second arm
+
+    Returns:
+        (numpy.array) Tip positions, shape [B, 2]
+    """
+    return np.stack([l1 * np.sin(states[:, 0]) + l2 * np.sin(states[:, 2]),
+                     -l1 * np.cos(states[:, 0]) - l2 * np.cos(states[:, 2])], axis=-1)
+
+
+def double_pendulum_inverse_kinematics(p_pos, l1=L1, l2=L2):
+    """
+    Pendulum states whose tip lies at (or as close as possible to) the given positions.
+
+    Angular velocities are drawn as the square of a uniform random number, as in the
+    original perturbation strategy.
+
+    Args:
+        p_pos (numpy.array): Positions, shape [B, 2]
+        l1 (float): Length of the first arm
+        l2 (float): Length of the second arm
+
+    Returns:
+        states (numpy.array): Pendulum states, shape [B, 4]
+    """
+    p_pos = np.asarray(p_pos, dtype=np.float64).reshape(-1, 2)
+    x, y = p_pos[:, 0], p_pos[:, 1]
+
+    # Relative elbow angle, clipped for positions out of reach
+    cos_rel = np.clip((x ** 2 + y ** 2 - l1 ** 2 - l2 ** 2) / (2 * l1 * l2), -1.0, 1.0)
+    rel = np.arccos(cos_rel)
+
+    # Angle of the first arm from the x-axis, then convert to angles from the downward vertical
+    a1 = np.arctan2(y, x) - np.arctan2(l2 * np.sin(rel), l1 + l2 * np.cos(rel))
+
+    states = np.empty((p_pos.shape[0], 4))
+    states[:, 0] = a1 + np.pi / 2.0
+    states[:, 1] = np.random.random(p_pos.shape[0]) ** 2
+    states[:, 2] = a1 + rel + np.pi / 2.0
+    states[:, 3] = np.random.random(p_pos.shape[0]) ** 2
+
+    return states
+
+
+def step_perturbed_agents(agents, dt=DT, l1=L1, l2=L2, dynamics_l1=None, dynamics_l2=None):
+    """
+    Advance the pendulum state of a list of perturbed agents in one batched RK4 step
+
+    Agents may come from any number of worlds. Agents without a pendulum state (None or all zeros)
+    are initialized from their current position with inverse kinematics. The new pendulum state
+    is written back to agent.state.state and the tip position to agent.state.p_pos.
+
+    Args:
+        agents (list): List of multiagent_particle_env.core.Agent objects
+        dt (float): Integration step
+        l1 (float): Length of the first arm
+        l2 (float): Length of the second arm
+        dynamics_l1 (float): Length of the first arm in the dynamics, defaults to l1
+        dynamics_l2 (float): Length of the second arm in the dynamics, defaults to l2
+
+    Returns:
+        new_states (numpy.array): Updated pendulum states, shape [B, 4]
+        d_states (numpy.array): Change in pendulum states over the step, shape [B, 4]
+    """
+    if dynamics_l1 is None:
+        dynamics_l1 = l1
+    if dynamics_l2 is None:
+        dynamics_l2 = l2
+
+    states = np.zeros((len(agents), 4))
+    for i, agent in enumerate(agents):
+        if agent.state.state is not None:
+            states[i] = agent.state.state
+
+    # Initialize missing states at the agents' current positions
+    missing = ~np.any(states, axis=1)
+    if np.any(missing):
+        positions = np.array([agents[i].state.p_pos for i in np.flatnonzero(missing)])
+        states[missing] = double_pendulum_inverse_kinematics(positions, l1, l2)
+
+    new_states, d_states = double_pendulum_rk4(states, dt, dynamics_l1, dynamics_l2)
+    positions = double_pendulum_positions(new_states, l1, l2)
+
+    for i, agent in enumerate(agents):
+        agent.state.state = new_states[i]
+        agent.state.p_pos = positions[i]
+
+    return new_states, d_states
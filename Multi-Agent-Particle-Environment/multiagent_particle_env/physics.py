@@ -0,0 +1,262 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+physics.py
+
+Physics kernels of the multi-agent particle world over flat arrays.
+
+World.step() runs these kernels on the world's [E, dim_p] position and velocity arrays, see
+World.state_arrays(), and on [E] arrays of entity properties instead of looping over entities and
+entity pairs in Python. Every kernel
+has a vectorized numpy implementation and a loop implementation compiled with numba when it
+is installed. Both perform the same floating point operations in the same order as the
+reference per-entity code in core.py, so results match it to within rounding.
+
+Backends:
+    'reference': Per-entity methods of core.World, the original behavior
+    'numpy': Vectorized numpy kernels
+    'numba': Compiled loop kernels, falls back to 'numpy' with a warning when numba is missing
+    'auto': 'numba' when numba is installed, otherwise 'numpy'
+
+Updated and Enhanced version of OpenAI Multi-Agent Particle Environment
+(https://github.com/openai/multiagent-particle-envs)
+"""
+
+from collections import namedtuple
+import math
+import warnings
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+__author__ = 'Rolando Fernandez'
+__copyright__ = 'Copyright 2020, Multi-Agent Particle Environment'
+__credits__ = ['Rolando Fernandez', 'OpenAI']
+__license__ = ''
+__version__ = '0.0.1'
+__maintainer__ = 'Rolando Fernandez'
+__email__ = 'rolando.fernandez1.civ@mail.mil'
+__status__ = 'Dev'
+
+BACKENDS = ('reference', 'numpy', 'numba', 'auto')
+
+# Kernels of a backend
+#   contact_forces(pos, size, collide, movable, contact_force, contact_margin, force): Adds the
+#       contact forces of every colliding pair to force [E, dim_p] in place
+#   integrate(pos, vel, force, mass, max_speed, active, damping, dt): Damps, accelerates, clamps
+#       and integrates the velocities and positions of the active entities in place
+#   within(pos_a, pos_b, reach): Boolean [A, B] matrix, True where the distance between
+#       pos_a[i] and pos_b[j] is less than reach[i, j]
+Kernels = namedtuple('Kernels', ['contact_forces', 'integrate', 'within'])
+
+
+########################################################################################################################
+# Numpy kernels
+########################################################################################################################
+
+def _contact_forces_numpy(pos, size, collide, movable, contact_force, contact_margin, force):
+    num_entities = pos.shape[0]
+    rows = np.flatnonzero(movable & collide)
+    if rows.size == 0:
+        return force
+
+    # Pairs of a movable collider with every other collider, [R, E]
+    delta_pos = pos[rows, None, :] - pos[None, :, :]
+    dist = np.sqrt(np.sum(np.square(delta_pos), axis=2))
+    pairs = collide[None, :] & (rows[:, None] != np.arange(num_entities)[None, :])
+    dist = np.where(pairs, dist, 1.0)
+    dist_min = size[rows, None] + size[None, :]
+
+    # Softmax penetration
+    k = contact_margin
+    penetration = np.logaddexp(0, -(dist - dist_min) / k) * k
+    pair_force = contact_force * delta_pos / dist[:, :, None] * penetration[:, :, None]
+    pair_force[~pairs] = 0.0
+
+    # Accumulate in entity order, like the reference pair loop
+    for j in np.flatnonzero(collide):
+        force[rows] += pair_force[:, j]
+
+    return force
+
+
+def _integrate_numpy(pos, vel, force, mass, max_speed, active, damping, dt):
+    rows = np.flatnonzero(active)
+    p_vel = vel[rows] * (1 - damping)
+    p_vel += (force[rows] / mass[rows, None]) * dt
+
+    speed = np.sqrt(np.sum(np.square(p_vel), axis=1))
+    limit = max_speed[rows]
+    fast = speed > limit
+    if np.any(fast):
+        p_vel[fast] = p_vel[fast] / speed[fast, None] * limit[fast, None]
+
+    pos[rows] += p_vel * dt
+    vel[rows] = p_vel
+
+
+def _within_numpy(pos_a, pos_b, reach):
+    delta_pos = pos_a[:, None, :] - pos_b[None, :, :]
+    return np.sqrt(np.sum(np.square(delta_pos), axis=2)) < reach
+
+
+NUMPY_KERNELS = Kernels(_contact_forces_numpy, _integrate_numpy, _within_numpy)
+
+
+########################################################################################################################
+# Loop kernels, compiled with numba
+########################################################################################################################
+
+def _logaddexp_zero(x):
+    # log(exp(0) + exp(x)), evaluated like numpy.logaddexp
+    if x == 0.0:
+        return math.log(2.0)
+    if x < 0.0:
+        return math.log1p(math.exp(x))
+    return x + math.log1p(math.exp(-x))
+
+
+def _contact_forces_loop(pos, size, collide, movable, contact_force, contact_margin, force):
+    num_entities, dim = pos.shape
+    delta_pos = np.empty(dim)
+    for i in range(num_entities):
+        if not (movable[i] and collide[i]):
+            continue
+
+        for j in range(num_entities):
+            if j == i or not collide[j]:
+                continue
+
+            squared = 0.0
+            for d in range(dim):
+                delta_pos[d] = pos[i, d] - pos[j, d]
+                squared += delta_pos[d] * delta_pos[d]
+            dist = math.sqrt(squared)
+
+            penetration = _logaddexp_zero(-(dist - (size[i] + size[j])) / contact_margin) * contact_margin
+            for d in range(dim):
+                force[i, d] += contact_force * delta_pos[d] / dist * penetration
+
+    return force
+
+
+def _integrate_loop(pos, vel, force, mass, max_speed, active, damping, dt):
+    num_entities, dim = pos.shape
+    for i in range(num_entities):
+        if not active[i]:
+            continue
+
+        squared = 0.0
+        for d in range(dim):
+            vel[i, d] = vel[i, d] * (1 - damping) + (force[i, d] / mass[i]) * dt
+            squared += vel[i, d] * vel[i, d]
+
+        speed = math.sqrt(squared)
+        if speed > max_speed[i]:
+            for d in range(dim):
+                vel[i, d] = vel[i, d] / speed * max_speed[i]
+
+        for d in range(dim):
+            pos[i, d] += vel[i, d] * dt
+
+
+def _within_loop(pos_a, pos_b, reach):
+    result = np.zeros((pos_a.shape[0], pos_b.shape[0]), dtype=np.bool_)
+    for i in range(pos_a.shape[0]):
+        for j in range(pos_b.shape[0]):
+            squared = 0.0
+            for d in range(pos_a.shape[1]):
+                squared += (pos_a[i, d] - pos_b[j, d]) * (pos_a[i, d] - pos_b[j, d])
+            result[i, j] = math.sqrt(squared) < reach[i, j]
+
+    return result
+
+
+if numba is not None:
+    _logaddexp_zero = numba.njit(cache=True)(_logaddexp_zero)
+    NUMBA_KERNELS = Kernels(numba.njit(cache=True)(_contact_forces_loop),
+                            numba.njit(cache=True)(_integrate_loop),
+                            numba.njit(cache=True)(_within_loop))
+else:
+    NUMBA_KERNELS = None
+
+
+########################################################################################################################
+# Continuous collision detection
+########################################################################################################################
+
+def closest_approach(rel_pos, rel_disp):
+    """
+    Closest distance of pairs of entities moving in straight lines during a step
+
+    Args:
+        rel_pos (numpy.array): Relative positions at the start of the step, shape [P, dim_p]
+        rel_disp (numpy.array): Relative displacements over the step, shape [P, dim_p]
+
+    Returns:
+        (numpy.array) Smallest distance of each pair during the step, shape [P]
+    """
+    squared = np.sum(np.square(rel_disp), axis=1)
+    t = -np.sum(rel_pos * rel_disp, axis=1) / np.where(squared > 0, squared, 1.0)
+    t = np.clip(t, 0.0, 1.0)
+
+    return np.sqrt(np.sum(np.square(rel_pos + t[:, None] * rel_disp), axis=1))
+
+
+def swept_pairs(start_pos, end_pos, size, moving):
+    """
+    Pairs of entities that come within reach of each other while moving in straight lines from
+    start_pos to end_pos, where the reach of a pair is the sum of the entity sizes
+
+    Args:
+        start_pos (numpy.array): Entity positions at the start of the step, shape [E, dim_p]
+        end_pos (numpy.array): Entity positions at the end of the step, shape [E, dim_p]
+        size (numpy.array): Entity sizes, shape [E]
+        moving (numpy.array): Boolean mask of the entities that move, pairs of static entities are skipped
+
+    Returns:
+        first (numpy.array): Index of the first entity of each pair
+        second (numpy.array): Index of the second entity of each pair, greater than first
+        travel (numpy.array): Length of the relative displacement of each pair
+        reach (numpy.array): Sum of the sizes of each pair
+    """
+    first, second = np.triu_indices(start_pos.shape[0], 1)
+    keep = moving[first] | moving[second]
+    first, second = first[keep], second[keep]
+
+    rel_pos = start_pos[first] - start_pos[second]
+    rel_disp = (end_pos[first] - start_pos[first]) - (end_pos[second] - start_pos[second])
+    reach = size[first] + size[second]
+    close = closest_approach(rel_pos, rel_disp) < reach
+
+    return first[close], second[close], np.sqrt(np.sum(np.square(rel_disp[close]), axis=1)), reach[close]
+
+
+def kernels(backend):
+    """
+    Kernels of a physics backend
+
+    Args:
+        backend (str): One of BACKENDS, 'reference' uses the numpy kernels for the array helpers
+
+    Returns:
+        (Kernels) Kernel functions of the backend
+
+    Raises:
+        ValueError: When the backend is unknown
+    """
+    if backend not in BACKENDS:
+        raise ValueError("Unknown physics backend {}, expected one of {}".format(backend, ", ".join(BACKENDS)))
+
+    if backend in ('numba', 'auto') and NUMBA_KERNELS is not None:
+        return NUMBA_KERNELS
+
+    if backend == 'numba':
+        warnings.warn("numba is not installed, using the numpy physics kernels")
+
+    return NUMPY_KERNELS
@@ -0,0 +1,143 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+reset_bank.py
+
+Bank of pre-sampled initial states for fast episode resets.
+
+The scenario's reset_world is run M times up front on a clone of the world, optionally rejecting
+configurations with a filter, and the resulting entity states are stored as [M, ...] arrays.
+Resetting then picks one entry and copies it into the world's state arrays in place, instead of
+drawing new positions and allocating new arrays every episode. Only the states of movable entities
+and the states that differ between entries are written, e.g. the agents and the HVT but not the
+static boundary landmarks.
+
+The bank restores entity states only, so it suits scenarios whose reset_world only draws entity
+states, such as the HVT scenarios. Scenarios opt in with BaseScenario.supports_reset_bank, make_env
+refuses to build a bank for the others, e.g. the goals of openai/simple_speaker_listener would
+otherwise stay fixed for every episode.
+
+Updated and Enhanced version of OpenAI Multi-Agent Particle Environment
+(https://github.com/openai/multiagent-particle-envs)
+"""
+
+import numpy as np
+
+__author__ = 'Rolando Fernandez'
+__copyright__ = 'Copyright 2020, Multi-Agent Particle Environment'
+__credits__ = ['Rolando Fernandez', 'OpenAI']
+__license__ = ''
+__version__ = '0.0.1'
+__maintainer__ = 'Rolando Fernandez'
+__email__ = 'rolando.fernandez1.civ@mail.mil'
+__status__ = 'Dev'
+
+
+class ResetBank(object):
+    """
+    Pre-sampled initial states of a world, used as its reset callback.
+    """
+    def __init__(self, world, reset_callback, size, seed=None, accept=None, max_tries=100, choice_seed=None):
+        """
+        Args:
+            world (multiagent_particle_env.core.World): World the bank resets, it is not modified
+            reset_callback (function): Scenario reset_world function used to sample the entries
+            size (int): Number of initial states M
+            seed (int): Seed of the sampling of the entries, None for a random seed
+            accept (function): Filter called with the freshly reset world, entries for which it returns
+                               False are rejected, e.g. an attacker already inside the HVT
+            max_tries (int): Maximum number of samples per entry before giving up
+            choice_seed (int or list): Seed of the choice of entries at reset, None to draw it from the global
+                                       numpy RNG, so that environments sharing a bank seed reset differently
+        """
+        self.size = size
+        if choice_seed is None:
+            choice_seed = np.random.randint(2 ** 31 - 1)
+        self.rng = np.random.RandomState(choice_seed)
+
+        # Sample with the global numpy RNG used by the scenarios, seeded from the bank seed
+        global_rng_state = np.random.get_state()
+        np.random.seed(np.random.RandomState(seed).randint(2 ** 31 - 1))
+
+        scratch = world.clone()
+        entries = []
+        tries = 0
+        while len(entries) < size:
+            tries += 1
+            if tries > max_tries * size:
+                np.random.set_state(global_rng_state)
+                raise RuntimeError("Reset bank accepted only {} of {} initial states after {} tries"
+                                   .format(len(entries), size, tries - 1))
+
+            reset_callback(scratch)
+            if accept is None or accept(scratch):
+                entries.append(scratch.snapshot(rng=False))
+
+        np.random.set_state(global_rng_state)
+
+        # Every entry must have the same layout
+        sizes = entries[0].sizes
+        assert all(np.array_equal(entry.sizes, sizes) for entry in entries), \
+            "reset_world produced states of different sizes"
+        data = np.stack([entry.data for entry in entries])
+
+        # Keep the states of movable entities, which change during episodes, and the states that
+        # differ between entries
+        movable = [entity.movable for entity in scratch.entities for _ in range(2)] + \
+                  [True] * (2 * len(scratch.agents))
+        offsets = np.concatenate([[0], np.cumsum(np.maximum(sizes, 0))])
+        names = scratch.state_slots()
+        num_entities = len(scratch.entities)
+
+        # Written states as (is agent state, entity or agent index, attribute, size)
+        self.slots = []
+        columns = []
+        for slot, size_ in enumerate(sizes):
+            if size_ < 0:
+                continue
+            column = np.arange(offsets[slot], offsets[slot + 1])
+            if movable[slot] or np.any(data[:, column] != data[:1, column]):
+                is_agent = slot >= 2 * num_entities
+                index = (slot - 2 * num_entities if is_agent else slot) // 2
+                self.slots.append((is_agent, index, names[slot][1], column.size))
+                columns.append(column)
+
+        # Initial states, shape [M, D] with the selected states of each entry concatenated
+        self.data = data[:, np.concatenate(columns)] if columns else np.zeros((size, 0))
+
+        # Entity positions, shape [M, E, dim_p], NaN for entities without a position
+        dim_p = world.dimension_position
+        self.positions = np.full((size, len(scratch.entities), dim_p), np.nan)
+        for i in range(len(scratch.entities)):
+            if sizes[2 * i] == dim_p:
+                self.positions[:, i] = data[:, offsets[2 * i]:offsets[2 * i] + dim_p]
+
+    def reset(self, world):
+        """
+        Reset a world to a random entry of the bank, a drop-in replacement for the scenario's reset_world.
+
+        Args:
+            world (multiagent_particle_env.core.World): World to reset
+        """
+        self.restore(world, self.rng.randint(self.size))
+
+    def restore(self, world, index):
+        """
+        Copy an entry of the bank into a world's state arrays
+
+        Args:
+            world (multiagent_particle_env.core.World): World to reset
+            index (int): Entry of the bank
+        """
+        entities = world.entities
+        values = self.data[index]
+        offset = 0
+        for is_agent, i, name, size in self.slots:
+            state = world.agents[i].state if is_agent else entities[i].state
+            current = getattr(state, name)
+            if isinstance(current, np.ndarray) and current.size == size and current.dtype == np.float64:
+                current[...] = values[offset:offset + size].reshape(current.shape)
+            else:
+                setattr(state, name, values[offset:offset + size].copy())
+            offset += size
@@ -24,6 +24,10 @@ class BaseScenario(object):
     """
     Defines the base scenario upon which the world is built.
     """
+    # Whether episodes may be reset from a ResetBank. The bank only restores entity states, so scenarios whose
+    # reset_world draws anything else per episode, e.g. goals or colors, must keep this False
+    supports_reset_bank = False
+
     def make_world(self, args):
         """
         Construct the world
@@ -35,3 +39,9 @@ class BaseScenario(object):
         Reset the world to the initial conditions.
         """
         raise NotImplementedError()
+
+    def reset_filter(self, world):
+        """
+        Whether a freshly reset world is an acceptable initial state, used to filter reset banks.
+        """
+        return True
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 
+import os
 import os.path as osp
 import sys
 
@@ -12,11 +13,77 @@ __maintainer__ = 'Rolando Fernandez'
 __email__ = 'rolando.fernandez1.civ@mail.mil'
 __status__ = 'Dev'
 
+# Scenario sub directories searched for bare scenario names
+SCENARIO_DIRS = ('openai', 'allies', 'converge')
+
+# Loaded modules by path, as (mtime, module)
+_MODULES = {}
+
+# Scenario name ('<dir>/<name>') to path, discovered on first use
+_REGISTRY = None
+
+# World factories by (path, id(arglist))
+_FACTORIES = {}
+
+
+def scenario_names():
+    """
+    Names of all the scenarios in SCENARIO_DIRS, discovered on first use.
+
+    Returns:
+        (list) Sorted scenario names, e.g. ``converge/simple_hvt_1v1_random``
+    """
+    global _REGISTRY
+
+    if _REGISTRY is None:
+        _REGISTRY = {}
+        for directory in SCENARIO_DIRS:
+            for file_name in os.listdir(osp.join(osp.dirname(__file__), directory)):
+                if file_name.endswith(".py") and not file_name.startswith("__"):
+                    _REGISTRY[directory + "/" + file_name[:-3]] = osp.join(osp.dirname(__file__), directory,
+                                                                          file_name)
+
+    return sorted(_REGISTRY)
+
+
+def scenario_path(module_name):
+    """
+    Path of a scenario file.
+
+    Args:
+        module_name (str): Scenario file relative to this directory, with or without the .py extension,
+                           e.g. ``converge/simple_hvt_1v1_random.py``, or a bare scenario name
+                           found in one of SCENARIO_DIRS, e.g. ``simple_hvt_1v1_random``
+
+    Returns:
+        (str) Path of the scenario file
+
+    Raises:
+        FileNotFoundError: When no scenario matches module_name
+    """
+    module_path = osp.join(osp.dirname(__file__), module_name)
+    if osp.isfile(module_path):
+        return module_path
+
+    name = module_name[:-3] if module_name.endswith(".py") else module_name
+    scenario_names()
+    if name in _REGISTRY:
+        return _REGISTRY[name]
+
+    matches = [path for key, path in _REGISTRY.items() if key.split("/")[-1] == name]
+    if len(matches) == 1:
+        return matches[0]
+
+    raise FileNotFoundError("No scenario named {} in {}".format(module_name, ", ".join(SCENARIO_DIRS)))
+
 
 def load(module_name):
     """
     Loads a python module from the path of the corresponding file.
 
+    The module is executed once and cached by path, it is only executed again when the file's
+    modification time changes.
+
     Args:
         module_name (str): Namespace where the python module will be loaded,
                            e.g. ``foo.bar``
@@ -28,7 +95,10 @@ def load(module_name):
               ImportError: When the module can't be loaded
         FileNotFoundError: When module_path doesn't exist
     """
-    module_path = osp.join(osp.dirname(__file__), module_name)
+    module_path = scenario_path(module_name)
+    mtime = osp.getmtime(module_path)
+    if module_path in _MODULES and _MODULES[module_path][0] == mtime:
+        return _MODULES[module_path][1]
 
     # Python version 3.5 or greater
     if sys.version_info[0] == 3 and sys.version_info[1] >= 5:
@@ -46,4 +116,60 @@ def load(module_name):
     else:
         import imp
         module = imp.load_source(module_name, module_path)
+
+    _MODULES[module_path] = (mtime, module)
     return module
+
+
+class WorldFactory(object):
+    """
+    Builds a scenario's world once and hands out copies of it.
+
+    Copies are made with World.clone(), so they share the scenario object and the entities'
+    callbacks and constant attributes, while every entity state and action is copied. Scenarios
+    keep no per-world state, so a copy behaves like a world from a fresh make_world until its
+    environment is reset.
+    """
+    def __init__(self, module_name, arglist=None):
+        """
+        Args:
+            module_name (str): Scenario file or name, see scenario_path()
+            arglist (argparse.Namespace): Parsed commandline arguments object passed to make_world
+        """
+        self.module_path = scenario_path(module_name)
+        self.mtime = osp.getmtime(self.module_path)
+        self.arglist = arglist
+
+        self.scenario = load(module_name).Scenario()
+        if arglist is not None:
+            self.template = self.scenario.make_world(arglist)
+        else:
+            self.template = self.scenario.make_world()
+
+    def make_world(self):
+        """
+        Returns:
+            (multiagent_particle_env.core.World) Copy of the template world
+        """
+        return self.template.clone()
+
+
+def world_factory(module_name, arglist=None):
+    """
+    WorldFactory of a scenario, built once per scenario file and arglist object.
+
+    Args:
+        module_name (str): Scenario file or name, see scenario_path()
+        arglist (argparse.Namespace): Parsed commandline arguments object passed to make_world
+
+    Returns:
+        (WorldFactory) Factory of the scenario's worlds
+    """
+    module_path = scenario_path(module_name)
+    key = (module_path, id(arglist))
+    factory = _FACTORIES.get(key)
+    if factory is None or factory.arglist is not arglist or factory.mtime != osp.getmtime(module_path):
+        factory = WorldFactory(module_name, arglist)
+        _FACTORIES[key] = factory
+
+    return factory
@@ -20,6 +20,7 @@ from array import array
 import numpy as np
 
 from multiagent_particle_env.core import World, Agent, Landmark
+from multiagent_particle_env.perturbation import step_perturbed_agents
 from multiagent_particle_env.scenario import BaseScenario
 
 __author__ = 'Rolando Fernandez'
@@ -77,43 +78,6 @@ def _fixed_strategy(agent, world):
     return agent.action
 
 
-def _double_pendulum(state):
-    """
-    Differential dynamics of a double pendulum
-
-    Args:
-        state (multiagent_particle_env.core.AgentState.state): State element from Agent state object
-              or
-              (list) Agent state 4-element list
-
-    Returns:
-        Updated agent state causing agent to act as a double pendulum
-    """
-    L1, L2 = 0.49, 0.49
-    G = 9.8
-    M1, M2 = 1.0, 1.0
-
-    dydx = np.zeros_like(state)
-    dydx[0] = state[1]
-
-    del_ = state[2] - state[0]
-    den1 = (M1 + M2) * L1 - M2 * L1 * np.cos(del_) * np.cos(del_)
-    dydx[1] = (M2 * L1 * state[1] * state[1] * np.sin(del_) * np.cos(del_) +
-               M2 * G * np.sin(state[2]) * np.cos(del_) +
-               M2 * L2 * state[3] * state[3] * np.sin(del_) -
-               (M1 + M2) * G * np.sin(state[0])) / den1
-
-    dydx[2] = state[3]
-
-    den2 = (L2 / L1) * den1
-    dydx[3] = (-M2 * L2 * state[3] * state[3] * np.sin(del_) * np.cos(del_) +
-               (M1 + M2) * G * np.sin(state[0]) * np.cos(del_) -
-               (M1 + M2) * L1 * state[1] * state[1] * np.sin(del_) -
-               (M1 + M2) * G * np.sin(state[2])) / den2
-
-    return dydx
-
-
 def _double_pendulum_perturbation_strategy(agent, world):
     """
     Double Pendulum Strategy for perturbing an agent's policy
@@ -125,47 +89,9 @@ def _double_pendulum_perturbation_strategy(agent, world):
     Returns:
         agent.action (multiagent_particle_env.core.Action): Agent action object
     """
-    x = agent.state.p_pos[0]
-    y = agent.state.p_pos[1]
-    L1, L2 = 0.5, 0.5
-
-    try:
-        state = agent.state.state
-    except:
-        if (x**2 + y**2 - L1**2 - L2**2) / (2 * L1 * L2) >= 1.0:
-            th2 = 0.0
-        elif (x**2 + y**2 - L1**2 - L2**2) / (2 * L1 * L2) <= -1.0:
-            th2 = np.pi
-        else:
-            th2 = np.arccos((x**2 + y**2 - L1**2 - L2**2) / (2 * L1 * L2))
-
-        th1 = np.arctan2(y, x) - np.arctan2(L2 * np.sin(th2), L1 + L2 * np.cos(th2))
-        w1, w2 = np.random.random(1)[0]**2, np.random.random(1)[0]**2
-        state = np.array([th1, w1, th2, w2])
-
-    if all(state == 0.0):
-        if (x**2 + y**2 - L1**2 - L2**2) / (2 * L1 * L2) >= 1.0:
-            th2 = 0.0
-        elif (x**2 + y**2 - L1**2 - L2**2) / (2 * L1 * L2) <= -1.0:
-            th2 = np.pi
-        else:
-            th2 = np.arccos((x**2 + y**2 - L1**2 - L2**2)/(2*L1*L2))
-
-        th1 = np.arctan2(y, x) - np.arctan2(L2 * np.sin(th2), L1 + L2 * np.cos(th2))
-        w1, w2 = np.random.random(1)[0]**2, np.random.random(1)[0]**2
-        state = np.array([th1, w1, th2, w2])
-
-    # Scaled double pendulum state
-    d_state = _double_pendulum(state)/40.
-    state = state + d_state
-
-    new_x = L2*np.sin(state[2]) + L1*np.sin(state[0])
-    new_y = -L2*np.cos(state[2]) - L1*np.cos(state[0])
-
-    agent.state.p_pos[0] = new_x
-    agent.state.p_pos[1] = new_y
+    # Arms of length 0.5 for the kinematics, 0.49 in the dynamics
+    step_perturbed_agents([agent], l1=0.5, l2=0.5, dynamics_l1=0.49, dynamics_l2=0.49)
 
-    agent.state.state = state
     agent.action.u = np.zeros(world.dimension_position)
 
     return agent.action
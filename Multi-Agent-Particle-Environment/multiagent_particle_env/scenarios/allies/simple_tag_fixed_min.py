@@ -21,6 +21,7 @@ import numpy as np
 
 from multiagent_particle_env.alternate_policies import distance_minimizing_fixed_strategy
 from multiagent_particle_env.core import World, Agent, Landmark
+from multiagent_particle_env.perturbation import step_perturbed_agents
 from multiagent_particle_env.scenario import BaseScenario
 
 __author__ = 'Rolando Fernandez'
@@ -33,43 +34,6 @@ __email__ = 'rolando.fernandez1.civ@mail.mil'
 __status__ = 'Dev'
 
 
-def _double_pendulum(state):
-    """
-    Differential dynamics of a double pendulum
-
-    Args:
-        state (multiagent_particle_env.core.AgentState.state): State element from Agent state object
-              or
-              (list) Agent state 4-element list
-
-    Returns:
-        Updated agent state causing agent to act as a double pendulum
-    """
-    L1, L2 = 0.5, 0.5
-    G = 9.8
-    M1, M2 = 1.0, 1.0
-
-    dydx = np.zeros_like(state)
-    dydx[0] = state[1]
-
-    del_ = state[2] - state[0]
-    den1 = (M1 + M2) * L1 - M2 * L1 * np.cos(del_) * np.cos(del_)
-    dydx[1] = (M2 * L1 * state[1] * state[1] * np.sin(del_) * np.cos(del_) +
-               M2 * G * np.sin(state[2]) * np.cos(del_) +
-               M2 * L2 * state[3] * state[3] * np.sin(del_) -
-               (M1 + M2) * G * np.sin(state[0])) / den1
-
-    dydx[2] = state[3]
-
-    den2 = (L2 / L1) * den1
-    dydx[3] = (-M2 * L2 * state[3] * state[3] * np.sin(del_) * np.cos(del_) +
-               (M1 + M2) * G * np.sin(state[0]) * np.cos(del_) -
-               (M1 + M2) * L1 * state[1] * state[1] * np.sin(del_) -
-               (M1 + M2) * G * np.sin(state[2])) / den2
-
-    return dydx
-
-
 def _double_pendulum_perturbation_strategy(agent, world):
     """
     Double Pendulum Strategy for perturbing an agent's policy
@@ -81,51 +45,9 @@ def _double_pendulum_perturbation_strategy(agent, world):
     Returns:
         agent.action (multiagent_particle_env.core.Action): Agent action object
     """
-    x = agent.state.p_pos[0]
-    y = agent.state.p_pos[1]
-    L1, L2 = 0.5, 0.5
-
-    try:
-        state = agent.state.state
-    except:
-        if (x**2 + y**2 - L1**2 - L2**2) / (2 * L1 * L2) >= 1.0:
-            th2 = 0.0
-        elif (x**2 + y**2 - L1**2 - L2**2) / (2 * L1 * L2) <= -1.0:
-            th2 = np.pi
-        else:
-            th2 = np.arccos((x**2 + y**2 - L1**2 - L2**2) / (2 * L1 * L2))
-
-        th1 = np.arctan2(y, x) - np.arctan2(L2 * np.sin(th2), L1 + L2 * np.cos(th2))
-        w1, w2 = np.random.random(1)[0]**2, np.random.random(1)[0]**2
-        state = np.array([th1, w1, th2, w2])
-
-    if all(state == 0.0):
-        if (x**2 + y**2 - L1**2 - L2**2) / (2 * L1 * L2) >= 1.0:
-            th2 = 0.0
-        elif (x**2 + y**2 - L1**2 - L2**2) / (2 * L1 * L2) <= -1.0:
-            th2 = np.pi
-        else:
-            th2 = np.arccos((x**2 + y**2 - L1**2 - L2**2)/(2*L1*L2))
-
-        th1 = np.arctan2(y, x) - np.arctan2(L2 * np.sin(th2), L1 + L2 * np.cos(th2))
-        w1, w2 = np.random.random(1)[0]**2, np.random.random(1)[0]**2
-        state = np.array([th1, w1, th2, w2])
-
-    # Scaled double pendulum state
-    d_state = _double_pendulum(state)/40.
-    state = state + d_state
-
-    new_x = L2*np.sin(state[2]) + L1*np.sin(state[0])
-    new_y = -L2*np.cos(state[2]) - L1*np.cos(state[0])
-
-    agent.state.p_pos[0] = new_x
-    agent.state.p_pos[1] = new_y
-
-    agent.state.state = state
-    agent.action.u = np.zeros(world.dimension_position)
+    _, d_states = step_perturbed_agents([agent], l1=0.5, l2=0.5)
 
-    agent.action.u[0] = d_state[1]
-    agent.action.u[1] = d_state[3]
+    agent.action.u = np.array([d_states[0, 1], d_states[0, 3]])
 
     return agent.action
 
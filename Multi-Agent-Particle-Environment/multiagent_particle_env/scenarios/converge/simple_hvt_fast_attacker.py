@@ -28,6 +28,9 @@ class Scenario(BaseScenario):
     """
     Define the world, reward, and observations for the scenario.
     """
+    # reset_world only draws entity states
+    supports_reset_bank = True
+
 
     def __init__(self):
         # Debug verbose output
@@ -147,6 +150,19 @@ class Scenario(BaseScenario):
             agent.state.p_vel = np.zeros(world.dimension_position)
             agent.state.c = np.zeros(world.dimension_communication)
 
+    def reset_filter(self, world):
+        """
+        Rejects initial states with an attacker already inside the HVT, used to filter reset banks.
+
+        Args:
+            world (multiagent_particle_env.core.World): World object with agents and landmarks
+
+        Returns:
+            (bool) True if no attacker starts in collision with the HVT
+        """
+        landmarks = [landmark for landmark in world.landmarks if not landmark.boundary]
+        return not any(world.is_collision(adversary, hvt) for adversary in self.adversaries(world) for hvt in landmarks)
+
     def good_agents(self, world):
         """
         Returns all agents that are not adversaries in a list.
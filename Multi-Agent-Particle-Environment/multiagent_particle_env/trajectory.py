@@ -0,0 +1,238 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+trajectory.py
+
+Compact binary recording and replay of evaluation trajectories.
+
+A trajectory file is a directory holding:
+    header.json   : Entity/agent counts and names
+    steps.bin     : Fixed-size step records (positions, velocities, actions, rewards, dones)
+    episodes.bin  : int64 [start, length] pair per episode, indexing into steps.bin
+
+Each episode begins with the state right after reset (zero actions and rewards), followed by
+one record per environment step. Episodes are appended whole, data before index, so a reader
+only ever sees complete episodes.
+
+Updated and Enhanced version of OpenAI Multi-Agent Particle Environment
+(https://github.com/openai/multiagent-particle-envs)
+"""
+
+import json
+import numpy as np
+import os
+
+__author__ = 'Rolando Fernandez'
+__copyright__ = 'Copyright 2020, Multi-Agent Particle Environment'
+__credits__ = ['Rolando Fernandez', 'OpenAI']
+__license__ = ''
+__version__ = '0.0.1'
+__maintainer__ = 'Rolando Fernandez'
+__email__ = 'rolando.fernandez1.civ@mail.mil'
+__status__ = 'Dev'
+
+
+def step_dtype(num_entities, num_agents, dim_p=2):
+    """
+    Structured dtype of a single step record
+
+    Args:
+        num_entities (int): Number of entities (agents, landmarks and stationary agents) in the world
+        num_agents (int): Number of agents in the world
+        dim_p (int): Position dimensionality
+
+    Returns:
+        (numpy.dtype) Step record dtype
+    """
+    return np.dtype([('p_pos', np.float32, (num_entities, dim_p)),
+                     ('p_vel', np.float32, (num_entities, dim_p)),
+                     ('u', np.float32, (num_agents, dim_p)),
+                     ('reward', np.float32, (num_agents,)),
+                     ('done', np.bool_, (num_agents,))])
+
+
+class TrajectoryRecorder(object):
+    """
+    Records world states to a trajectory file one episode at a time.
+    """
+    def __init__(self, path, world):
+        """
+        Args:
+            path (str): Trajectory directory, created if needed and appended to if it exists
+            world (multiagent_particle_env.core.World): World object with agents and landmarks
+        """
+        self.path = path.rstrip("/\\") + "/"
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path, exist_ok=True)
+
+        entities = world.entities
+        self.num_entities = len(entities)
+        self.num_agents = len(world.agents)
+        self.dim_p = world.dimension_position
+        self.dtype = step_dtype(self.num_entities, self.num_agents, self.dim_p)
+
+        header = {'num_entities': self.num_entities,
+                  'num_agents': self.num_agents,
+                  'dim_p': self.dim_p,
+                  'entity_names': [entity.name for entity in entities]}
+        if os.path.isfile(self.path + "header.json"):
+            with open(self.path + "header.json", 'r') as f:
+                existing = json.load(f)
+            assert existing == header, "Trajectory file {} was recorded from a different world".format(path)
+        else:
+            with open(self.path + "header.json", 'w') as f:
+                json.dump(header, f)
+
+        # Next free step index in steps.bin
+        self.num_steps = os.path.getsize(self.path + "steps.bin") // self.dtype.itemsize \
+            if os.path.isfile(self.path + "steps.bin") else 0
+
+        self._buffer = np.zeros(64, dtype=self.dtype)
+        self._length = 0
+
+    def _next_index(self):
+        if self._length == self._buffer.shape[0]:
+            self._buffer = np.concatenate([self._buffer, np.zeros_like(self._buffer)])
+        self._length += 1
+
+        return self._length - 1
+
+    def _record_state(self, world, index):
+        for i, entity in enumerate(world.entities):
+            self._buffer['p_pos'][index, i] = entity.state.p_pos
+            self._buffer['p_vel'][index, i] = entity.state.p_vel
+
+    def reset(self, world):
+        """
+        Write the previous episode, if any, and start a new one from the world's reset state.
+
+        Args:
+            world (multiagent_particle_env.core.World): World object right after env.reset()
+        """
+        self.end_episode()
+        index = self._next_index()
+        self._buffer[index] = np.zeros((), dtype=self.dtype)
+        self._record_state(world, index)
+
+    def step(self, world, reward_n, done_n):
+        """
+        Record the world state after an environment step.
+
+        Args:
+            world (multiagent_particle_env.core.World): World object right after env.step()
+            reward_n (list): Rewards for all agents
+            done_n (list): Dones for all agents
+        """
+        index = self._next_index()
+        self._record_state(world, index)
+        for i, agent in enumerate(world.agents):
+            self._buffer['u'][index, i] = agent.action.u[:self.dim_p]
+        self._buffer['reward'][index] = reward_n
+        self._buffer['done'][index] = done_n
+
+    def end_episode(self):
+        """
+        Append the buffered episode to the trajectory file. Episodes with no steps are dropped.
+        """
+        if self._length > 1:
+            with open(self.path + "steps.bin", 'ab') as f:
+                self._buffer[:self._length].tofile(f)
+            with open(self.path + "episodes.bin", 'ab') as f:
+                np.array([self.num_steps, self._length], dtype=np.int64).tofile(f)
+            self.num_steps += self._length
+        self._length = 0
+
+    def close(self):
+        """
+        Append the last episode.
+        """
+        self.end_episode()
+
+
+class TrajectoryReader(object):
+    """
+    Memory-mapped access to a trajectory file.
+    """
+    def __init__(self, path):
+        """
+        Args:
+            path (str): Trajectory directory written by TrajectoryRecorder
+        """
+        self.path = path.rstrip("/\\") + "/"
+        with open(self.path + "header.json", 'r') as f:
+            self.header = json.load(f)
+
+        self.dtype = step_dtype(self.header['num_entities'], self.header['num_agents'], self.header['dim_p'])
+
+        if os.path.isfile(self.path + "episodes.bin"):
+            self.episodes = np.fromfile(self.path + "episodes.bin", dtype=np.int64).reshape(-1, 2)
+        else:
+            self.episodes = np.zeros((0, 2), dtype=np.int64)
+
+        # Episodes are appended in order, so the last one ends the readable steps
+        num_steps = int(self.episodes[-1].sum()) if len(self.episodes) else 0
+        if num_steps > 0:
+            self.steps = np.memmap(self.path + "steps.bin", dtype=self.dtype, mode='r', shape=(num_steps,))
+        else:
+            self.steps = np.zeros(0, dtype=self.dtype)
+
+    @property
+    def num_episodes(self):
+        return len(self.episodes)
+
+    def __len__(self):
+        return self.num_episodes
+
+    def episode(self, index):
+        """
+        Step records of an episode, the first being the reset state.
+
+        Args:
+            index (int): Episode index
+
+        Returns:
+            (numpy.array) Structured array of step records with fields
+                          p_pos, p_vel, u, reward and done
+        """
+        start, length = self.episodes[index]
+
+        return self.steps[start:start + length]
+
+    def episode_rewards(self):
+        """
+        Total reward per agent for each episode.
+
+        Returns:
+            (numpy.array) Rewards, shape [num_episodes, num_agents]
+        """
+        return np.array([self.episode(i)['reward'].sum(axis=0) for i in range(self.num_episodes)])
+
+    def replay(self, env, index, render=True):
+        """
+        Drive an environment's world through a recorded episode.
+
+        The world must be built from the same scenario that was recorded. Only entity positions,
+        velocities and agent actions are restored, no policy or physics is run.
+
+        Args:
+            env (multiagent_particle_env.environment.MultiAgentEnv): Environment to replay into
+            index (int): Episode index
+            render (bool): Call env.render() after each restored step
+
+        Yields:
+            (numpy.void) The step record just restored
+        """
+        world = env.world
+        assert len(world.entities) == self.header['num_entities'], "World does not match trajectory file"
+
+        for record in self.episode(index):
+            for i, entity in enumerate(world.entities):
+                entity.state.p_pos = np.array(record['p_pos'][i], dtype=np.float64)
+                entity.state.p_vel = np.array(record['p_vel'][i], dtype=np.float64)
+            for i, agent in enumerate(world.agents):
+                agent.action.u = np.array(record['u'][i], dtype=np.float64)
+            if render:
+                env.render()
+
+            yield record
@@ -20,4 +20,5 @@ setup(name='multiagent_particle_env',
       packages=find_packages(),
       include_package_data=True,
       zip_safe=False,
-      install_requires=['gym', 'numpy', 'numpy-stl', 'pyglet', 'six'])
+      install_requires=['gym', 'numpy', 'numpy-stl', 'pyglet', 'six'],
+      extras_require={'numba': ['numba']})